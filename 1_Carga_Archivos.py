@@ -1,6 +1,6 @@
-import pandas as pd
 import streamlit as st
 from modules.demand_cleaner import clean_demand
+from modules.esquemas import leer_csv
 from utils import render_logo_sidebar
 
 # --- Estilos y logo ---
@@ -26,16 +26,12 @@ st.markdown("<div class='section-subtitle'>📊 Carga de Stock Histórico</div>"
 if st.session_state['stock_historico'] is None:
     archivo = st.file_uploader("1️⃣ Sube el archivo de stock histórico (CSV)", type="csv", key="uploader_stock_historico")
     if archivo:
-        df = pd.read_csv(archivo)
-        expected = {'sku', 'fecha', 'stock'}
-        if expected.issubset(df.columns):
-            df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
-            df['stock'] = pd.to_numeric(df['stock'], errors='coerce').fillna(0).astype(int)
-            st.session_state['stock_historico'] = df
+        try:
+            st.session_state['stock_historico'] = leer_csv(archivo, 'stock_historico')
             st.success("✅ Stock histórico cargado correctamente.")
             st.rerun()
-        else:
-            st.error(f"⚠️ Faltan columnas: {expected - set(df.columns)}")
+        except ValueError as e:
+            st.error(str(e))
 else:
     historico_df = st.session_state['stock_historico']
     st.markdown("<div style='font-size:16px;'>✅ <b>Vista previa del stock histórico</b></div>", unsafe_allow_html=True)
@@ -50,12 +46,13 @@ if st.session_state['stock_historico'] is None:
 if st.session_state['demanda_limpia'] is None:
     archivo = st.file_uploader("2️⃣ Sube el archivo de demanda (CSV)", type="csv", key="uploader_demanda")
     if archivo:
-        df = pd.read_csv(archivo)
-        df['fecha'] = pd.to_datetime(df['fecha'])
-        df = clean_demand(df)
-        st.session_state['demanda_limpia'] = df
-        st.success("✅ Archivo cargado y demanda limpia generada.")
-        st.rerun()
+        try:
+            df = clean_demand(leer_csv(archivo, 'demanda_cruda'))
+            st.session_state['demanda_limpia'] = df
+            st.success("✅ Archivo cargado y demanda limpia generada.")
+            st.rerun()
+        except ValueError as e:
+            st.error(str(e))
 else:
     cleaned_demand_df = st.session_state['demanda_limpia']
     st.markdown("<div style='font-size:16px;'>✅ <b>Vista previa de la demanda limpia</b></div>", unsafe_allow_html=True)
@@ -69,15 +66,12 @@ st.markdown("<div class='section-subtitle'>📦 Carga de Stock Actual por SKU (O
 if st.session_state['stock_actual'] is None:
     archivo = st.file_uploader("Sube el archivo de stock actual (CSV)", type="csv", key="uploader_stock")
     if archivo:
-        df = pd.read_csv(archivo)
-        expected = {'sku', 'descripcion', 'stock', 'fecha'}
-        if expected.issubset(df.columns):
-            df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
-            st.session_state['stock_actual'] = df
+        try:
+            st.session_state['stock_actual'] = leer_csv(archivo, 'stock_actual')
             st.success("✅ Archivo cargado correctamente.")
             st.rerun()
-        else:
-            st.error(f"⚠️ Faltan columnas: {expected - set(df.columns)}")
+        except ValueError as e:
+            st.error(str(e))
 else:
     stock_df = st.session_state['stock_actual']
     st.markdown("<div style='font-size:16px;'>✅ <b>Vista previa del stock actual</b></div>", unsafe_allow_html=True)
@@ -88,16 +82,12 @@ st.markdown("<div class='section-subtitle'>📦 Carga de Reposiciones Futuras</d
 if st.session_state['reposiciones'] is None:
     archivo = st.file_uploader("Sube el archivo de reposiciones (CSV)", type="csv", key="uploader_reposiciones")
     if archivo:
-        df = pd.read_csv(archivo)
-        expected = {'sku', 'fecha', 'cantidad'}
-        if expected.issubset(df.columns):
-            df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
-            df['cantidad'] = pd.to_numeric(df['cantidad'], errors='coerce').fillna(0).astype(int)
-            st.session_state['reposiciones'] = df
+        try:
+            st.session_state['reposiciones'] = leer_csv(archivo, 'reposiciones')
             st.success("✅ Reposiciones cargadas.")
             st.rerun()
-        else:
-            st.error(f"⚠️ Faltan columnas: {expected - set(df.columns)}")
+        except ValueError as e:
+            st.error(str(e))
 else:
     repos_df = st.session_state['reposiciones']
     st.markdown("<div style='font-size:16px;'>✅ <b>Vista previa de las reposiciones futuras</b></div>", unsafe_allow_html=True)
@@ -108,15 +98,12 @@ st.markdown("<div class='section-subtitle'>📘 Carga del Maestro de Productos</
 if st.session_state['maestro'] is None:
     archivo = st.file_uploader("Sube el archivo maestro (CSV)", type="csv", key="uploader_maestro")
     if archivo:
-        df = pd.read_csv(archivo)
-        expected = {'sku', 'descripcion', 'costo_fabricacion', 'precio_venta', 'categoria'}
-        if expected.issubset(df.columns):
-            df = df.dropna(subset=['sku'])
-            st.session_state['maestro'] = df
+        try:
+            st.session_state['maestro'] = leer_csv(archivo, 'maestro')
             st.success("✅ Maestro cargado.")
             st.rerun()
-        else:
-            st.error(f"⚠️ Faltan columnas: {expected - set(df.columns)}")
+        except ValueError as e:
+            st.error(str(e))
 else:
     maestro_df = st.session_state['maestro']
     st.markdown("<div style='font-size:16px;'>✅ <b>Vista previa del maestro de productos</b></div>", unsafe_allow_html=True)
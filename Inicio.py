@@ -1,7 +1,7 @@
 import streamlit as st
 from PIL import Image
 import os
-import pandas as pd
+from utils.cache_entradas import cargar_entrada
 
 # --- Configuración de página ---
 st.set_page_config(page_title="Planity", layout="wide")
@@ -51,9 +51,6 @@ modo_carga = st.radio(
 if modo_carga == "Carga manual de archivos":
     st.markdown("### 📁 Carga manual de archivos")
 
-    # Crear carpeta temporal si no existe
-    os.makedirs("tmp", exist_ok=True)
-
     archivos = {
         "demanda_cruda": "📈 Demanda histórica",
         "stock_historico": "📊 Stock histórico",
@@ -63,19 +60,17 @@ if modo_carga == "Carga manual de archivos":
     }
 
     for key, label in archivos.items():
-        file_path = f"tmp/{key}.csv"
         archivo = st.file_uploader(f"{label} (CSV)", type=["csv"], key=f"{key}_upload")
 
-        if archivo:
-            # Guardar en disco y en session_state
-            df = pd.read_csv(archivo)
-            df.to_csv(file_path, index=False)
-            st.session_state[key] = df
-            st.success(f"✅ {label} cargado correctamente")
-        elif os.path.exists(file_path):
-            # Cargar desde archivo temporal si no se ha subido de nuevo
-            st.session_state[key] = pd.read_csv(file_path)
-            st.info(f"📂 {label} cargado desde sesión anterior")
+        try:
+            # Caché tipado en tmp/: sólo se lee (o se parsea el CSV) cuando cambia su huella en el manifiesto
+            origen = cargar_entrada(key, archivo)
+            if origen == "subido":
+                st.success(f"✅ {label} cargado correctamente")
+            elif origen == "cache":
+                st.info(f"📂 {label} cargado desde sesión anterior")
+        except ValueError as e:
+            st.error(f"{label}: {e}")
 
 
 # --- Botón de carga ---
@@ -0,0 +1,64 @@
+from collections import deque
+
+
+class AutomataAhoCorasick:
+    """
+    Autómata de Aho-Corasick: encuentra todas las apariciones de un conjunto de patrones
+    (incluidas las superpuestas) en una sola pasada sobre el texto.
+
+    Cada patrón se asocia a un valor; `buscar` entrega (inicio, fin, valor) por aparición.
+    """
+
+    def __init__(self, patrones):
+        # Trie con transiciones por nodo, enlace de falla y valores de los patrones que terminan en él
+        self.transiciones = [{}]
+        self.falla = [0]
+        self.salida = [[]]
+        for patron, valor in patrones:
+            self._agregar(patron, valor)
+        self._construir_fallas()
+
+    def _agregar(self, patron, valor):
+        if not patron:
+            return
+        nodo = 0
+        for caracter in patron:
+            siguiente = self.transiciones[nodo].get(caracter)
+            if siguiente is None:
+                siguiente = len(self.transiciones)
+                self.transiciones[nodo][caracter] = siguiente
+                self.transiciones.append({})
+                self.falla.append(0)
+                self.salida.append([])
+            nodo = siguiente
+        self.salida[nodo].append((len(patron), valor))
+
+    def _construir_fallas(self):
+        cola = deque(self.transiciones[0].values())
+        while cola:
+            nodo = cola.popleft()
+            for caracter, hijo in self.transiciones[nodo].items():
+                cola.append(hijo)
+                f = self.falla[nodo]
+                while f and caracter not in self.transiciones[f]:
+                    f = self.falla[f]
+                destino = self.transiciones[f].get(caracter, 0)
+                self.falla[hijo] = destino if destino != hijo else 0
+                # Los patrones del enlace de falla también terminan en este nodo
+                self.salida[hijo] = self.salida[hijo] + self.salida[self.falla[hijo]]
+
+    def buscar(self, texto):
+        """Lista de (inicio, fin, valor) de todas las apariciones de patrones en `texto`."""
+        apariciones = []
+        nodo = 0
+        for i, caracter in enumerate(texto):
+            while nodo and caracter not in self.transiciones[nodo]:
+                nodo = self.falla[nodo]
+            nodo = self.transiciones[nodo].get(caracter, 0)
+            for largo, valor in self.salida[nodo]:
+                apariciones.append((i + 1 - largo, i + 1, valor))
+        return apariciones
+
+    def valores(self, texto):
+        """Conjunto de valores de los patrones que aparecen en `texto`."""
+        return {valor for _, _, valor in self.buscar(texto)}
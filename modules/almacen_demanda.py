@@ -0,0 +1,233 @@
+import json
+import os
+import shutil
+import threading
+import time
+import pandas as pd
+import streamlit as st
+from modules.esquemas import leer_csv_por_bloques
+
+# --- Almacén de demanda particionado por SKU ---
+# Para exportaciones de demanda demasiado grandes para leerse enteras: el CSV se lee en bloques,
+# cada bloque se reparte en N particiones según un hash estable del SKU (todas las semanas de un SKU
+# quedan en la misma partición) y cada partición se compacta a un archivo Feather tipado.
+# Limpieza, panel mensual y forecast luego trabajan partición por partición.
+#
+# Cada almacén es una carpeta con versiones (v_*/) y un puntero actual.json a la versión vigente.
+# Publicar una versión es reemplazar el puntero (os.replace de un archivo, atómico): los lectores
+# siempre ven una versión completa, la anterior o la nueva.
+TAMANO_BLOQUE = 500_000
+N_PARTICIONES = 16
+CLAVE = ["sku", "fecha"]
+ARCHIVO_INDICE = "indice.json"
+ARCHIVO_ACTUAL = "actual.json"
+
+
+def particion_de(skus, n_particiones):
+    """Número de partición de cada SKU (hash estable entre ejecuciones y procesos)."""
+    return pd.util.hash_array(pd.Series(skus).astype(str).to_numpy(dtype=object)) % n_particiones
+
+
+def nombre_particion(numero):
+    return f"p{numero:03d}"
+
+
+def _huella_origen(ruta):
+    return {"ruta": os.path.abspath(ruta), "tamano": os.path.getsize(ruta), "modificado": os.path.getmtime(ruta)}
+
+
+def _version_actual(carpeta):
+    try:
+        with open(os.path.join(carpeta, ARCHIVO_ACTUAL), encoding="utf-8") as f:
+            return os.path.join(carpeta, json.load(f)["version"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def leer_indice(carpeta):
+    version = _version_actual(carpeta)
+    if version is None:
+        return None
+    try:
+        with open(os.path.join(version, ARCHIVO_INDICE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def almacen_vigente(carpeta, ruta_csv):
+    """True si el almacén existe y se construyó a partir de esta misma versión del CSV."""
+    indice = leer_indice(carpeta)
+    return indice is not None and indice.get("origen") == _huella_origen(ruta_csv)
+
+
+def _nueva_version(carpeta):
+    """Carpeta de trabajo única (proceso + hilo), así dos construcciones simultáneas no se pisan."""
+    nombre = f"v_{time.time_ns()}_{os.getpid()}_{threading.get_ident()}"
+    os.makedirs(os.path.join(carpeta, nombre))
+    return nombre
+
+
+def _publicar(carpeta, version, indice):
+    with open(os.path.join(carpeta, version, ARCHIVO_INDICE), "w", encoding="utf-8") as f:
+        json.dump(indice, f, indent=2)
+    temporal = os.path.join(carpeta, f"{ARCHIVO_ACTUAL}.{version}.tmp")
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump({"version": version}, f)
+    os.replace(temporal, os.path.join(carpeta, ARCHIVO_ACTUAL))
+    # Versiones anteriores: se borran (en Windows pueden seguir abiertas; se reintentará en la próxima publicación)
+    for nombre in os.listdir(carpeta):
+        if nombre.startswith("v_") and nombre != version and not nombre.endswith(".tmp"):
+            shutil.rmtree(os.path.join(carpeta, nombre), ignore_errors=True)
+
+
+def ingerir_demanda(ruta_csv, carpeta, tamano_bloque=TAMANO_BLOQUE, n_particiones=N_PARTICIONES):
+    """
+    Construye el almacén particionado a partir del CSV de demanda cruda.
+
+    - Cada bloque se valida y tipa con el esquema "demanda_cruda" (ValueError si faltan columnas)
+    - Claves (sku, fecha) repetidas: se conserva la última aparición en el archivo
+    - Memoria máxima: un bloque durante la lectura y una partición durante la compactación
+
+    La versión nueva se construye aparte y se publica al final cambiando el puntero. Retorna el índice.
+    """
+    os.makedirs(carpeta, exist_ok=True)
+    version = _nueva_version(carpeta)
+    try:
+        indice = _construir_almacen(ruta_csv, os.path.join(carpeta, version), tamano_bloque, n_particiones)
+    except Exception:
+        shutil.rmtree(os.path.join(carpeta, version), ignore_errors=True)
+        raise
+    _publicar(carpeta, version, indice)
+    return indice
+
+
+def _construir_almacen(ruta_csv, destino, tamano_bloque, n_particiones):
+    # Reparto: cada bloque (sin duplicados internos) se escribe como un archivo por partición
+    filas_leidas = 0
+    fechas = set()
+    for i, bloque in enumerate(leer_csv_por_bloques(ruta_csv, "demanda_cruda", tamano_bloque)):
+        filas_leidas += len(bloque)
+        bloque = bloque.drop_duplicates(CLAVE, keep="last")
+        bloque["sku"] = bloque["sku"].astype(str)
+        fechas.update(bloque["fecha"].dropna().unique())
+        for particion, parte in bloque.groupby(particion_de(bloque["sku"], n_particiones), sort=False):
+            ruta = os.path.join(destino, nombre_particion(particion))
+            os.makedirs(ruta, exist_ok=True)
+            parte.reset_index(drop=True).to_feather(os.path.join(ruta, f"bloque_{i:05d}.feather"))
+
+    # Compactación: una partición a la vez, sin duplicados entre bloques y ordenada por (sku, fecha)
+    particiones = {}
+    for nombre in sorted(os.listdir(destino)):
+        ruta = os.path.join(destino, nombre)
+        partes = [pd.read_feather(os.path.join(ruta, archivo)) for archivo in sorted(os.listdir(ruta))]
+        df = pd.concat(partes, ignore_index=True).drop_duplicates(CLAVE, keep="last")
+        df = df.sort_values(CLAVE, kind="stable").reset_index(drop=True)
+        df["sku"] = df["sku"].astype("category")
+        df.to_feather(os.path.join(destino, f"{nombre}.feather"))
+        shutil.rmtree(ruta)
+        particiones[nombre] = {"filas": len(df), "skus": len(df["sku"].cat.categories)}
+
+    fechas = sorted(pd.Timestamp(f) for f in fechas)
+    return {
+        "origen": _huella_origen(ruta_csv),
+        "n_particiones": n_particiones,
+        "filas_leidas": filas_leidas,
+        "filas": sum(p["filas"] for p in particiones.values()),
+        "fechas": [f.isoformat() for f in fechas],
+        "particiones": particiones,
+    }
+
+
+def escribir_almacen(carpeta, particiones, indice_base):
+    """
+    Publica un almacén derivado (p. ej. la demanda limpia) a partir de un iterable de (nombre, DataFrame),
+    escribiendo cada partición a medida que llega. `indice_base` se copia al índice (n_particiones, fechas...).
+    """
+    os.makedirs(carpeta, exist_ok=True)
+    version = _nueva_version(carpeta)
+    destino = os.path.join(carpeta, version)
+    resumen = {}
+    try:
+        for nombre, df in particiones:
+            df.reset_index(drop=True).to_feather(os.path.join(destino, f"{nombre}.feather"))
+            resumen[nombre] = {"filas": len(df)}
+    except Exception:
+        shutil.rmtree(destino, ignore_errors=True)
+        raise
+    indice = {**indice_base, "particiones": resumen}
+    _publicar(carpeta, version, indice)
+    return indice
+
+
+def leer_particion(carpeta, nombre, columnas=None):
+    return pd.read_feather(os.path.join(_version_actual(carpeta), f"{nombre}.feather"), columns=columnas)
+
+
+def iterar_particiones(carpeta, columnas=None):
+    """Entrega (nombre, DataFrame) de cada partición, leyendo una por vez."""
+    for nombre in leer_indice(carpeta)["particiones"]:
+        yield nombre, leer_particion(carpeta, nombre, columnas)
+
+
+def leer_sku(carpeta, sku):
+    """Filas de un SKU leyendo sólo su partición."""
+    indice = leer_indice(carpeta)
+    nombre = nombre_particion(particion_de([sku], indice["n_particiones"])[0])
+    if nombre not in indice["particiones"]:
+        return None
+    df = leer_particion(carpeta, nombre)
+    return df[df["sku"] == str(sku)].reset_index(drop=True)
+
+
+# --- Acceso desde las páginas: demanda limpia de la sesión o, con almacén, leída por partición ---
+# Con almacén la sesión no guarda la demanda semanal completa, sólo:
+# - "almacen_demanda_limpia": carpeta del almacén con la demanda limpia por partición
+# - "demanda_semanal_total": totales por semana de todo el catálogo (sku = "TODOS")
+COLUMNAS_SEMANALES = ['demanda', 'demanda_sin_stockout', 'demanda_sin_outlier', 'unidades_perdidas']
+
+
+def demanda_disponible():
+    return "demanda_limpia" in st.session_state or "almacen_demanda_limpia" in st.session_state
+
+
+def demanda_semanal_sesion(sku=None):
+    """
+    Demanda limpia semanal para las páginas.
+    - sku=None: toda la demanda de la sesión; con almacén, los totales semanales (sku = "TODOS")
+    - sku: las semanas de ese SKU (con almacén, leídas sólo de su partición)
+    """
+    if "demanda_limpia" in st.session_state:
+        df = st.session_state["demanda_limpia"]
+        return df if sku is None else df[df['sku'] == sku]
+    if sku is None:
+        return st.session_state["demanda_semanal_total"]
+    df = leer_sku(st.session_state["almacen_demanda_limpia"], sku)
+    return df if df is not None else st.session_state["demanda_semanal_total"].iloc[0:0]
+
+
+def demanda_semanal_completa(columnas):
+    """Demanda semanal de todos los SKUs (sólo para exportaciones pedidas explícitamente)."""
+    if "demanda_limpia" in st.session_state:
+        return st.session_state["demanda_limpia"][columnas]
+    carpeta = st.session_state["almacen_demanda_limpia"]
+    df = pd.concat([df for _, df in iterar_particiones(carpeta, columnas)], ignore_index=True)
+    df['sku'] = df['sku'].astype(str)
+    return df.sort_values(['sku', 'fecha'], kind='stable').reset_index(drop=True)
+
+
+def iterar_demanda_limpia():
+    """Particiones de la demanda limpia de la sesión: una sola (toda la tabla) si no hay almacén."""
+    if "demanda_limpia" in st.session_state:
+        yield st.session_state["demanda_limpia"]
+        return
+    for _, df in iterar_particiones(st.session_state["almacen_demanda_limpia"]):
+        yield df
+
+
+def skus_demanda():
+    """SKUs con demanda registrada, sin recorrer la demanda semanal (desde el panel mensual)."""
+    panel = st.session_state.get("panel_mensual")
+    if panel is None:
+        return list(st.session_state["demanda_limpia"]['sku'].unique())
+    return list(panel.loc[panel['semanas'] > 0, 'sku'].unique())
@@ -0,0 +1,100 @@
+import re
+from collections import Counter
+import numpy as np
+import streamlit as st
+import unidecode
+
+K1 = 1.5
+B = 0.75
+LARGO_RAIZ = 5  # Raíz por prefijo: "arneses" y "arnés" comparten "arnes", "compra" y "comprar" comparten "compr"
+
+PALABRAS_VACIAS = {
+    "de", "del", "la", "las", "el", "los", "lo", "que", "en", "y", "o", "a", "al", "para", "con", "por", "un",
+    "una", "unos", "unas", "se", "me", "mi", "es", "son", "hay", "cual", "cuales", "como", "sku", "skus"
+}
+
+# --- Etiquetas derivadas de la fila de contexto, para buscar por estado del SKU ---
+ETIQUETAS_CONTEXTO = [
+    ('Unidades a Comprar', lambda s: s > 0, "comprar compra reponer pedido"),
+    ('Unidades Perdidas', lambda s: s > 0, "perdidas quiebre faltante"),
+    ('Unidades en Camino', lambda s: s > 0, "camino transito reposicion"),
+    ('Stock Proyectado', lambda s: s <= 0, "agotado sin stock"),
+]
+
+
+def tokenizar(texto):
+    """Términos en minúsculas y sin tildes, sin palabras vacías y recortados a su raíz por prefijo."""
+    palabras = re.findall(r"[a-z0-9]+", unidecode.unidecode(str(texto)).lower())
+    return [p[:LARGO_RAIZ] for p in palabras if p not in PALABRAS_VACIAS]
+
+
+def _documentos(df_contexto, df_maestro):
+    skus = df_contexto['SKU'].astype(str)
+    docs = skus + " " + skus.str.replace("-", "", regex=False)
+    if df_maestro is not None and not df_maestro.empty:
+        maestro = df_maestro.drop_duplicates('sku').set_index('sku')
+        for col in ['descripcion', 'categoria']:
+            if col in maestro.columns:
+                docs = docs + " " + skus.map(maestro[col]).fillna("").astype(str)
+    for col, condicion, etiquetas in ETIQUETAS_CONTEXTO:
+        if col in df_contexto.columns:
+            docs = docs + np.where(condicion(df_contexto[col]), " " + etiquetas, "")
+    return docs.tolist()
+
+
+def construir_indice_busqueda(df_contexto, df_maestro=None):
+    """
+    Índice BM25 en memoria sobre cada SKU: su código, descripción y categoría del maestro,
+    y etiquetas del estado de su fila de contexto (a comprar, con pérdidas, en camino, sin stock).
+
+    Guarda las listas invertidas con el peso BM25 ya calculado por (término, SKU), así una consulta
+    sólo suma los arreglos de sus términos.
+    """
+    skus = df_contexto['SKU'].astype(str).to_numpy()
+    tokens = [tokenizar(doc) for doc in _documentos(df_contexto, df_maestro)]
+    largos = np.array([len(t) for t in tokens], dtype=float)
+    promedio = largos.mean() if len(largos) and largos.mean() > 0 else 1.0
+
+    frecuencias = {}
+    for i, terminos in enumerate(tokens):
+        for termino, tf in Counter(terminos).items():
+            frecuencias.setdefault(termino, ([], []))
+            frecuencias[termino][0].append(i)
+            frecuencias[termino][1].append(tf)
+
+    n = len(skus)
+    listas = {}
+    for termino, (docs, tfs) in frecuencias.items():
+        docs = np.array(docs)
+        tfs = np.array(tfs, dtype=float)
+        idf = np.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+        pesos = idf * tfs * (K1 + 1) / (tfs + K1 * (1 - B + B * largos[docs] / promedio))
+        listas[termino] = (docs, pesos)
+    return {"skus": skus, "listas": listas}
+
+
+def buscar_skus(indice, consulta, top_k=10):
+    """SKUs con mayor puntaje BM25 para la consulta (sólo puntajes > 0), como lista de (sku, puntaje)."""
+    puntajes = np.zeros(len(indice["skus"]))
+    for termino in set(tokenizar(consulta)):
+        if termino in indice["listas"]:
+            docs, pesos = indice["listas"][termino]
+            puntajes[docs] += pesos
+    candidatos = np.flatnonzero(puntajes > 0)
+    if len(candidatos) > top_k:
+        candidatos = candidatos[np.argpartition(-puntajes[candidatos], top_k - 1)[:top_k]]
+    candidatos = candidatos[np.argsort(-puntajes[candidatos], kind='stable')]
+    return [(indice["skus"][i], float(puntajes[i])) for i in candidatos]
+
+
+def obtener_indice_busqueda(df_contexto, df_maestro=None):
+    """
+    Índice de búsqueda de la sesión, reconstruido sólo si cambió la tabla de contexto o el maestro
+    (comparados por identidad con las tablas guardadas, no por id()).
+    """
+    indice = st.session_state.get("indice_busqueda_contexto")
+    if indice is None or indice["contexto"] is not df_contexto or indice["maestro"] is not df_maestro:
+        indice = {"contexto": df_contexto, "maestro": df_maestro,
+                  "indice": construir_indice_busqueda(df_contexto, df_maestro)}
+        st.session_state["indice_busqueda_contexto"] = indice
+    return indice["indice"]
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+from types import SimpleNamespace
+
+# --- Configuración por variables de entorno ---
+# PLANITY_LLM_BACKEND=falso  -> cliente local sin red (pruebas y uso offline)
+# PLANITY_LLM_BASE_URL       -> servidor compatible con la API de OpenAI (p. ej. un servidor local)
+# PLANITY_LLM_CACHE_DIR      -> carpeta del caché de respuestas en disco
+BACKEND_FALSO = "falso"
+HISTORIAL_CACHE = 6  # Mensajes finales del historial que forman parte de la clave del caché
+
+
+class ClienteLLMFalso:
+    """
+    Cliente local con la interfaz de chat completions de OpenAI (`chat.completions.create`, con o sin stream).
+    Responde de forma determinista con un resumen de la pregunta y del contexto recibido.
+    """
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._crear))
+        self.llamadas = []
+
+    def _crear(self, model, messages, stream=False, **kwargs):
+        self.llamadas.append({"model": model, "messages": messages, "stream": stream})
+        pregunta = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        contexto = next((m["content"] for m in messages if m["role"] == "system"), "")
+        texto = (
+            f"🤖 Respuesta local ({model}) a: «{pregunta}». "
+            f"Contexto recibido: {len(contexto.splitlines())} líneas."
+        )
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=texto))])
+        return (
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=trozo))])
+            for trozo in re.findall(r"\S+\s*", texto)
+        )
+
+
+def crear_cliente_llm(api_key=None):
+    """Cliente según el entorno: el falso local, uno apuntado a PLANITY_LLM_BASE_URL o el de OpenAI."""
+    if os.environ.get("PLANITY_LLM_BACKEND", "").lower() == BACKEND_FALSO:
+        return ClienteLLMFalso()
+    from openai import OpenAI
+    base_url = os.environ.get("PLANITY_LLM_BASE_URL") or None
+    api_key = api_key or os.environ.get("OPENAI_API_KEY")
+    if base_url and not api_key:
+        api_key = "local"  # Los servidores locales compatibles no validan la clave
+    return OpenAI(api_key=api_key, base_url=base_url)
+
+
+def _normalizar_mensaje(texto):
+    return re.sub(r"\s+", " ", str(texto)).strip().lower()
+
+
+def clave_cache(modelo, contexto, historial, n_mensajes=HISTORIAL_CACHE):
+    """sha256 de (modelo, cola normalizada del historial, huella del contexto)."""
+    cola = [(m["role"], _normalizar_mensaje(m["content"])) for m in historial if m["role"] != "system"][-n_mensajes:]
+    huella_contexto = hashlib.sha256(contexto.encode("utf-8")).hexdigest()
+    return hashlib.sha256(json.dumps([modelo, cola, huella_contexto], ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _ruta_cache(clave):
+    carpeta = os.environ.get("PLANITY_LLM_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "planity_llm_cache")
+    os.makedirs(carpeta, exist_ok=True)
+    return os.path.join(carpeta, f"{clave}.json")
+
+
+def leer_cache(clave):
+    ruta = _ruta_cache(clave)
+    if not os.path.exists(ruta):
+        return None
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            return json.load(f)["respuesta"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def guardar_cache(clave, respuesta):
+    ruta = _ruta_cache(clave)
+    # Escritura atómica: un archivo a medio escribir nunca queda visible como entrada del caché
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump({"respuesta": respuesta}, f, ensure_ascii=False)
+    os.replace(temporal, ruta)
+
+
+def _trozos(respuesta_stream):
+    for chunk in respuesta_stream:
+        if not chunk.choices:
+            continue
+        trozo = chunk.choices[0].delta.content
+        if trozo:
+            yield trozo
+
+
+def transmitir_respuesta(cliente, modelo, mensajes, clave=None):
+    """
+    Generador con los trozos de la respuesta a medida que llegan (stream=True).
+    Con `clave`, una respuesta ya cacheada se entrega completa sin llamar al modelo,
+    y una respuesta nueva se guarda en el caché al terminar.
+    """
+    if clave is not None:
+        cacheada = leer_cache(clave)
+        if cacheada is not None:
+            yield cacheada
+            return
+    partes = []
+    for trozo in _trozos(cliente.chat.completions.create(model=modelo, messages=mensajes, stream=True)):
+        partes.append(trozo)
+        yield trozo
+    if clave is not None and partes:
+        guardar_cache(clave, "".join(partes))
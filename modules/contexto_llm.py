@@ -0,0 +1,177 @@
+import math
+from collections import Counter
+import pandas as pd
+import streamlit as st
+import unidecode
+from modules.aho_corasick import AutomataAhoCorasick
+from modules.busqueda_skus import buscar_skus
+
+PRESUPUESTO_TOKENS = 1500
+TOP_K = 10
+CARACTERES_POR_TOKEN = 4
+
+COLUMNAS_CONTEXTO = ['SKU', 'Forecast Promedio Mensual', 'Stock Proyectado', 'Unidades a Comprar', 'Unidades Perdidas',
+                     'Pérdida Hist. (€)', 'Tasa de Quiebre (%)', 'Demanda Real 12M', 'Demanda Limpia 12M',
+                     'ROP', 'EOQ', 'Safety Stock', 'Unidades en Camino']
+
+# --- Rankings según la intención de la pregunta (palabras clave sin tildes) ---
+RANKINGS_POR_INTENCION = [
+    (["perdida", "quiebre", "perdido", "faltaron"], 'Pérdida Hist. (€)', "SKUs con mayor pérdida histórica"),
+    (["comprar", "compra", "reponer", "pedido", "necesito"], 'Unidades a Comprar', "SKUs con más unidades a comprar"),
+    (["venta", "vendid", "demanda"], 'Demanda Real 12M', "SKUs con mayor demanda real 12M"),
+    (["forecast", "pronostico", "proyeccion", "prevision"], 'Forecast Promedio Mensual', "SKUs con mayor forecast"),
+    (["camino", "transito", "reposicion", "llegan", "vienen"], 'Unidades en Camino', "SKUs con más unidades en camino"),
+]
+RANKINGS_POR_DEFECTO = [('Pérdida Hist. (€)', "SKUs con mayor pérdida histórica"),
+                        ('Unidades a Comprar', "SKUs con más unidades a comprar")]
+
+
+def estimar_tokens(texto):
+    """Estimación gruesa de tokens (~4 caracteres por token), suficiente para respetar el presupuesto."""
+    return math.ceil(len(texto) / CARACTERES_POR_TOKEN)
+
+
+def _normalizar(texto):
+    return unidecode.unidecode(str(texto)).upper()
+
+
+def _normalizar_codigo(texto):
+    # Los guiones no cuentan: "CR-SML-4" y "CRSML4" son el mismo código
+    return _normalizar(texto).replace("-", "")
+
+
+def construir_indice_skus(skus):
+    """Autómata sobre los códigos SKU normalizados (mayúsculas, sin tildes ni guiones)."""
+    return AutomataAhoCorasick((_normalizar_codigo(sku), sku) for sku in pd.unique(pd.Series(skus).astype(str)))
+
+
+def obtener_indice_skus(df_contexto):
+    """
+    Índice de SKUs de la sesión, reconstruido sólo si cambió la tabla `contexto_negocio_por_sku`.
+    Guarda la tabla de origen y la compara por identidad (`is`): un id() puede repetirse en otra tabla.
+    """
+    indice = st.session_state.get("indice_skus_contexto")
+    if indice is None or indice["origen"] is not df_contexto:
+        indice = {"origen": df_contexto, "automata": construir_indice_skus(df_contexto["SKU"])}
+        st.session_state["indice_skus_contexto"] = indice
+    return indice["automata"]
+
+
+def detectar_skus(pregunta, indice):
+    """
+    SKUs mencionados en la pregunta, en una sola pasada del índice (construir_indice_skus).
+    Sólo cuentan las menciones completas (sin letras ni dígitos pegados: "A1" no aparece en "A12");
+    se ordenan por número de menciones y luego por la posición de la primera.
+    """
+    mensaje = _normalizar_codigo(pregunta)
+    menciones = Counter()
+    primera = {}
+    for inicio, fin, sku in indice.buscar(mensaje):
+        if (inicio > 0 and mensaje[inicio - 1].isalnum()) or (fin < len(mensaje) and mensaje[fin].isalnum()):
+            continue
+        menciones[sku] += 1
+        primera.setdefault(sku, inicio)
+    return sorted(menciones, key=lambda sku: (-menciones[sku], primera[sku]))
+
+
+def detectar_categorias(pregunta, df_maestro):
+    """Categorías del maestro mencionadas en la pregunta."""
+    if df_maestro is None or df_maestro.empty or 'categoria' not in df_maestro.columns:
+        return []
+    mensaje = _normalizar(pregunta)
+    categorias = df_maestro['categoria'].dropna().astype(str).unique()
+    return [c for c in categorias if _normalizar(c) in mensaje]
+
+
+def _linea_sku(row):
+    return (
+        f"{row['SKU']} | {row['Forecast Promedio Mensual']:.1f} | {row['Stock Proyectado']:.0f} | "
+        f"{max(row['Unidades a Comprar'], 0):.0f} | {row['Unidades Perdidas']:.0f} | {row['Pérdida Hist. (€)']:.0f} | "
+        f"{row['Tasa de Quiebre (%)']:.1f} | {row['Demanda Real 12M']:.0f} | {row['Demanda Limpia 12M']:.0f} | "
+        f"{row['ROP']:.0f} | {row['EOQ']:.0f} | {row['Safety Stock']:.0f} | {row['Unidades en Camino']:.0f}"
+    )
+
+
+def _texto_general(contexto_general):
+    lineas = ["Resumen general del negocio:"]
+    for clave, valor in (contexto_general or {}).items():
+        # Los detalles por SKU (listas) van en la tabla, no en el resumen
+        if isinstance(valor, (list, dict, pd.DataFrame)):
+            continue
+        lineas.append(f"- {clave}: {valor:,}" if isinstance(valor, (int, float)) else f"- {clave}: {valor}")
+    return "\n".join(lineas)
+
+
+def _rankings_relevantes(pregunta):
+    pregunta_limpia = unidecode.unidecode(pregunta.lower())
+    rankings = [(columna, titulo) for palabras, columna, titulo in RANKINGS_POR_INTENCION
+                if any(p in pregunta_limpia for p in palabras)]
+    return rankings or RANKINGS_POR_DEFECTO
+
+
+def construir_contexto_pregunta(pregunta, df_contexto, contexto_general, df_maestro=None,
+                                presupuesto_tokens=PRESUPUESTO_TOKENS, top_k=TOP_K, skus_detectados=None,
+                                indice_busqueda=None):
+    """
+    Arma el mensaje de sistema para una pregunta con sólo las filas relevantes de `contexto_negocio_por_sku`.
+
+    Prioridad (hasta agotar `presupuesto_tokens`):
+    1. Resumen general agregado (siempre)
+    2. SKUs mencionados en la pregunta
+    3. SKUs de las categorías mencionadas, ordenados por pérdida histórica
+    4. Top-k de la búsqueda BM25 sobre `indice_busqueda` (busqueda_skus), si se entrega
+    5. Top-k de los rankings que corresponden a la intención de la pregunta
+
+    Cada SKU se incluye una sola vez; retorna (texto, lista de SKUs incluidos).
+    """
+    encabezado = (
+        "Eres un asistente de planificación de inventarios. Responde sólo con los datos entregados; "
+        "si falta información, dilo.\n\n" + _texto_general(contexto_general) + "\n"
+    )
+    if df_contexto is None or df_contexto.empty:
+        return encabezado, []
+
+    df = df_contexto.drop_duplicates('SKU').set_index('SKU', drop=False)
+    if skus_detectados is None:
+        skus_detectados = detectar_skus(pregunta, construir_indice_skus(df.index))
+
+    bloques = [("SKUs mencionados", list(skus_detectados))]
+    categorias = detectar_categorias(pregunta, df_maestro)
+    if categorias:
+        skus_categoria = df_maestro.loc[df_maestro['categoria'].astype(str).isin(categorias), 'sku']
+        filas = df[df.index.isin(skus_categoria)]
+        bloques.append((f"SKUs de {', '.join(categorias)}",
+                        filas.sort_values('Pérdida Hist. (€)', ascending=False).index.tolist()))
+    if indice_busqueda is not None:
+        bloques.append(("SKUs más relevantes para la pregunta",
+                        [sku for sku, _ in buscar_skus(indice_busqueda, pregunta, top_k)]))
+    for columna, titulo in _rankings_relevantes(pregunta):
+        bloques.append((f"Top {top_k} {titulo}", df[columna].nlargest(top_k).index.tolist()))
+
+    texto = encabezado
+    usados = estimar_tokens(texto)
+    cabecera_tabla = "\nColumnas: " + " | ".join(COLUMNAS_CONTEXTO) + "\n"
+    incluidos = []
+    for titulo, skus in bloques:
+        nuevos = [sku for sku in dict.fromkeys(skus) if sku in df.index and sku not in incluidos]
+        if not nuevos:
+            continue
+        lineas = [_linea_sku(df.loc[sku]) for sku in nuevos]
+        seccion = (cabecera_tabla if not incluidos else "") + f"\n{titulo}:\n"
+        if usados + estimar_tokens(seccion + lineas[0]) > presupuesto_tokens:
+            break
+        texto += seccion
+        usados += estimar_tokens(seccion)
+        for sku, linea in zip(nuevos, lineas):
+            costo = estimar_tokens(linea + "\n")
+            if usados + costo > presupuesto_tokens:
+                return texto, incluidos
+            texto += linea + "\n"
+            usados += costo
+            incluidos.append(sku)
+    return texto, incluidos
+
+
+def mensajes_llm(contexto, historial, max_mensajes=20):
+    """Mensajes para chat completions: el contexto seleccionado como sistema y el historial reciente."""
+    return [{"role": "system", "content": contexto}] + [m for m in historial if m["role"] != "system"][-max_mensajes:]
@@ -0,0 +1,95 @@
+import pandas as pd
+
+TODOS = "ALL"
+
+COLUMNAS_CUBO = ['demanda', 'demanda_limpia', 'ventas_euros', 'unidades_perdidas', 'perdida_euros', 'semanas',
+                 'stock', 'forecast', 'stock_proyectado', 'perdida_proyectada_euros']
+
+
+def _agregar_todos(datos):
+    """Agrega las filas por SKU en filas (ALL, mes); 'semanas' toma el máximo y stock/futuro quedan NaN si faltan."""
+    por_mes = datos.groupby(level='mes')
+    todos = por_mes.sum()
+    todos['semanas'] = por_mes['semanas'].max()
+    for col in ['stock', 'forecast', 'stock_proyectado', 'perdida_proyectada_euros']:
+        todos[col] = por_mes[col].sum(min_count=1)
+    todos.index = pd.MultiIndex.from_product([[TODOS], todos.index], names=['sku', 'mes'])
+    return todos
+
+
+def construir_cubo_kpis(panel, df_forecast, df_proyeccion, df_maestro):
+    """
+    Cubo de KPIs de Resumen General indexado por (SKU o 'ALL', mes), construido una vez por carga.
+
+    - Historia (desde el panel mensual): demanda, demanda_limpia, ventas_euros (demanda × precio_venta),
+      unidades_perdidas, perdida_euros, semanas con demanda y stock histórico
+    - Futuro: forecast, stock_proyectado y perdida_proyectada_euros
+
+    Retorna {"datos": DataFrame del cubo, "ultimo_mes_completo": {clave: mes}, "rankings": rankings de 'ALL'}.
+    """
+    precio = df_maestro.drop_duplicates('sku').set_index('sku')['precio_venta'] if not df_maestro.empty else pd.Series(dtype=float)
+
+    hist = panel.set_index(['sku', 'mes'])
+    datos = pd.DataFrame({
+        'demanda': hist['demanda'],
+        'demanda_limpia': hist['demanda_limpia'],
+        'ventas_euros': hist['demanda'] * hist.index.get_level_values('sku').map(precio).to_numpy(),
+        'unidades_perdidas': hist['unidades_perdidas'],
+        'semanas': hist['semanas'],
+        'stock': hist['stock']
+    })
+    datos['perdida_euros'] = datos['unidades_perdidas'] * hist.index.get_level_values('sku').map(precio).to_numpy()
+
+    forecast = df_forecast[['sku', 'mes', 'forecast']].assign(mes=lambda d: pd.to_datetime(d['mes']))
+    forecast = forecast.groupby(['sku', 'mes'], observed=True)['forecast'].sum()
+    futuro = df_proyeccion.assign(mes=pd.to_datetime(df_proyeccion['mes'])).groupby(['sku', 'mes'], observed=True).agg(
+        stock_proyectado=('stock_final_mes', 'sum'),
+        perdida_proyectada_euros=('perdida_proyectada_euros', 'sum')
+    )
+
+    datos = datos.join(forecast, how='outer').join(futuro, how='outer')
+    # Stock, forecast y proyección quedan NaN en los meses en que no existen
+    rellenar = ['demanda', 'demanda_limpia', 'ventas_euros', 'unidades_perdidas', 'perdida_euros', 'semanas']
+    datos[rellenar] = datos[rellenar].fillna(0)
+    datos['semanas'] = datos['semanas'].astype(int)
+    datos = pd.concat([datos, _agregar_todos(datos)])[COLUMNAS_CUBO].sort_index()
+
+    # Último mes completo (>= 4 semanas con demanda) por SKU y para el total
+    completos = datos[datos['semanas'] >= 4].reset_index()
+    ultimo_mes_completo = completos.groupby('sku')['mes'].max().to_dict()
+
+    cubo = {"datos": datos, "ultimo_mes_completo": ultimo_mes_completo, "rankings": None}
+    if TODOS in ultimo_mes_completo:
+        cubo["rankings"] = calcular_rankings(cubo, TODOS)
+    return cubo
+
+
+def ventana_historica(cubo, clave, meses=12):
+    """Filas del cubo con demanda para la clave en los `meses` previos al último mes completo (inclusive)."""
+    fin = cubo["ultimo_mes_completo"][clave]
+    datos = cubo["datos"].loc[clave]
+    return datos[(datos.index >= fin - pd.DateOffset(months=meses)) & (datos.index <= fin) & (datos['semanas'] > 0)]
+
+
+def calcular_rankings(cubo, clave, top=10):
+    """Rankings de pérdidas y de ventas de la ventana de 12 meses; con clave 'ALL' compara todos los SKUs."""
+    fin = cubo["ultimo_mes_completo"][clave]
+    datos = cubo["datos"]
+    skus = datos.index.get_level_values('sku')
+    meses = datos.index.get_level_values('mes')
+    filtro = (meses >= fin - pd.DateOffset(months=12)) & (meses <= fin) & (datos['semanas'] > 0).to_numpy()
+    filtro &= (skus != TODOS) if clave == TODOS else (skus == clave)
+    ventana = datos[filtro]
+
+    por_sku = ventana.groupby(level='sku').agg(
+        demanda_mensual=('demanda', 'mean'),
+        pxq=('ventas_euros', 'sum'),
+        unidades_perdidas=('unidades_perdidas', 'sum'),
+        perdida_euros=('perdida_euros', 'sum')
+    ).reset_index()
+
+    perdidas = por_sku.sort_values(by='perdida_euros', ascending=False).head(top).reset_index(drop=True)
+    perdidas.insert(0, 'Ranking', range(1, len(perdidas) + 1))
+    ventas = por_sku.sort_values(by='pxq', ascending=False).head(top).reset_index(drop=True)
+    ventas.insert(0, 'Ranking', range(1, len(ventas) + 1))
+    return {"perdidas": perdidas, "ventas": ventas}
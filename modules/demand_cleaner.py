@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+from modules.esquemas import leer_csv
 
 st.title("Limpieza de demanda histórica")
 
@@ -33,7 +34,7 @@ def clean_demand(demand_df_raw):
         fecha_inicio = fecha_max - pd.DateOffset(months=11)
         ultimos_12 = df_stock[df_stock['mes'].between(fecha_inicio, fecha_max)]
 
-        resumen = ultimos_12.groupby(['sku', 'mes'])['stock'].sum().reset_index()
+        resumen = ultimos_12.groupby(['sku', 'mes'], observed=True)['stock'].sum().reset_index()
         resumen['sin_stock'] = resumen['stock'] == 0
         conteo_sin_stock = resumen.groupby('sku')['sin_stock'].sum()
         skus_obsoletos = conteo_sin_stock[conteo_sin_stock == 12].index.tolist()
@@ -158,7 +159,7 @@ def clean_demand(demand_df_raw):
 
 # Ejecutar limpieza
 if archivo_demanda is not None:
-    demand_df = pd.read_csv(archivo_demanda)
+    demand_df = leer_csv(archivo_demanda, "demanda_cruda")
     df_limpio = clean_demand(demand_df)
     st.session_state['demanda_limpia'] = df_limpio
 
@@ -0,0 +1,185 @@
+import pandas as pd
+from modules.stock_projector import project_stock
+
+COLUMNAS_TOTALES = ['forecast', 'repos_aplicadas', 'stock_final_mes', 'unidades_perdidas', 'perdida_proyectada_euros']
+
+
+def _totales_por_mes(df):
+    return df.groupby('mes')[COLUMNAS_TOTALES].sum()
+
+
+def crear_escenario(df_proyeccion):
+    """
+    Crea un escenario what-if a partir de la proyección consolidada (consolidar_proyeccion_futura).
+
+    El escenario guarda la proyección separada por SKU, los overrides aplicados y los totales
+    mensuales del catálogo, que luego se actualizan por diferencia al modificar un SKU.
+    """
+    df = df_proyeccion.copy()
+    df['mes'] = pd.to_datetime(df['mes'])
+    return {
+        "por_sku": {sku: grupo for sku, grupo in df.groupby('sku', sort=False)},
+        "overrides": {},
+        "totales": _totales_por_mes(df)
+    }
+
+
+def _normalizar_meses(valores):
+    return {pd.to_datetime(mes).to_period('M').to_timestamp(): valor for mes, valor in (valores or {}).items()}
+
+
+def _entradas_sku(sku, df_forecast, df_stock, df_repos, overrides):
+    """
+    Forecast, stock y reposiciones de un SKU con sus overrides aplicados.
+    Un override de forecast desplaza también forecast_up: el margen de error del mes se conserva.
+    """
+    stock_sku = df_stock[df_stock['sku'] == sku].copy()
+    if overrides.get('stock_inicial') is not None:
+        stock_sku['stock'] = int(overrides['stock_inicial'])
+
+    forecast_sku = df_forecast[df_forecast['sku'] == sku].copy()
+    forecast_sku['mes'] = pd.to_datetime(forecast_sku['mes'])
+    for mes, valor in _normalizar_meses(overrides.get('forecast')).items():
+        filas = forecast_sku['mes'] == mes
+        if 'forecast_up' in forecast_sku.columns:
+            forecast_sku.loc[filas, 'forecast_up'] += valor - forecast_sku.loc[filas, 'forecast']
+        forecast_sku.loc[filas, 'forecast'] = valor
+
+    if df_repos is not None and not df_repos.empty:
+        repos_sku = df_repos[df_repos['sku'] == sku][['sku', 'fecha', 'cantidad']].copy()
+        repos_sku['fecha'] = pd.to_datetime(repos_sku['fecha'], errors='coerce')
+    else:
+        repos_sku = pd.DataFrame({'sku': pd.Series(dtype=object), 'fecha': pd.Series(dtype='datetime64[ns]'),
+                                  'cantidad': pd.Series(dtype=int)})
+    repos_override = _normalizar_meses(overrides.get('reposiciones'))
+    if repos_override:
+        meses_repos = repos_sku['fecha'].dt.to_period('M').dt.to_timestamp()
+        repos_sku = pd.concat([
+            repos_sku[~meses_repos.isin(list(repos_override))],
+            pd.DataFrame({'sku': sku, 'fecha': list(repos_override), 'cantidad': list(repos_override.values())})
+        ], ignore_index=True)
+    return forecast_sku, stock_sku, repos_sku
+
+
+def proyectar_sku_con_overrides(sku, df_forecast, df_stock, df_repos, df_maestro, overrides=None):
+    """
+    Proyecta un único SKU aplicando overrides de forecast, reposiciones y stock inicial.
+
+    Overrides admitidos:
+    - 'forecast': {mes: unidades} reemplaza el forecast del mes
+    - 'reposiciones': {mes: unidades} reemplaza el total repuesto en el mes
+    - 'stock_inicial': unidades de stock al inicio de la proyección
+    """
+    overrides = overrides or {}
+
+    forecast_sku, stock_sku, repos_sku = _entradas_sku(sku, df_forecast, df_stock, df_repos, overrides)
+    if stock_sku.empty:
+        return pd.DataFrame()
+    fecha_inicio = pd.to_datetime(stock_sku['fecha']).dt.to_period('M').dt.to_timestamp().min()
+
+    precio_venta = None
+    if df_maestro is not None and not df_maestro.empty:
+        info_maestro = df_maestro[df_maestro['sku'] == sku]
+        if not info_maestro.empty:
+            precio_venta = info_maestro.iloc[0]['precio_venta']
+
+    return project_stock(
+        df_forecast=forecast_sku,
+        df_stock=stock_sku,
+        df_repos=repos_sku,
+        sku=sku,
+        fecha_inicio=fecha_inicio,
+        precio_venta=precio_venta
+    )
+
+
+def _reemplazar_sku(escenario, sku, df_nuevo):
+    anterior = escenario["por_sku"].get(sku)
+
+    if not df_nuevo.empty:
+        # Conservar las columnas del maestro que trae la proyección consolidada
+        if anterior is not None and not anterior.empty:
+            extras = [c for c in anterior.columns if c not in df_nuevo.columns]
+            for col in extras:
+                df_nuevo[col] = anterior[col].iloc[0]
+            df_nuevo = df_nuevo[list(anterior.columns)]
+        else:
+            df_nuevo['sku'] = sku
+        df_nuevo['mes'] = pd.to_datetime(df_nuevo['mes'])
+
+    # --- Actualización por diferencia de los totales mensuales ---
+    totales = escenario["totales"]
+    if anterior is not None and not anterior.empty:
+        totales = totales.sub(_totales_por_mes(anterior), fill_value=0)
+    if not df_nuevo.empty:
+        totales = totales.add(_totales_por_mes(df_nuevo), fill_value=0)
+    escenario["totales"] = totales.sort_index()
+
+    if df_nuevo.empty:
+        escenario["por_sku"].pop(sku, None)
+    else:
+        escenario["por_sku"][sku] = df_nuevo.reset_index(drop=True)
+
+
+def aplicar_override(escenario, sku, df_forecast, df_stock, df_repos, df_maestro,
+                     forecast=None, reposiciones=None, stock_inicial=None):
+    """
+    Agrega overrides a un SKU del escenario y recalcula sólo la proyección de ese SKU.
+
+    - forecast / reposiciones: diccionarios {mes: unidades}, se suman a los overrides previos del SKU
+    - stock_inicial: reemplaza el stock inicial del SKU
+    """
+    overrides = escenario["overrides"].setdefault(sku, {})
+    if forecast:
+        overrides.setdefault('forecast', {}).update(_normalizar_meses(forecast))
+    if reposiciones:
+        overrides.setdefault('reposiciones', {}).update(_normalizar_meses(reposiciones))
+    if stock_inicial is not None:
+        overrides['stock_inicial'] = stock_inicial
+
+    df_nuevo = proyectar_sku_con_overrides(sku, df_forecast, df_stock, df_repos, df_maestro, overrides)
+    _reemplazar_sku(escenario, sku, df_nuevo)
+    return escenario["por_sku"].get(sku, pd.DataFrame())
+
+
+def quitar_overrides(escenario, sku, df_forecast, df_stock, df_repos, df_maestro):
+    """Elimina los overrides de un SKU y restaura su proyección base."""
+    if escenario["overrides"].pop(sku, None) is None:
+        return escenario["por_sku"].get(sku, pd.DataFrame())
+    df_nuevo = proyectar_sku_con_overrides(sku, df_forecast, df_stock, df_repos, df_maestro)
+    _reemplazar_sku(escenario, sku, df_nuevo)
+    return escenario["por_sku"].get(sku, pd.DataFrame())
+
+
+def clave_escenario(escenario):
+    """Identifica el estado del escenario: huella de la proyección base y overrides aplicados."""
+    overrides = sorted(
+        (str(sku), sorted((tipo, sorted(valor.items()) if isinstance(valor, dict) else valor)
+                          for tipo, valor in cambios.items()))
+        for sku, cambios in escenario["overrides"].items()
+    )
+    return (escenario.get("huella_base"), repr(overrides))
+
+
+def entradas_escenario(escenario, df_forecast, df_stock, df_repos):
+    """
+    Forecast, stock actual y reposiciones del catálogo con los overrides del escenario aplicados,
+    para cálculos que recorren todos los SKUs (p. ej. simular_stock_montecarlo).
+    """
+    if not escenario["overrides"]:
+        return df_forecast, df_stock, df_repos
+    skus = list(escenario["overrides"])
+    partes = [_entradas_sku(sku, df_forecast, df_stock, df_repos, cambios)
+              for sku, cambios in escenario["overrides"].items()]
+    forecast = pd.concat([df_forecast[~df_forecast['sku'].isin(skus)]] + [p[0] for p in partes], ignore_index=True)
+    stock = pd.concat([df_stock[~df_stock['sku'].isin(skus)]] + [p[1] for p in partes], ignore_index=True)
+    repos_base = [df_repos[~df_repos['sku'].isin(skus)]] if df_repos is not None and not df_repos.empty else []
+    repos = pd.concat(repos_base + [p[2] for p in partes], ignore_index=True)
+    return forecast, stock, repos
+
+
+def proyeccion_escenario(escenario):
+    """Proyección completa del escenario (sólo para exportar; las vistas usan por_sku y totales)."""
+    if not escenario["por_sku"]:
+        return pd.DataFrame()
+    return pd.concat(escenario["por_sku"].values(), ignore_index=True)
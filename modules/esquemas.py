@@ -0,0 +1,130 @@
+import importlib.util
+import pandas as pd
+
+# Motor de lectura: el lector CSV de pyarrow (multihilo) si está instalado, si no el de C de pandas
+MOTOR_CSV = "pyarrow" if importlib.util.find_spec("pyarrow") is not None else "c"
+
+# --- Registro de esquemas de los cinco archivos de entrada ---
+# - obligatorias: columnas que deben venir en el archivo
+# - enteras: numéricas enteras (no numéricos y vacíos quedan en 0)
+# - decimales: numéricas con decimales (no numéricos quedan NaN)
+# - fechas: se parsean a datetime (valores inválidos quedan NaT)
+# - texto: columnas de texto
+# El SKU se guarda siempre como categoría.
+ESQUEMAS = {
+    "demanda_cruda": {
+        "nombre": "demanda",
+        "obligatorias": ["sku", "fecha", "demanda"],
+        "enteras": ["demanda"],
+        "decimales": [],
+        "fechas": ["fecha"],
+        "texto": [],
+    },
+    "stock_historico": {
+        "nombre": "stock histórico",
+        "obligatorias": ["sku", "fecha", "stock"],
+        "enteras": ["stock"],
+        "decimales": [],
+        "fechas": ["fecha"],
+        "texto": [],
+    },
+    "stock_actual": {
+        "nombre": "stock actual",
+        "obligatorias": ["sku", "descripcion", "stock", "fecha"],
+        "enteras": ["stock"],
+        "decimales": [],
+        "fechas": ["fecha"],
+        "texto": ["descripcion"],
+    },
+    "reposiciones": {
+        "nombre": "reposiciones",
+        "obligatorias": ["sku", "fecha", "cantidad"],
+        "enteras": ["cantidad"],
+        "decimales": [],
+        "fechas": ["fecha"],
+        "texto": [],
+    },
+    "maestro": {
+        "nombre": "maestro",
+        "obligatorias": ["sku", "descripcion", "costo_fabricacion", "precio_venta", "categoria"],
+        "enteras": [],
+        "decimales": ["costo_fabricacion", "precio_venta", "margen"],
+        "fechas": [],
+        "texto": ["descripcion", "categoria"],
+    },
+}
+
+
+def columnas_faltantes(df, clave):
+    return set(ESQUEMAS[clave]["obligatorias"]) - set(df.columns)
+
+
+def mensaje_columnas_faltantes(faltantes):
+    return f"⚠️ Faltan columnas: {faltantes}"
+
+
+def _tipos_lectura(clave):
+    esquema = ESQUEMAS[clave]
+    tipos = {"sku": "str"}
+    tipos.update({col: "str" for col in esquema["texto"]})
+    return tipos
+
+
+def aplicar_esquema(df, clave):
+    """
+    Valida y tipa un DataFrame según su esquema. Lanza ValueError con el mensaje de columnas faltantes.
+    Las columnas fuera del esquema se dejan como vienen.
+    """
+    faltantes = columnas_faltantes(df, clave)
+    if faltantes:
+        raise ValueError(mensaje_columnas_faltantes(faltantes))
+    esquema = ESQUEMAS[clave]
+    df = df.dropna(subset=["sku"]) if df["sku"].isna().any() else df.copy()
+
+    for col in esquema["fechas"]:
+        if not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+    for col in esquema["enteras"]:
+        if not pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype("int64")
+    for col in esquema["decimales"]:
+        if col in df.columns and not pd.api.types.is_float_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+    if not isinstance(df["sku"].dtype, pd.CategoricalDtype):
+        df["sku"] = df["sku"].astype(str).astype("category")
+    return df.reset_index(drop=True)
+
+
+def leer_csv(origen, clave):
+    """Lee un CSV (ruta o archivo subido) con el motor más rápido disponible y le aplica su esquema."""
+    if hasattr(origen, "seek"):
+        origen.seek(0)
+    presentes = set(pd.read_csv(origen, nrows=0).columns)
+    if hasattr(origen, "seek"):
+        origen.seek(0)
+    tipos = {col: tipo for col, tipo in _tipos_lectura(clave).items() if col in presentes}
+    try:
+        df = pd.read_csv(origen, engine=MOTOR_CSV, dtype=tipos)
+    except Exception:
+        if MOTOR_CSV == "c":
+            raise
+        # El motor pyarrow aplica `dtype` de forma estricta y falla con columnas numéricas con vacíos
+        # (p. ej. costos en blanco del maestro); el motor C lee el mismo archivo sin problema
+        if hasattr(origen, "seek"):
+            origen.seek(0)
+        df = pd.read_csv(origen, engine="c", dtype=tipos)
+    return aplicar_esquema(df, clave)
+
+
+def leer_csv_por_bloques(origen, clave, tamano_bloque):
+    """
+    Lee un CSV en bloques de `tamano_bloque` filas (motor C de pandas, el único con lectura por bloques)
+    y entrega cada bloque ya tipado según su esquema. La memoria queda acotada por el bloque, no por el archivo.
+    """
+    presentes = set(pd.read_csv(origen, nrows=0).columns)
+    if hasattr(origen, "seek"):
+        origen.seek(0)
+    tipos = {col: tipo for col, tipo in _tipos_lectura(clave).items() if col in presentes}
+    with pd.read_csv(origen, dtype=tipos, chunksize=tamano_bloque) as lector:
+        for bloque in lector:
+            yield aplicar_esquema(bloque, clave)
@@ -1,5 +1,48 @@
 import pandas as pd
+import numpy as np
 from dateutil.relativedelta import relativedelta
+from modules.reposiciones import reposicion_mes
+
+MESES_SIMULADOS = 5
+
+
+def evaluar_compra_lote(stock_inicial, demanda_mensual, safety_stock, eoq, repos_matriz, meses_simulados=MESES_SIMULADOS):
+    """
+    Evalúa la compra de todos los SKUs a la vez.
+
+    Parámetros (arreglos de largo n, uno por SKU):
+    - stock_inicial, demanda_mensual, safety_stock
+    - eoq: cantidad a comprar; NaN para sugerir la diferencia contra el umbral
+    - repos_matriz: arreglo n × meses con las reposiciones de los meses simulados
+
+    Retorna un DataFrame con columnas ['accion', 'sugerido', 'stock_final_simulado', 'umbral'].
+    """
+    stock_inicial = np.asarray(stock_inicial, dtype=float)
+    demanda_mensual = np.asarray(demanda_mensual, dtype=float)
+    safety_stock = np.asarray(safety_stock, dtype=float)
+    eoq = np.asarray(eoq, dtype=float)
+    repos = np.asarray(repos_matriz, dtype=float).reshape(len(stock_inicial), -1)[:, :meses_simulados]
+
+    # Simulación mensual de stock
+    unidades_en_camino = repos.sum(axis=1)
+    stock = stock_inicial + unidades_en_camino - demanda_mensual * meses_simulados
+
+    # Con unidades en camino se compara el stock final contra el safety stock;
+    # sin ellas, el stock inicial contra la demanda del período más el safety stock
+    hay_camino = unidades_en_camino > 0
+    umbral = np.where(hay_camino, safety_stock, np.round(demanda_mensual * meses_simulados + safety_stock))
+    comparar_con = np.where(hay_camino, np.round(stock), stock_inicial)
+
+    comprar = comparar_con < umbral
+    sugerido = np.where(comprar, np.round(np.where(np.isnan(eoq), umbral - comparar_con, eoq)), 0)
+
+    return pd.DataFrame({
+        "accion": np.where(comprar, "Comprar", "No comprar"),
+        "sugerido": sugerido.astype(int),
+        "stock_final_simulado": np.round(stock).astype(int),
+        "umbral": umbral
+    })
+
 
 def evaluar_compra_sku(
     sku: str,
@@ -8,14 +51,18 @@ def evaluar_compra_sku(
     demanda_mensual: float,
     safety_stock: float,
     eoq: float,
-    df_repos: pd.DataFrame = None
+    df_repos: pd.DataFrame = None,
+    calendario: dict = None
 ):
-    meses_simulados = 5
-    stock = stock_inicial
+    meses_simulados = MESES_SIMULADOS
 
     # Procesar reposiciones por mes
     repos_por_mes = {i: 0 for i in range(meses_simulados)}
-    if df_repos is not None and not df_repos.empty:
+    if calendario is not None:
+        for i in range(meses_simulados):
+            mes_sim = (fecha_actual + relativedelta(months=i)).to_period('M').to_timestamp()
+            repos_por_mes[i] = reposicion_mes(calendario, sku, mes_sim)
+    elif df_repos is not None and not df_repos.empty:
         df_sku = df_repos[df_repos['sku'] == sku].copy()
         df_sku['mes'] = df_sku['fecha'].dt.to_period('M').dt.to_timestamp()
         for i in range(meses_simulados):
@@ -23,34 +70,16 @@ def evaluar_compra_sku(
             cantidad = df_sku[df_sku['mes'] == mes_sim]['cantidad'].sum()
             repos_por_mes[i] = cantidad
 
-    # Simulación mensual de stock
-    for i in range(meses_simulados):
-        stock += repos_por_mes[i]
-        stock -= demanda_mensual
-
-    # Determinar si hay unidades en camino
-    unidades_en_camino = sum(repos_por_mes.values())
-
-    # Evaluar umbral y qué comparar
-    if unidades_en_camino > 0:
-        umbral = safety_stock
-        comparar_con = round(stock)
-    else:
-        umbral = round((demanda_mensual * meses_simulados) + safety_stock)
-        comparar_con = stock_inicial
-
-    # Decisión
-    if comparar_con < umbral:
-        accion = "Comprar"
-        sugerido = round(eoq if eoq is not None else umbral - comparar_con)
-    else:
-        accion = "No comprar"
-        sugerido = 0
+    resultado = evaluar_compra_lote(
+        [stock_inicial], [demanda_mensual], [safety_stock],
+        [np.nan if eoq is None else eoq],
+        [list(repos_por_mes.values())],
+        meses_simulados
+    ).iloc[0]
 
     return {
-        "accion": accion,
-        "sugerido": sugerido,
-        "stock_final_simulado": round(stock),
-        "umbral": umbral
+        "accion": resultado["accion"],
+        "sugerido": int(resultado["sugerido"]),
+        "stock_final_simulado": int(resultado["stock_final_simulado"]),
+        "umbral": resultado["umbral"]
     }
-
@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
 from statsmodels.tsa.holtwinters import ExponentialSmoothing, Holt, SimpleExpSmoothing
+from modules.panel_mensual import panel_con_demanda
 
 # --- Métodos de forecast ---
 def forecast_promedio_movil(serie, ventana=4):
@@ -93,18 +94,28 @@ def safe_forecast(serie, metodo_forecast):
 
     return round(pred)
 
-# --- Forecast principal ---
-def forecast_engine(df, lead_time_meses=3):
+# --- Demanda mensual (desde el panel mensual de la sesión si está disponible) ---
+def demanda_mensual(df, panel=None):
+    if panel is not None:
+        return panel_con_demanda(panel)[['sku', 'mes', 'demanda', 'demanda_limpia']].reset_index(drop=True)
+
     df['fecha'] = pd.to_datetime(df['fecha'])
     df['mes'] = df['fecha'].dt.to_period('M')
-    df_mensual = df.groupby(['sku', 'mes']).agg({
+    df_mensual = df.groupby(['sku', 'mes'], observed=True).agg({
         'demanda': 'sum',
         'demanda_sin_outlier': 'sum'
     }).reset_index()
     df_mensual.rename(columns={'demanda_sin_outlier': 'demanda_limpia'}, inplace=True)
     df_mensual['mes'] = df_mensual['mes'].dt.to_timestamp()
+    return df_mensual
+
+# --- Forecast principal ---
+def forecast_engine(df, lead_time_meses=3, panel=None, ultimo_mes=None):
+    # ultimo_mes: último mes de todo el histórico, para que un subconjunto de SKUs
+    # (p. ej. una partición del almacén de demanda) use el mismo horizonte que el total
+    df_mensual = demanda_mensual(df, panel)
 
-    last_month = df_mensual['mes'].max()
+    last_month = df_mensual['mes'].max() if ultimo_mes is None else ultimo_mes
     forecast_horizon = pd.date_range(start=last_month + pd.DateOffset(months=1), periods=6, freq='MS')
 
     resultados = []
@@ -218,18 +229,10 @@ def forecast_engine(df, lead_time_meses=3):
 
 
 
-def generar_comparativa_forecasts(df, horizonte_meses=6):
-    df['fecha'] = pd.to_datetime(df['fecha'])
-    df['mes'] = df['fecha'].dt.to_period('M')
-    df_mensual = df.groupby(['sku', 'mes']).agg({
-        'demanda': 'sum',
-        'demanda_sin_outlier': 'sum'
-    }).reset_index()
-
-    df_mensual.rename(columns={'demanda_sin_outlier': 'demanda_limpia'}, inplace=True)
-    df_mensual['mes'] = df_mensual['mes'].dt.to_timestamp()
+def generar_comparativa_forecasts(df, horizonte_meses=6, panel=None, ultimo_mes=None):
+    df_mensual = demanda_mensual(df, panel)
 
-    last_month = df_mensual['mes'].max()
+    last_month = df_mensual['mes'].max() if ultimo_mes is None else ultimo_mes
     forecast_horizon = pd.date_range(start=last_month + pd.DateOffset(months=1), periods=horizonte_meses, freq='MS')
 
     resultados = []
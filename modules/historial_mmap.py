@@ -0,0 +1,94 @@
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+import streamlit as st
+from utils.huella import huella_sesion
+
+# --- Almacén de historiales en archivos NumPy mapeados en memoria ---
+# Cada columna se guarda como un .npy con las filas ordenadas por (sku, fecha), así la serie de un SKU
+# queda contigua; indice.json guarda SKU -> (offset, largo). Leer un SKU es un slice del memmap (sin copia)
+# y todas las sesiones y procesos que abren la misma carpeta comparten las páginas del sistema operativo.
+#
+# Alcance: el almacén es una vía de lectura por SKU, no reemplaza las tablas de la sesión. El panel mensual
+# (y, sin almacén particionado, la demanda semanal) sigue en st.session_state porque lo usan forecast,
+# políticas y cubo de KPIs; lo que se evita es filtrar y copiar el panel en cada consulta por SKU.
+ARCHIVO_INDICE = "indice.json"
+
+# Historial mensual SKU × mes del panel (demanda y stock) que usan los gráficos por SKU
+COLUMNAS_PANEL = ("demanda", "demanda_limpia", "semanas", "stock")
+
+
+def carpeta_historiales():
+    carpeta = os.environ.get("PLANITY_HISTORIAL_DIR") or os.path.join(tempfile.gettempdir(), "planity_historial")
+    os.makedirs(carpeta, exist_ok=True)
+    return carpeta
+
+
+def construir_historial(df, carpeta, columna_fecha, columnas):
+    """
+    Escribe el almacén de `df` en `carpeta`: un .npy por columna (más la de fechas) y el índice por SKU.
+    Se escribe en una carpeta temporal y se publica al final; si otro proceso ya publicó la misma
+    carpeta, se conserva la existente.
+    """
+    df = df.sort_values(['sku', columna_fecha], kind='stable')
+    skus = df['sku'].astype(str).to_numpy()
+    cambios = np.flatnonzero(skus[1:] != skus[:-1]) + 1
+    inicios = np.concatenate([[0], cambios]) if len(skus) else np.array([], dtype=int)
+    largos = np.diff(np.concatenate([inicios, [len(skus)]]))
+
+    temporal = f"{carpeta}.{os.getpid()}.tmp"
+    shutil.rmtree(temporal, ignore_errors=True)
+    os.makedirs(temporal)
+    np.save(os.path.join(temporal, "fecha.npy"), pd.to_datetime(df[columna_fecha]).to_numpy())
+    for col in columnas:
+        np.save(os.path.join(temporal, f"{col}.npy"), df[col].to_numpy())
+    indice = {
+        "columnas": list(columnas),
+        "skus": {skus[i]: [int(i), int(n)] for i, n in zip(inicios, largos)},
+    }
+    with open(os.path.join(temporal, ARCHIVO_INDICE), "w", encoding="utf-8") as f:
+        json.dump(indice, f)
+    try:
+        os.replace(temporal, carpeta)
+    except OSError:
+        shutil.rmtree(temporal, ignore_errors=True)
+
+
+def abrir_historial(carpeta):
+    """Abre el almacén en modo sólo lectura: {"indice": {...}, "fecha": memmap, <columna>: memmap}."""
+    with open(os.path.join(carpeta, ARCHIVO_INDICE), encoding="utf-8") as f:
+        indice = json.load(f)
+    historial = {"indice": indice["skus"], "columnas": indice["columnas"]}
+    for col in ["fecha"] + indice["columnas"]:
+        historial[col] = np.load(os.path.join(carpeta, f"{col}.npy"), mmap_mode="r")
+    return historial
+
+
+def serie_sku(historial, sku):
+    """Serie de un SKU como DataFrame (fecha + columnas) sobre slices del memmap, sin copiar los datos."""
+    inicio, largo = historial["indice"].get(str(sku), (0, 0))
+    fin = inicio + largo
+    datos = {"fecha": historial["fecha"][inicio:fin]}
+    datos.update({col: historial[col][inicio:fin] for col in historial["columnas"]})
+    return pd.DataFrame(datos, copy=False)
+
+
+@st.cache_resource(show_spinner=False)
+def historial_compartido(nombre, huella, _df, columna_fecha, columnas):
+    """
+    Almacén compartido entre sesiones: uno por contenido (huella) de los datos.
+    El DataFrame (`_df`, fuera de la clave del caché) sólo se usa si la carpeta aún no existe.
+    """
+    carpeta = os.path.join(carpeta_historiales(), f"{nombre}_{huella}")
+    if not os.path.exists(os.path.join(carpeta, ARCHIVO_INDICE)):
+        construir_historial(_df, carpeta, columna_fecha, columnas)
+    return abrir_historial(carpeta)
+
+
+def obtener_historial_panel():
+    """Historial mensual del panel de la sesión, identificado por la huella de su contenido."""
+    return historial_compartido("panel_mensual", huella_sesion("panel_mensual"), st.session_state["panel_mensual"],
+                                "mes", COLUMNAS_PANEL)
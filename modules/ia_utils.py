@@ -1,128 +1,235 @@
 import streamlit as st
 import pandas as pd
 import unidecode
+from modules.aho_corasick import AutomataAhoCorasick
+from utils.huella import huella_datos
+from modules.almacen_demanda import demanda_disponible, demanda_semanal_completa, demanda_semanal_sesion
+
+# --- Intenciones en orden de prioridad: (intención, listas de palabras requeridas, palabras excluyentes) ---
+# Una intención aplica si cada lista requerida tiene al menos una palabra en la pregunta y ninguna excluyente aparece.
+INTENCIONES = [
+    ("ranking_perdidas", [["top perdidas", "mayor perdidas", "mas perdidas", "quiebre alto", "productos que mas se pierden", "ranking perdidas", "sku con mas perdidas", "sku con mayor perdida", "sku mas perdidas", "productos con mas perdidas", "mas quiebres", "top 10 perdidas", "top de perdidas", "top 10 de perdidas"]], []),
+    ("ranking_ventas", [["top ventas", "top de ventas", "mas vendidos", "productos mas vendidos", "ventas altas", "mayor venta", "skus mas vendidos", "top 10 de ventas", "con mas ventas", "productos que mas venden", "mayores ventas", "mas ventas"]], []),
+    ("descarga_compras", [["excel", "descargar", "detalle", "archivo"], ["comprar", "compras", "reponer"]], []),
+    ("descarga_demanda", [["excel", "descargar", "archivo"], ["demanda historica", "demanda pasada", "real", "historial"]], []),
+    ("descarga_politicas", [["excel", "descargar", "archivo", "detalle"], ["politica", "rop", "eoq", "safety"]], []),
+    ("descarga_forecast", [["excel", "descargar", "archivo"], ["forecast", "pronostico", "proyeccion"]], []),
+    ("en_camino", [["en camino", "en transito", "vienen", "reposiciones", "en viaje"]], []),
+    ("stock_total", [["stock", "inventario", "existencias", "disponible", "tenemos"]], []),
+    ("politicas", [["politica", "rop", "eoq", "safety", "inventario de seguridad"]], []),
+    ("compra_sugerida", [["cuanto", "cuantas", "deberia", "necesito", "reponer", "comprar"]],
+     ["stock", "inventario", "existencias", "politica", "en camino", "en transito", "reposiciones", "vienen"]),
+    ("costo_total", [["costo", "cuanto cuesta", "valor total", "precio total", "fabricacion total"]], []),
+    ("ventas_totales", [["vendidas", "venta real", "demanda real", "cuanto se ha vendido", "demanda historica", "ventas totales"]], []),
+    ("perdidas_totales", [["perdidas", "productos perdidos", "no se vendieron", "unidades que faltaron"]], []),
+    ("perdidas_euros", [["euros", "valor perdido", "venta perdida", "perdida economica"]], []),
+    ("tasa_quiebre", [["tasa de quiebre", "porcentaje perdido", "nivel de servicio", "break rate"]], []),
+]
+
+
+def _compilar_intenciones(intenciones):
+    """
+    Un único autómata con todas las palabras clave. Cada palabra apunta a su lista dentro de la intención:
+    (intención, i) para la i-ésima lista requerida y (intención, None) para las excluyentes.
+    """
+    patrones = []
+    for intencion, requeridas, excluyentes in intenciones:
+        for i, lista in enumerate(requeridas):
+            patrones += [(palabra, (intencion, i)) for palabra in lista]
+        patrones += [(palabra, (intencion, None)) for palabra in excluyentes]
+    reglas = [(intencion, [(intencion, i) for i in range(len(requeridas))], (intencion, None))
+              for intencion, requeridas, _ in intenciones]
+    return AutomataAhoCorasick(patrones), reglas
+
+
+_AUTOMATA_INTENCIONES, _REGLAS_INTENCIONES = _compilar_intenciones(INTENCIONES)
+
+
+def detectar_intenciones(pregunta):
+    """
+    Intenciones que aplican a la pregunta, en orden de prioridad, con una sola pasada del autómata
+    sobre el texto en minúsculas y sin tildes.
+    """
+    grupos = _AUTOMATA_INTENCIONES.valores(unidecode.unidecode(pregunta.lower()))
+    return [
+        intencion for intencion, requeridos, excluyente in _REGLAS_INTENCIONES
+        if all(g in grupos for g in requeridos) and excluyente not in grupos
+    ]
+
+
+# --- Exportaciones descargables: (clave de sesión, columnas o None para todas, filas de vista previa o None) ---
+EXPORTACIONES = {
+    "compras": ("contexto_negocio_por_sku", ["SKU", "Unidades a Comprar"], None),
+    "demanda": ("demanda_limpia", ["sku", "fecha", "demanda", "demanda_sin_outlier"], 50),
+    "politicas": ("contexto_negocio_por_sku", ["SKU", "ROP", "EOQ", "Safety Stock"], None),
+    "forecast": ("forecast", ["sku", "mes", "demanda", "demanda_limpia", "forecast", "tipo_mes"], 50),
+    "contexto": ("contexto_negocio_por_sku", None, None),
+}
+
+
+def calcular_huella_contexto():
+    """Huella de los datos con que se responden las intenciones generales."""
+    return huella_datos(*(st.session_state.get(clave) for clave in
+                          ["contexto_negocio_por_sku", "resumen_historico", "panel_mensual", "forecast", "stock_actual"]))
+
+
+def _texto_ranking(top, columna, titulo, unidad):
+    lineas = (top.index.to_series().add(1).astype(str).to_numpy() + ". " + top['sku'].astype(str).to_numpy() + ": "
+              + top[columna].astype(int).astype(str).to_numpy() + f" {unidad}\n")
+    return titulo + "".join(lineas)
+
+
+def construir_material_respuestas(huella):
+    """
+    Material precalculado para las intenciones generales: rankings, totales y la tasa de quiebre.
+    Las exportaciones se codifican a CSV la primera vez que se piden y quedan guardadas aquí.
+    """
+    df_hist = st.session_state.get("resumen_historico", pd.DataFrame())
+    df_stock = st.session_state.get("stock_actual", pd.DataFrame())
+    # Con almacén particionado, los totales semanales del catálogo (la suma es la misma)
+    df_demand = demanda_semanal_sesion() if demanda_disponible() else pd.DataFrame()
+    material = {"huella": huella, "exportaciones": {}, "top_perdidas": None, "top_ventas": None, "tasa_quiebre": None}
+
+    material["total_stock"] = int(df_stock['stock'].sum()) if not df_stock.empty else 0
+    material["total_vendidas"] = int(df_demand["demanda"].sum()) if not df_demand.empty else 0
+    material["total_perdidas"] = 0
+    material["perdidas_euros"] = 0
+    if not df_hist.empty:
+        por_sku = df_hist.groupby("sku")[["unidades_perdidas", "demanda_real"]].sum()
+        top = por_sku["unidades_perdidas"].sort_values(ascending=False).head(10).reset_index()
+        material["top_perdidas"] = _texto_ranking(top, "unidades_perdidas", "🔝 Top 10 SKUs con más unidades perdidas:\n\n", "unidades perdidas")
+        top = por_sku["demanda_real"].sort_values(ascending=False).head(10).reset_index()
+        material["top_ventas"] = _texto_ranking(top, "demanda_real", "🏆 Top 10 SKUs más vendidos (demanda real):\n\n", "unidades vendidas")
+
+        perdidas = df_hist["unidades_perdidas"].sum()
+        vendidas = df_hist["demanda_real"].sum()
+        material["total_perdidas"] = int(perdidas)
+        material["perdidas_euros"] = int(df_hist["valor_perdido_euros"].sum())
+        material["tasa_quiebre"] = (perdidas / (vendidas + perdidas) * 100) if (vendidas + perdidas) > 0 else 0
+    return material
+
+
+def obtener_material_respuestas():
+    """Material de respuestas de la sesión; se reconstruye cuando cambia la huella del contexto."""
+    huella = st.session_state.get("huella_contexto")
+    if huella is None:
+        huella = calcular_huella_contexto()
+        st.session_state["huella_contexto"] = huella
+    material = st.session_state.get("material_respuestas")
+    if material is None or material["huella"] != huella:
+        material = construir_material_respuestas(huella)
+        st.session_state["material_respuestas"] = material
+    return material
+
+
+def obtener_exportacion(material, clave):
+    """(vista previa, bytes CSV) de una exportación, codificada una sola vez por huella de contexto."""
+    if clave not in material["exportaciones"]:
+        fuente, columnas, filas_vista = EXPORTACIONES[clave]
+        df = st.session_state.get(fuente, pd.DataFrame())
+        if clave == "demanda" and demanda_disponible():
+            df = demanda_semanal_completa(columnas)
+        if clave == "compras":
+            df = df[df["Unidades a Comprar"] > 0]
+        df_export = df[columnas] if columnas is not None else df
+        vista = df_export.head(filas_vista) if filas_vista is not None else df_export
+        material["exportaciones"][clave] = (vista, df_export.to_csv(index=False).encode("utf-8"))
+    return material["exportaciones"][clave]
+
 
 def responder_general(pregunta):
     contexto = st.session_state.get("contexto_negocio_general", {})
-    pregunta_limpia = unidecode.unidecode(pregunta.lower())
+    intenciones = detectar_intenciones(pregunta)
+    material = obtener_material_respuestas()
 
     # --- INTENCIÓN: Ranking de pérdidas ---
-    if any(p in pregunta_limpia for p in ["top perdidas", "mayor perdidas", "mas perdidas", "quiebre alto", "productos que mas se pierden", "ranking perdidas", "sku con mas perdidas", "sku con mayor perdida", "sku mas perdidas", "productos con mas perdidas", "mas quiebres", "top 10 perdidas", "top de perdidas", "top 10 de perdidas"]):
-        df_hist = st.session_state.get("resumen_historico", pd.DataFrame())
-        if not df_hist.empty:
-            top = df_hist.groupby("sku")["unidades_perdidas"].sum().sort_values(ascending=False).head(10).reset_index()
-            respuesta = "🔝 Top 10 SKUs con más unidades perdidas:\n\n"
-            for i, row in top.iterrows():
-                respuesta += f"{i+1}. {row['sku']}: {int(row['unidades_perdidas'])} unidades perdidas\n"
-            return respuesta
+    if "ranking_perdidas" in intenciones and material["top_perdidas"] is not None:
+        return material["top_perdidas"]
 
     # --- INTENCIÓN: Ranking de ventas ---
-    if any(p in pregunta_limpia for p in ["top ventas", "top de ventas", "mas vendidos", "productos mas vendidos", "ventas altas", "mayor venta", "skus mas vendidos", "top 10 de ventas", "con mas ventas", "productos que mas venden", "mayores ventas", "mas ventas"]):
-        df_hist = st.session_state.get("resumen_historico", pd.DataFrame())
-        if not df_hist.empty:
-            top = df_hist.groupby("sku")["demanda_real"].sum().sort_values(ascending=False).head(10).reset_index()
-            respuesta = "🏆 Top 10 SKUs más vendidos (demanda real):\n\n"
-            for i, row in top.iterrows():
-                respuesta += f"{i+1}. {row['sku']}: {int(row['demanda_real'])} unidades vendidas\n"
-            return respuesta
+    if "ranking_ventas" in intenciones and material["top_ventas"] is not None:
+        return material["top_ventas"]
 
 
     # --- INTENCIÓN: Descargar detalle de compras ---
-    if any(p in pregunta_limpia for p in ["excel", "descargar", "detalle", "archivo"]) and any(p in pregunta_limpia for p in ["comprar", "compras", "reponer"]):
-        df = st.session_state.get("contexto_negocio_por_sku", pd.DataFrame())
-        df_export = df[df["Unidades a Comprar"] > 0][["SKU", "Unidades a Comprar"]]
+    if "descarga_compras" in intenciones:
+        vista, datos = obtener_exportacion(material, "compras")
         st.markdown("### 📋 Detalle de SKUs a Comprar")
-        st.dataframe(df_export, use_container_width=True)
-        st.download_button("📥 Descargar Excel de compras", df_export.to_csv(index=False).encode("utf-8"), "compras_sugeridas.csv", "text/csv")
+        st.dataframe(vista, use_container_width=True)
+        st.download_button("📥 Descargar Excel de compras", datos, "compras_sugeridas.csv", "text/csv")
         return "📄 Aquí tienes el archivo con el detalle de los SKUs a comprar."
 
     # --- INTENCIÓN: Descargar demanda histórica ---
-    if any(p in pregunta_limpia for p in ["excel", "descargar", "archivo"]) and any(p in pregunta_limpia for p in ["demanda historica", "demanda pasada", "real", "historial"]):
-        df = st.session_state.get("demanda_limpia", pd.DataFrame())
-        df_export = df[["sku", "fecha", "demanda", "demanda_sin_outlier"]]
+    if "descarga_demanda" in intenciones:
+        vista, datos = obtener_exportacion(material, "demanda")
         st.markdown("### 📋 Demanda Histórica")
-        st.dataframe(df_export.head(50), use_container_width=True)
-        st.download_button("📥 Descargar demanda histórica", df_export.to_csv(index=False).encode("utf-8"), "demanda_historica.csv", "text/csv")
+        st.dataframe(vista, use_container_width=True)
+        st.download_button("📥 Descargar demanda histórica", datos, "demanda_historica.csv", "text/csv")
         return "📄 Aquí tienes el archivo con la demanda histórica."
 
     # --- INTENCIÓN: Descargar políticas de inventario ---
-    if any(p in pregunta_limpia for p in ["excel", "descargar", "archivo", "detalle"]) and any(p in pregunta_limpia for p in ["politica", "rop", "eoq", "safety"]):
-        df = st.session_state.get("contexto_negocio_por_sku", pd.DataFrame())
-        df_export = df[["SKU", "ROP", "EOQ", "Safety Stock"]]
+    if "descarga_politicas" in intenciones:
+        vista, datos = obtener_exportacion(material, "politicas")
         st.markdown("### 📋 Políticas de Inventario")
-        st.dataframe(df_export, use_container_width=True)
-        st.download_button("📥 Descargar políticas", df_export.to_csv(index=False).encode("utf-8"), "politicas_inventario.csv", "text/csv")
+        st.dataframe(vista, use_container_width=True)
+        st.download_button("📥 Descargar políticas", datos, "politicas_inventario.csv", "text/csv")
         return "📄 Aquí tienes el archivo con las políticas de inventario por SKU."
 
     # --- INTENCIÓN: Descargar forecast y demanda proyectada ---
-    if any(p in pregunta_limpia for p in ["excel", "descargar", "archivo"]) and any(p in pregunta_limpia for p in ["forecast", "pronostico", "proyeccion"]):
-        df = st.session_state.get("forecast", pd.DataFrame())
-        df_export = df[["sku", "mes", "demanda", "demanda_limpia", "forecast", "tipo_mes"]]
+    if "descarga_forecast" in intenciones:
+        vista, datos = obtener_exportacion(material, "forecast")
         st.markdown("### 📋 Forecast y Demanda")
-        st.dataframe(df_export.head(50), use_container_width=True)
-        st.download_button("📥 Descargar forecast", df_export.to_csv(index=False).encode("utf-8"), "forecast_y_demanda.csv", "text/csv")
+        st.dataframe(vista, use_container_width=True)
+        st.download_button("📥 Descargar forecast", datos, "forecast_y_demanda.csv", "text/csv")
         return "📄 Aquí tienes el archivo con la demanda proyectada y forecast."
 
     # --- INTENCIÓN: Reposiciones en camino (PRIORIDAD ALTA) ---
-    if any(p in pregunta_limpia for p in ["en camino", "en transito", "vienen", "reposiciones", "en viaje"]):
+    if "en_camino" in intenciones:
         return f"🚚 Actualmente hay **{contexto.get('Total Unidades en Camino', 0):,} unidades en camino**."
 
     # --- INTENCIÓN: Stock actual total ---
-    if any(x in pregunta_limpia for x in ["stock", "inventario", "existencias", "disponible", "tenemos"]):
-        df_stock = st.session_state.get("stock_actual", pd.DataFrame())
-        total = int(df_stock['stock'].sum()) if not df_stock.empty else 0
-        return f"📦 El stock actual total es de **{total:,} unidades**."
+    if "stock_total" in intenciones:
+        return f"📦 El stock actual total es de **{material['total_stock']:,} unidades**."
 
     # --- INTENCIÓN: Políticas de inventario ---
-    if any(x in pregunta_limpia for x in ["politica", "rop", "eoq", "safety", "inventario de seguridad"]):
-        df = st.session_state.get("contexto_negocio_por_sku", pd.DataFrame())
+    if "politicas" in intenciones:
+        vista, _ = obtener_exportacion(material, "politicas")
+        _, datos = obtener_exportacion(material, "contexto")
         st.markdown("### 📋 Vista previa: Políticas de Inventario")
-        st.dataframe(df[["SKU", "ROP", "EOQ", "Safety Stock"]], use_container_width=True)
-        st.download_button("📥 Descargar políticas de inventario", df.to_csv(index=False).encode("utf-8"), "politicas_inventario.csv", "text/csv")
+        st.dataframe(vista, use_container_width=True)
+        st.download_button("📥 Descargar políticas de inventario", datos, "politicas_inventario.csv", "text/csv")
         return "📄 Aquí tienes las políticas de inventario por SKU."
 
     # --- INTENCIÓN: Compra sugerida ---
-    if (
-        any(x in pregunta_limpia for x in ["cuanto", "cuantas", "deberia", "necesito", "reponer", "comprar"]) and
-        not any(x in pregunta_limpia for x in ["stock", "inventario", "existencias", "politica", "en camino", "en transito", "reposiciones", "vienen"])
-    ):
+    if "compra_sugerida" in intenciones:
         return (
             f"🛒 En total, deberías comprar **{contexto.get('Total Unidades a Comprar', 0):,} unidades** "
             f"distribuidas en **{contexto.get('Total SKUs a Comprar', 0):,} SKUs**."
         )
 
     # --- INTENCIÓN: Costo total ---
-    if any(p in pregunta_limpia for p in ["costo", "cuanto cuesta", "valor total", "precio total", "fabricacion total"]):
+    if "costo_total" in intenciones:
         return f"💰 El costo total estimado de fabricación para la compra es de **€{contexto.get('Costo Total Compra (€)', 0):,}**."
 
     # --- INTENCIÓN: Ventas totales / demanda real ---
-    if any(p in pregunta_limpia for p in ["vendidas", "venta real", "demanda real", "cuanto se ha vendido", "demanda historica", "ventas totales"]):
-        df_demand = st.session_state.get("demanda_limpia", pd.DataFrame())
-        total_vendidas = int(df_demand["demanda"].sum()) if not df_demand.empty else 0
-        return f"📈 En los últimos 12 meses se han vendido **{total_vendidas:,} unidades**."
+    if "ventas_totales" in intenciones:
+        return f"📈 En los últimos 12 meses se han vendido **{material['total_vendidas']:,} unidades**."
 
     # --- INTENCIÓN: Pérdidas históricas ---
-    if any(p in pregunta_limpia for p in ["perdidas", "productos perdidos", "no se vendieron", "unidades que faltaron"]):
+    if "perdidas_totales" in intenciones:
         total_perdidas = contexto.get("Total Unidades Perdidas", None)
         if total_perdidas is None:
-            df_hist = st.session_state.get("resumen_historico", pd.DataFrame())
-            total_perdidas = int(df_hist["unidades_perdidas"].sum()) if not df_hist.empty else 0
+            total_perdidas = material["total_perdidas"]
         return f"🔻 Se han perdido **{total_perdidas:,} unidades** por quiebres de stock."
 
     # --- INTENCIÓN: Pérdidas económicas ---
-    if any(p in pregunta_limpia for p in ["euros", "valor perdido", "venta perdida", "perdida economica"]):
-        df_hist = st.session_state.get("resumen_historico", pd.DataFrame())
-        perdidas_eur = int(df_hist["valor_perdido_euros"].sum()) if not df_hist.empty else 0
-        return f"💸 La pérdida total estimada en euros por quiebres ha sido de **€{perdidas_eur:,}**."
+    if "perdidas_euros" in intenciones:
+        return f"💸 La pérdida total estimada en euros por quiebres ha sido de **€{material['perdidas_euros']:,}**."
 
     # --- INTENCIÓN: Tasa de quiebre ---
-    if any(p in pregunta_limpia for p in ["tasa de quiebre", "porcentaje perdido", "nivel de servicio", "break rate"]):
-        df_hist = st.session_state.get("resumen_historico", pd.DataFrame())
-        if not df_hist.empty:
-            perdidas = df_hist["unidades_perdidas"].sum()
-            vendidas = df_hist["demanda_real"].sum()
-            tasa = (perdidas / (vendidas + perdidas) * 100) if (vendidas + perdidas) > 0 else 0
-            return f"📉 La tasa de quiebre acumulada es de **{tasa:.1f}%**."
+    if "tasa_quiebre" in intenciones:
+        if material["tasa_quiebre"] is not None:
+            return f"📉 La tasa de quiebre acumulada es de **{material['tasa_quiebre']:.1f}%**."
         return "No se pudo calcular la tasa de quiebre porque no hay datos históricos suficientes."
 
 
@@ -1,41 +1,322 @@
 import pandas as pd
+import numpy as np
+from statistics import NormalDist
+from dateutil.relativedelta import relativedelta
+from modules.evaluar_compra_sku import evaluar_compra_lote, MESES_SIMULADOS
+from modules.reposiciones import matriz_reposiciones
+from modules.simulador_inventario import simular_politica_rop, matriz_demanda_mensual, backtest_politicas, stock_inicial_historico
+from modules.almacen_demanda import demanda_semanal_sesion, iterar_demanda_limpia
 
-def calcular_politicas_inventario(df_forecast, sku, unidades_en_camino, df_maestro, df_demanda_limpia):
-    # Filtrar el forecast futuro del SKU
-    fecha_actual = pd.to_datetime("today").replace(day=1)
-    df_forecast_sku = df_forecast[(df_forecast['sku'] == sku) & (df_forecast['tipo_mes'] == 'proyección')].copy()
-    df_forecast_sku['mes'] = pd.to_datetime(df_forecast_sku['mes'])
-    forecast_futuro = df_forecast_sku[df_forecast_sku['mes'] >= fecha_actual].sort_values('mes')
+NIVELES_SERVICIO = [0.80, 0.85, 0.90, 0.95, 0.975, 0.99]
+MULTIPLICADORES_EOQ = [1, 2, 3, 4, 6]
 
-    # Calcular demanda mensual como el promedio del forecast de los próximos 4 meses
-    forecast_4m = forecast_futuro.head(4)['forecast']
-    demanda_mensual = int(round(forecast_4m.mean(), 0)) if not forecast_4m.empty else 0
 
-    # --- Desviación estándar de la demanda histórica (últimos 12 meses con demanda > 0) ---
-    df_d_sku = df_demanda_limpia[(df_demanda_limpia['sku'] == sku) & (df_demanda_limpia['demanda'] > 0)].copy()
-    df_d_sku['mes'] = pd.to_datetime(df_d_sku['fecha']).dt.to_period('M')
-    demanda_mensual_hist = df_d_sku.groupby('mes')['demanda_sin_outlier'].sum()
-    ultimos_meses = demanda_mensual_hist.tail(12)
-    desviacion_estandar = ultimos_meses.std()
-    if pd.isna(desviacion_estandar):
-        desviacion_estandar = 0
+def cuantil_por_fila(valores, q):
+    """
+    Cuantil lineal de cada fila ignorando NaN (igual a np.nanquantile(valores, q, axis=1)), con un solo
+    np.sort: al ordenar, los NaN quedan al final de cada fila. Filas sin valores: NaN.
+    """
+    ordenadas = np.sort(valores, axis=1)
+    n_validas = (~np.isnan(valores)).sum(axis=1)
+    ultima = np.clip(n_validas - 1, 0, None)
+    posicion = q * ultima
+    abajo = np.floor(posicion).astype(int)
+    arriba = np.minimum(abajo + 1, ultima)
+    filas = np.arange(len(valores))
+    cuantil = ordenadas[filas, abajo] + (posicion - abajo) * (ordenadas[filas, arriba] - ordenadas[filas, abajo])
+    return np.where(n_validas > 0, cuantil, np.nan)
+
+
+def safety_stock_empirico(df_demanda_limpia, skus, lead_time, nivel_servicio, fechas=None):
+    """
+    Safety stock desde la distribución empírica de la demanda durante el lead time.
+
+    Suma la demanda semanal limpia (demanda_sin_outlier) en todas las ventanas solapadas de
+    lead_time meses (≈ 52/12 semanas por mes) con sumas acumuladas sobre el pivot SKU × semana,
+    y toma safety stock = cuantil(nivel_servicio) - media de esas ventanas, con mínimo 0.
+    fechas: calendario semanal completo (para calcular por partición con las mismas semanas que el catálogo).
+    Retorna una Serie indexada por SKU (NaN si el SKU no tiene una ventana completa).
+    """
+    semanas = max(int(round(lead_time * 52 / 12)), 1)
+    pivot = df_demanda_limpia.groupby(['sku', 'fecha'], observed=True)['demanda_sin_outlier'].sum().unstack('fecha')
+    pivot = pivot.sort_index(axis=1) if fechas is None else pivot.reindex(columns=fechas)
+    pivot = pivot.reindex(skus)
+    semanal = pivot.to_numpy(dtype=float)
+    if semanal.shape[1] < semanas:
+        return pd.Series(np.nan, index=skus)
+
+    # Semanas fuera de la historia del SKU (NaN) invalidan las ventanas que las contienen
+    def sumas_moviles(x):
+        acumulada = np.concatenate([np.zeros((len(skus), 1)), np.cumsum(x, axis=1)], axis=1)
+        return acumulada[:, semanas:] - acumulada[:, :-semanas]
+
+    ventanas = sumas_moviles(np.nan_to_num(semanal))
+    ventanas[sumas_moviles(np.isnan(semanal).astype(float)) > 0] = np.nan
+
+    cuantil = cuantil_por_fila(ventanas, nivel_servicio)
+    n_validas = (~np.isnan(ventanas)).sum(axis=1)
+    media = np.divide(np.nansum(ventanas, axis=1), n_validas, out=np.full(len(skus), np.nan), where=n_validas > 0)
+
+    safety_stock = np.where(n_validas > 0, np.clip(cuantil - media, 0, None), np.nan)
+    return pd.Series(safety_stock, index=skus)
+
+
+def calcular_politicas_inventario_lote(df_forecast, df_demanda_limpia, fecha_actual=None, lead_time=5, z=1.65,
+                                       metodo_safety_stock='normal', panel=None):
+    """
+    Calcula demanda mensual, safety stock, ROP y EOQ para todos los SKUs del forecast a la vez.
 
+    Usa un único pivot del forecast proyectado y una única agrupación mensual de la demanda limpia.
+    metodo_safety_stock: 'normal' (σ mensual × Z) o 'empirico' (cuantil de la demanda histórica
+    en ventanas de lead time, ver safety_stock_empirico).
+    panel: panel mensual de la sesión; si se entrega, la desviación estándar se toma de él.
+    df_demanda_limpia=None (almacén particionado): el safety stock empírico se calcula partición por partición.
+    Retorna un DataFrame con columnas
+    ['sku', 'demanda_mensual', 'safety_stock', 'rop_original', 'rop', 'eoq'].
+    """
+    if fecha_actual is None:
+        fecha_actual = pd.to_datetime("today").replace(day=1)
+    skus = pd.Index(df_forecast['sku'].unique(), name='sku')
+
+    # --- Demanda mensual: promedio del forecast de los próximos 4 meses ---
+    df_f = df_forecast[df_forecast['tipo_mes'] == 'proyección'][['sku', 'mes', 'forecast']].copy()
+    df_f['mes'] = pd.to_datetime(df_f['mes'])
+    df_f = df_f[df_f['mes'] >= fecha_actual]
+    pivot = df_f.pivot_table(index='sku', columns='mes', values='forecast', aggfunc='first', observed=True).sort_index(axis=1)
+    primeros_4 = pivot.notna().cumsum(axis=1) <= 4
+    demanda_mensual = pivot.where(primeros_4).mean(axis=1).round().reindex(skus).fillna(0).astype(int)
+
+    # --- Desviación estándar de la demanda histórica (últimos 12 meses con demanda > 0) ---
+    if panel is not None:
+        mensual = panel[panel['semanas_con_venta'] > 0].set_index(['sku', 'mes'])['demanda_limpia_con_venta']
+    else:
+        df_d = df_demanda_limpia[df_demanda_limpia['demanda'] > 0]
+        mes = pd.to_datetime(df_d['fecha']).dt.to_period('M')
+        mensual = df_d.groupby([df_d['sku'], mes], observed=True)['demanda_sin_outlier'].sum()
+    desviacion_estandar = mensual.groupby(level=0).tail(12).groupby(level=0).std()
+    desviacion_estandar = desviacion_estandar.reindex(skus).fillna(0)
 
     # --- Safety stock (Z = 1.65 para 95% nivel de servicio) ---
-    safety_stock = round(desviacion_estandar * 1.65)
+    safety_stock = np.round(desviacion_estandar * z).astype(int)
+    if metodo_safety_stock == 'empirico':
+        if df_demanda_limpia is not None:
+            empirico = safety_stock_empirico(df_demanda_limpia, skus, lead_time, NormalDist().cdf(z))
+        else:
+            fechas = pd.DatetimeIndex(demanda_semanal_sesion()['fecha']).sort_values()
+            empirico = pd.concat([
+                safety_stock_empirico(parte, pd.Index(parte['sku'].unique()), lead_time, NormalDist().cdf(z), fechas)
+                for parte in iterar_demanda_limpia()
+            ]).reindex(skus)
+        # SKUs con menos historia que el lead time conservan el cálculo normal
+        safety_stock = empirico.round().fillna(safety_stock).astype(int)
 
-    # --- ROP original y ajustado ---
-    lead_time = 5  # meses
+    # --- ROP original y ajustado; EOQ = demanda mensual * 3 (política interna) ---
     rop_original = demanda_mensual * lead_time
-    rop = rop_original + safety_stock
 
-    # --- EOQ definido como demanda mensual * 3 (política interna) ---
-    eoq = demanda_mensual * 3
+    return pd.DataFrame({
+        'sku': skus,
+        'demanda_mensual': demanda_mensual.to_numpy(),
+        'safety_stock': safety_stock.to_numpy(),
+        'rop_original': rop_original.to_numpy(),
+        'rop': (rop_original + safety_stock).to_numpy(),
+        'eoq': (demanda_mensual * 3).to_numpy()
+    })
+
+
+def calcular_politicas_inventario(df_forecast, sku, unidades_en_camino, df_maestro, df_demanda_limpia, fecha_actual=None):
+    df_forecast_sku = df_forecast[df_forecast['sku'] == sku]
+    df_demanda_sku = df_demanda_limpia[df_demanda_limpia['sku'] == sku]
+    politicas = calcular_politicas_inventario_lote(df_forecast_sku, df_demanda_sku, fecha_actual=fecha_actual)
+    if politicas.empty:
+        return {"demanda_mensual": 0, "safety_stock": 0, "rop_original": 0, "rop": 0, "eoq": 0}
+    return politicas.drop(columns='sku').iloc[0].to_dict()
+
+
+def calcular_resultados_inventario(df_forecast, df_stock, df_maestro, df_demanda_limpia, calendario, fecha_actual,
+                                   metodo_safety_stock='normal', panel=None):
+    """
+    Políticas y decisión de compra para todo el catálogo.
+
+    Retorna (df_tabla, resultados):
+    - df_tabla: tabla resumen por SKU que muestra la página de Gestión de Inventarios
+    - resultados: {sku: {...}} con el formato de st.session_state['resultados_inventario']
+    """
+    skus = pd.Index(df_forecast['sku'].unique())
+
+    politicas_df = calcular_politicas_inventario_lote(
+        df_forecast, df_demanda_limpia, fecha_actual, metodo_safety_stock=metodo_safety_stock, panel=panel
+    ).set_index('sku')
+    stock_actual = df_stock.drop_duplicates('sku').set_index('sku')['stock'].reindex(skus).fillna(0).astype(int)
+    costo_fab = df_maestro.drop_duplicates('sku').set_index('sku')['costo_fabricacion'].reindex(skus).fillna(0)
+    unidades_en_camino = pd.Series(calendario["totales"], dtype=float).reindex(skus).fillna(0).astype(int)
+
+    meses_simulados = [(fecha_actual + relativedelta(months=i)).to_period('M').to_timestamp() for i in range(MESES_SIMULADOS)]
+    evaluacion = evaluar_compra_lote(
+        stock_actual.to_numpy(),
+        politicas_df['demanda_mensual'].to_numpy(),
+        politicas_df['safety_stock'].to_numpy(),
+        politicas_df['eoq'].to_numpy(),
+        matriz_reposiciones(calendario, skus, meses_simulados)
+    )
 
-    return {
-        "demanda_mensual": demanda_mensual,
-        "safety_stock": safety_stock,
-        "rop_original": rop_original,
-        "rop": rop,
-        "eoq": eoq
+    df_tabla = pd.DataFrame({
+        "SKU": skus,
+        "Demanda Mensual": politicas_df['demanda_mensual'].to_numpy(),
+        "Stock Actual": stock_actual.to_numpy(),
+        "Reposiciones": unidades_en_camino.to_numpy(),
+        "Stock Proyectado (5M)": evaluacion["stock_final_simulado"].to_numpy(),
+        "ROP": politicas_df['rop_original'].to_numpy(),
+        "Safety Stock": politicas_df['safety_stock'].to_numpy(),
+        "EOQ": politicas_df['eoq'].to_numpy(),
+        "Costo Fabricación (€)": costo_fab.round(2).to_numpy(),
+        "Acción": evaluacion["accion"].to_numpy()
+    })
+
+    politicas_por_sku = politicas_df.to_dict('index')
+    resultados = {
+        fila["SKU"]: {
+            "stock_actual": fila["Stock Actual"],
+            "unidades_en_camino": fila["Reposiciones"],
+            "demanda_mensual": fila["Demanda Mensual"],
+            "politicas": politicas_por_sku[fila["SKU"]],
+            "accion": fila["Acción"],
+            "unidades_sugeridas": fila["EOQ"] if fila["Acción"] == "Comprar" else 0,
+            "stock_final_simulado": fila["Stock Proyectado (5M)"],
+            "costo_fabricacion": costo_fab[fila["SKU"]]
+        }
+        for fila in df_tabla.to_dict('records')
     }
+    return df_tabla, resultados
+
+
+def optimizar_politicas(df_demanda_limpia, df_maestro, niveles_servicio=NIVELES_SERVICIO,
+                        multiplicadores_eoq=MULTIPLICADORES_EOQ, lead_time=5, meses_historia=24,
+                        tasa_mantencion_mensual=0.02, costo_pedido=0.0, panel=None, politicas_actuales=None,
+                        df_stock_historico=None):
+    """
+    Elige por SKU el nivel de servicio y el tamaño de lote (múltiplo de la demanda mensual) de menor costo.
+
+    Evalúa la grilla niveles_servicio × multiplicadores_eoq para todos los SKUs a la vez, simulando la
+    política contra la demanda mensual histórica (demanda_sin_stockout de los últimos `meses_historia` meses).
+    El costo es mantención (stock × costo_fabricacion × tasa mensual) + ventas perdidas
+    (unidades × margen precio_venta - costo_fabricacion) + costo_pedido por pedido emitido.
+    Safety stock, ROP y EOQ siguen las fórmulas de calcular_politicas_inventario con Z y lote variables.
+
+    La referencia "política actual" simula el ROP y EOQ vigentes de `politicas_actuales`
+    (salida de calcular_politicas_inventario_lote, basada en el forecast); los SKUs sin política vigente
+    usan Z = 1.65 y EOQ = 3 × demanda mensual histórica.
+
+    Stock de partida de cada simulación: el de `df_stock_historico` al inicio de la historia
+    (stock_inicial_historico, como backtest_politicas), igual para todas las políticas del SKU.
+    Sin fotos de stock se parte con stock = ROP de cada política, lo que favorece a los niveles
+    de servicio altos (más stock inicial).
+
+    SKUs sin costo_fabricacion o precio_venta en el maestro (o con ambos en 0 y sin costo por pedido):
+    toda la grilla cuesta 0 y no hay óptimo. Se marcan con sin_costos = True y sus columnas de
+    política óptima, costos y ahorro quedan vacías (NaN).
+
+    Evaluación in-sample: las políticas se eligen y se evalúan sobre la misma historia,
+    por lo que costos y ahorro son optimistas frente a la demanda futura.
+    """
+    matriz = matriz_demanda_mensual(df_demanda_limpia, meses=meses_historia, panel=panel)
+    skus = matriz.index
+    demanda = matriz.to_numpy(dtype=float)
+    n_meses = demanda.shape[1]
+
+    mu = demanda.mean(axis=1)
+    sigma = np.nan_to_num(matriz.iloc[:, -12:].std(axis=1).to_numpy(dtype=float))
+    z = np.array([NormalDist().inv_cdf(p) for p in niveles_servicio])
+    multiplicadores = np.asarray(multiplicadores_eoq, dtype=float)
+
+    # --- Grilla SKU × nivel de servicio × multiplicador de lote ---
+    safety_stock = np.round(sigma[:, None] * z[None, :])
+    rop = np.round(mu[:, None] * lead_time) + safety_stock
+    eoq = np.round(mu[:, None] * multiplicadores[None, :])
+
+    maestro = df_maestro.drop_duplicates('sku').set_index('sku')
+    costo = maestro['costo_fabricacion'].reindex(skus).to_numpy(dtype=float)
+    precio = maestro['precio_venta'].reindex(skus).to_numpy(dtype=float)
+    sin_costos = np.isnan(costo) | np.isnan(precio)
+    costo, precio = np.nan_to_num(costo), np.nan_to_num(precio)
+    margen = np.clip(precio - costo, 0, None)
+    sin_costos |= (costo <= 0) & (margen <= 0) & (costo_pedido <= 0)
+
+    inicio = None
+    if df_stock_historico is not None and not df_stock_historico.empty:
+        inicio = stock_inicial_historico(df_stock_historico, skus, matriz.columns[0]).to_numpy(dtype=float)
+
+    def costos(rop_g, eoq_g, extra_dims):
+        forma = (slice(None),) + (None,) * extra_dims
+        stock_inicial = rop_g if inicio is None else inicio[forma]
+        sim = simular_politica_rop(demanda[forma + (slice(None),)], stock_inicial, rop_g, eoq_g, lead_time)
+        mantencion = sim["stock_promedio"] * n_meses * costo[forma] * tasa_mantencion_mensual
+        perdidas = sim["unidades_perdidas"] * margen[forma]
+        return sim, mantencion, perdidas, mantencion + perdidas + sim["pedidos"] * costo_pedido
+
+    sim, mantencion, perdidas, total = costos(rop[:, :, None], eoq[:, None, :], 2)
+    mejor = total.reshape(len(skus), -1).argmin(axis=1)
+    iz, iq = np.unravel_index(mejor, (len(z), len(multiplicadores)))
+    fila = np.arange(len(skus))
+
+    # --- Política actual como referencia: ROP y EOQ vigentes, o Z = 1.65 y EOQ = 3 × demanda mensual ---
+    rop_actual = np.round(mu * lead_time) + np.round(sigma * 1.65)
+    eoq_actual = np.round(mu * 3)
+    if politicas_actuales is not None:
+        vigentes = politicas_actuales.drop_duplicates('sku').set_index('sku').reindex(skus)
+        rop_actual = vigentes['rop'].fillna(pd.Series(rop_actual, index=vigentes.index)).to_numpy(dtype=float)
+        eoq_actual = vigentes['eoq'].fillna(pd.Series(eoq_actual, index=vigentes.index)).to_numpy(dtype=float)
+    _, _, _, total_actual = costos(rop_actual, eoq_actual, 0)
+
+    costo_total = total[fila, iz, iq]
+    resultado = pd.DataFrame({
+        'sku': skus,
+        'nivel_servicio': np.asarray(niveles_servicio)[iz],
+        'multiplicador_eoq': multiplicadores[iq],
+        'safety_stock': safety_stock[fila, iz].astype(int),
+        'rop': rop[fila, iz].astype(int),
+        'eoq': eoq[fila, iq].astype(int),
+        'fill_rate': sim["fill_rate"][fila, iz, iq].round(4),
+        'costo_mantencion': mantencion[fila, iz, iq].round(2),
+        'costo_perdidas': perdidas[fila, iz, iq].round(2),
+        'costo_total': costo_total.round(2),
+        'rop_actual': rop_actual.astype(int),
+        'eoq_actual': eoq_actual.astype(int),
+        'costo_politica_actual': total_actual.round(2),
+        'ahorro': (total_actual - costo_total).round(2),
+        'sin_costos': sin_costos
+    })
+    enteras = ['safety_stock', 'rop', 'eoq']
+    resultado[enteras] = resultado[enteras].astype('Int64')
+    resultado.loc[sin_costos, ['nivel_servicio', 'multiplicador_eoq', *enteras, 'fill_rate', 'costo_mantencion',
+                               'costo_perdidas', 'costo_total', 'costo_politica_actual', 'ahorro']] = pd.NA
+    return resultado
+
+
+def backtest_variantes(df_forecast, df_demanda_limpia, df_stock_historico, niveles_servicio, lead_time=5, fecha_actual=None,
+                       metodo_safety_stock='normal', panel=None):
+    """
+    Compara contra la historia la política actual (Z = 1.65) y una variante por nivel de servicio.
+
+    Retorna (df_resumen, detalle): una fila por variante con los totales del catálogo y
+    {variante: DataFrame por SKU de backtest_politicas}.
+    """
+    variantes = {"Política actual (Z = 1.65)": 1.65}
+    for nivel in niveles_servicio:
+        variantes[f"Nivel de servicio {nivel:.1%}"] = NormalDist().inv_cdf(nivel)
+
+    detalle, filas = {}, []
+    for nombre, z in variantes.items():
+        politicas = calcular_politicas_inventario_lote(df_forecast, df_demanda_limpia, fecha_actual, lead_time, z,
+                                                       metodo_safety_stock, panel)
+        df_bt = backtest_politicas(df_demanda_limpia, df_stock_historico, politicas, lead_time, panel=panel)
+        detalle[nombre] = df_bt
+        vendidas, perdidas = df_bt['unidades_vendidas'].sum(), df_bt['unidades_perdidas'].sum()
+        filas.append({
+            'variante': nombre,
+            'fill_rate': round(vendidas / (vendidas + perdidas), 4) if vendidas + perdidas > 0 else 1.0,
+            'stock_promedio': round(df_bt['stock_promedio'].sum(), 1),
+            'unidades_perdidas': int(perdidas),
+            'unidades_perdidas_historicas': int(df_bt['unidades_perdidas_historicas'].sum()),
+            'pedidos': int(df_bt['pedidos'].sum())
+        })
+    return pd.DataFrame(filas), detalle
@@ -0,0 +1,65 @@
+import pandas as pd
+import streamlit as st
+from modules.resumen_utils import calcular_unidades_perdidas
+
+COLUMNAS_PANEL = ['sku', 'mes', 'demanda', 'demanda_limpia', 'demanda_sin_stockout', 'unidades_perdidas',
+                  'demanda_limpia_con_venta', 'semanas', 'semanas_con_venta', 'stock']
+
+
+def construir_panel_mensual(df_demanda_limpia, df_stock_historico=None):
+    """
+    Panel canónico SKU × mes, construido una vez por carga de datos.
+
+    Columnas:
+    - demanda, demanda_limpia (demanda_sin_outlier), demanda_sin_stockout, unidades_perdidas: sumas mensuales
+    - demanda_limpia_con_venta / semanas_con_venta: demanda limpia y nº de semanas con demanda > 0
+      (base de la desviación estándar de las políticas de inventario)
+    - semanas: nº de semanas con registro de demanda en el mes
+    - stock: suma de las fotos de stock histórico del mes
+
+    Los meses con stock histórico pero sin semanas de demanda quedan con semanas = 0 y demanda en 0;
+    los cálculos de demanda usan panel_con_demanda para excluirlos.
+    """
+    df = df_demanda_limpia[['sku', 'fecha', 'demanda', 'demanda_sin_outlier', 'demanda_sin_stockout']].copy()
+    df['mes'] = pd.to_datetime(df['fecha']).dt.to_period('M').dt.to_timestamp()
+    df['unidades_perdidas'] = calcular_unidades_perdidas(df)
+    con_venta = df['demanda'] > 0
+    df['demanda_limpia_con_venta'] = df['demanda_sin_outlier'].where(con_venta, 0)
+    df['semana_con_venta'] = con_venta.astype(int)
+
+    panel = df.groupby(['sku', 'mes'], observed=True).agg(
+        demanda=('demanda', 'sum'),
+        demanda_limpia=('demanda_sin_outlier', 'sum'),
+        demanda_sin_stockout=('demanda_sin_stockout', 'sum'),
+        unidades_perdidas=('unidades_perdidas', 'sum'),
+        demanda_limpia_con_venta=('demanda_limpia_con_venta', 'sum'),
+        semanas=('fecha', 'nunique'),
+        semanas_con_venta=('semana_con_venta', 'sum')
+    )
+
+    if df_stock_historico is not None and not df_stock_historico.empty:
+        stock = df_stock_historico[['sku', 'fecha', 'stock']].copy()
+        stock['mes'] = pd.to_datetime(stock['fecha']).dt.to_period('M').dt.to_timestamp()
+        stock = stock.groupby(['sku', 'mes'], observed=True)['stock'].sum()
+        tipos = panel.dtypes
+        panel = panel.join(stock, how='outer')
+        panel[tipos.index] = panel[tipos.index].fillna(0).astype(tipos)
+    else:
+        panel['stock'] = float('nan')
+
+    return panel.reset_index()[COLUMNAS_PANEL]
+
+
+def obtener_panel_mensual():
+    """Panel mensual de la sesión; se construye si aún no existe (p. ej. al entrar directo a una página)."""
+    if "panel_mensual" not in st.session_state:
+        st.session_state["panel_mensual"] = construir_panel_mensual(
+            st.session_state["demanda_limpia"],
+            st.session_state.get("stock_historico")
+        )
+    return st.session_state["panel_mensual"]
+
+
+def panel_con_demanda(panel):
+    """Filas del panel con semanas de demanda registradas (excluye meses sólo con stock)."""
+    return panel[panel['semanas'] > 0]
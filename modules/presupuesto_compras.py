@@ -0,0 +1,110 @@
+import numpy as np
+
+
+def candidatos_compra(df_tabla, df_proyeccion, df_maestro):
+    """
+    Arma los candidatos a compra con su costo y beneficio esperado.
+
+    - df_tabla: tabla de Gestión de Inventarios (columnas 'SKU', 'EOQ', 'Acción', 'Costo Fabricación (€)')
+    - df_proyeccion: proyección de stock (consolidar_proyeccion_futura) con las unidades perdidas por mes
+    - df_maestro: maestro con 'precio_venta' y 'costo_fabricacion'
+
+    El beneficio de comprar un SKU es el margen de las ventas perdidas proyectadas que el EOQ evita:
+    min(EOQ, unidades_perdidas) × (precio_venta - costo_fabricacion).
+    """
+    df = df_tabla[df_tabla['Acción'] == 'Comprar'][['SKU', 'EOQ', 'Costo Fabricación (€)']].copy()
+    df.columns = ['sku', 'eoq', 'costo_unitario']
+
+    perdidas = df_proyeccion.groupby('sku')['unidades_perdidas'].sum()
+    df['unidades_perdidas'] = df['sku'].map(perdidas)
+    precio = df_maestro.drop_duplicates('sku').set_index('sku')['precio_venta']
+    df['precio_venta'] = df['sku'].map(precio)
+    df = df.fillna({'unidades_perdidas': 0, 'precio_venta': 0})
+
+    df['costo_compra'] = df['eoq'] * df['costo_unitario']
+    df['unidades_recuperadas'] = np.minimum(df['eoq'], df['unidades_perdidas'])
+    df['venta_recuperada_euros'] = df['unidades_recuperadas'] * df['precio_venta']
+    df['beneficio'] = df['unidades_recuperadas'] * np.clip(df['precio_venta'] - df['costo_unitario'], 0, None)
+    return df.reset_index(drop=True)
+
+
+def _greedy(costos, beneficios, presupuesto):
+    seleccion = np.zeros(len(costos), dtype=bool)
+    ratio = np.divide(beneficios, costos, out=np.full(len(costos), np.inf), where=costos > 0)
+    restante = presupuesto
+    for i in np.argsort(-ratio, kind='stable'):
+        if beneficios[i] > 0 and costos[i] <= restante:
+            seleccion[i] = True
+            restante -= costos[i]
+
+    # Cota clásica: el mejor ítem individual que cabe puede superar al greedy
+    cabe = (costos <= presupuesto) & (beneficios > 0)
+    if cabe.any():
+        mejor = np.flatnonzero(cabe)[np.argmax(beneficios[cabe])]
+        if beneficios[mejor] > beneficios[seleccion].sum():
+            seleccion[:] = False
+            seleccion[mejor] = True
+    return seleccion
+
+
+def _programacion_dinamica(costos, beneficios, presupuesto, max_celdas):
+    n = len(costos)
+    capacidad = int(max(1, min(max_celdas // max(n, 1), 10_000)))
+    escala = presupuesto / capacidad
+    if np.all(costos == np.round(costos)) and presupuesto <= capacidad:
+        # Costos enteros que caben en la grilla: se discretiza en unidades de 1 € y la DP es exacta
+        capacidad, escala = int(presupuesto), 1.0
+    # Costos redondeados hacia arriba: toda solución de la DP es factible con el presupuesto real
+    pesos = np.ceil(costos / escala - 1e-9).astype(int) if escala > 0 else np.zeros(n, dtype=int)
+
+    valor = np.zeros(capacidad + 1)
+    toma = np.zeros((n, capacidad + 1), dtype=bool)
+    for i in range(n):
+        w = pesos[i]
+        if w > capacidad or beneficios[i] <= 0:
+            continue
+        candidato = valor.copy()
+        candidato[w:] = valor[:capacidad + 1 - w] + beneficios[i]
+        mejora = candidato > valor
+        toma[i] = mejora
+        valor = np.where(mejora, candidato, valor)
+
+    seleccion = np.zeros(n, dtype=bool)
+    c = int(np.argmax(valor))
+    for i in range(n - 1, -1, -1):
+        if toma[i, c]:
+            seleccion[i] = True
+            c -= pesos[i]
+    return seleccion
+
+
+def asignar_presupuesto(df_candidatos, presupuesto, max_celdas_dp=20_000_000):
+    """
+    Selecciona los SKUs a comprar que maximizan el beneficio sin superar el presupuesto (mochila 0/1).
+
+    Parte de una heurística greedy por ratio beneficio/costo y la refina con programación dinámica
+    sobre el presupuesto discretizado (a lo más `max_celdas_dp` celdas); se queda con la mejor de ambas.
+
+    Retorna (df_candidatos con columna 'seleccionado', resumen).
+    """
+    df = df_candidatos.copy()
+    costos = df['costo_compra'].to_numpy(dtype=float)
+    beneficios = df['beneficio'].to_numpy(dtype=float)
+
+    seleccion = _greedy(costos, beneficios, presupuesto)
+    metodo = "greedy"
+    if len(df) > 0 and presupuesto > 0:
+        seleccion_dp = _programacion_dinamica(costos, beneficios, presupuesto, max_celdas_dp)
+        if beneficios[seleccion_dp].sum() > beneficios[seleccion].sum() + 1e-9:
+            seleccion = seleccion_dp
+            metodo = "programación dinámica"
+
+    df['seleccionado'] = seleccion
+    resumen = {
+        "skus_seleccionados": int(seleccion.sum()),
+        "costo_total": float(costos[seleccion].sum()),
+        "beneficio_total": float(beneficios[seleccion].sum()),
+        "venta_recuperada_euros": float(df.loc[seleccion, 'venta_recuperada_euros'].sum()),
+        "metodo": metodo
+    }
+    return df, resumen
@@ -0,0 +1,50 @@
+import pandas as pd
+
+
+def construir_calendario_reposiciones(df_repos):
+    """
+    Indexa las reposiciones una sola vez por carga de datos.
+
+    Retorna un diccionario con:
+    - 'matriz': DataFrame SKU × mes con las unidades repuestas
+    - 'por_sku': {sku: {mes: unidades}} para consultas O(1)
+    - 'totales': {sku: unidades totales en camino}
+    """
+    if df_repos is None or df_repos.empty:
+        return {"matriz": pd.DataFrame(), "por_sku": {}, "totales": {}}
+
+    df = df_repos[['sku', 'fecha', 'cantidad']].copy()
+    df['mes'] = pd.to_datetime(df['fecha'], errors='coerce').dt.to_period('M').dt.to_timestamp()
+    df['cantidad'] = pd.to_numeric(df['cantidad'], errors='coerce').fillna(0)
+    df = df.dropna(subset=['mes'])
+
+    por_mes = df.groupby(['sku', 'mes'], observed=True)['cantidad'].sum()
+    matriz = por_mes.unstack('mes', fill_value=0).sort_index(axis=1)
+
+    por_sku = {}
+    for (sku, mes), cantidad in por_mes.items():
+        por_sku.setdefault(sku, {})[mes] = cantidad
+
+    return {
+        "matriz": matriz,
+        "por_sku": por_sku,
+        "totales": df.groupby('sku')['cantidad'].sum().to_dict()
+    }
+
+
+def reposicion_mes(calendario, sku, mes):
+    """Unidades que llegan para el SKU en el mes (Timestamp del primer día del mes)."""
+    return calendario["por_sku"].get(sku, {}).get(mes, 0)
+
+
+def total_reposiciones(calendario, sku):
+    """Unidades totales en camino para el SKU."""
+    return calendario["totales"].get(sku, 0)
+
+
+def matriz_reposiciones(calendario, skus, meses):
+    """Arreglo len(skus) × len(meses) con las reposiciones, en cero donde no hay."""
+    matriz = calendario["matriz"]
+    if matriz.empty:
+        return pd.DataFrame(0.0, index=skus, columns=meses).to_numpy()
+    return matriz.reindex(index=skus, columns=meses, fill_value=0).to_numpy(dtype=float)
@@ -1,35 +1,58 @@
 import pandas as pd
 import numpy as np
 import streamlit as st
+from modules.contexto_llm import obtener_indice_skus
+from modules.busqueda_skus import obtener_indice_busqueda
+from modules.ia_utils import calcular_huella_contexto, obtener_material_respuestas
 
 
-def consolidar_historico_stock(df_demanda, df_maestro):
-    df = df_demanda.copy()
-    df['fecha'] = pd.to_datetime(df['fecha'])
-    df['mes'] = df['fecha'].dt.to_period('M').dt.to_timestamp()
-    df['unidades_perdidas'] = df.apply(
-        lambda row: row['demanda_sin_stockout'] - row['demanda'] if row['demanda_sin_stockout'] > row['demanda'] else 0,
-        axis=1
-    )
+def calcular_unidades_perdidas(df_demanda):
+    """Unidades perdidas por fila: demanda_sin_stockout - demanda cuando es positiva (0 si falta alguno)."""
+    return (df_demanda['demanda_sin_stockout'] - df_demanda['demanda']).clip(lower=0).fillna(0)
+
+
+def resumir_perdidas_mensuales(df_demanda, df_maestro, panel=None):
+    """
+    Fuente única de las pérdidas históricas: resumen por SKU y mes con demanda real, demanda limpia,
+    unidades perdidas y su valorización en euros, calculado en una sola agrupación
+    (o tomado del panel mensual de la sesión si se entrega).
+    """
+    if panel is not None:
+        resumen = panel[panel['semanas'] > 0][['sku', 'mes', 'demanda', 'demanda_limpia', 'unidades_perdidas']]
+        resumen = resumen.rename(columns={'demanda': 'demanda_real'}).reset_index(drop=True)
+    else:
+        df = df_demanda[['sku', 'fecha', 'demanda', 'demanda_sin_outlier', 'demanda_sin_stockout']].copy()
+        df['mes'] = pd.to_datetime(df['fecha']).dt.to_period('M').dt.to_timestamp()
+        df['unidades_perdidas'] = calcular_unidades_perdidas(df)
 
-    resumen = df.groupby(['sku', 'mes']).agg(
-        demanda_real=('demanda', 'sum'),
-        demanda_limpia=('demanda_sin_outlier', 'sum'),
-        unidades_perdidas=('unidades_perdidas', 'sum')
-    ).reset_index()
+        resumen = df.groupby(['sku', 'mes'], observed=True).agg(
+            demanda_real=('demanda', 'sum'),
+            demanda_limpia=('demanda_sin_outlier', 'sum'),
+            unidades_perdidas=('unidades_perdidas', 'sum')
+        ).reset_index()
 
     if not df_maestro.empty:
-        resumen = resumen.merge(df_maestro[['sku', 'precio_venta']], on='sku', how='left')
+        precio = df_maestro.drop_duplicates('sku').set_index('sku')['precio_venta']
+        # Con 'sku' categórico el map devuelve otra categoría: se toman los valores como arreglo numérico
+        resumen['precio_venta'] = resumen['sku'].map(precio).to_numpy()
         resumen['valor_perdido_euros'] = resumen['unidades_perdidas'] * resumen['precio_venta']
     else:
         resumen['valor_perdido_euros'] = 0
+    return resumen
+
 
+def consolidar_historico_stock(df_demanda, df_maestro, panel=None):
+    resumen = resumir_perdidas_mensuales(df_demanda, df_maestro, panel)
     st.session_state["resumen_historico"] = resumen
     return resumen
 
 
-def consolidar_proyeccion_futura(df_forecast, df_stock, df_repos, df_maestro):
+def consolidar_proyeccion_futura(df_forecast, df_stock, df_repos, df_maestro, calendario=None):
     from modules.stock_projector import project_stock
+    from modules.reposiciones import construir_calendario_reposiciones
+
+    if calendario is None:
+        calendario = construir_calendario_reposiciones(df_repos)
 
     resumen_futuro = []
 
@@ -52,7 +75,8 @@ def consolidar_proyeccion_futura(df_forecast, df_stock, df_repos, df_maestro):
             df_repos=df_repos,
             sku=sku,
             fecha_inicio=fecha_inicio,
-            precio_venta=precio_venta
+            precio_venta=precio_venta,
+            calendario=calendario
         )
 
         if not df_resultado.empty:
@@ -68,90 +92,92 @@ def consolidar_proyeccion_futura(df_forecast, df_stock, df_repos, df_maestro):
     return df_final
 
 
+def construir_tabla_contexto(df_forecast, df_proyeccion, df_hist, resultados, repos=None):
+    """
+    Tabla de contexto de negocio por SKU (una fila por SKU con forecast proyectado), armada con una
+    agregación por fuente y un join sobre el índice de SKU compartido.
+    """
+    forecast = df_forecast[df_forecast['tipo_mes'] == 'proyección'].groupby('sku')['forecast'].mean().round(1)
+    tabla = forecast.rename('Forecast Promedio Mensual').to_frame()
+
+    proy = df_proyeccion.sort_values('mes').groupby('sku').agg(
+        forecast_total=('forecast', 'sum'),
+        stock_final=('stock_final_mes', 'last')
+    )
+    unidades_a_comprar = proy['forecast_total'] - proy['stock_final']
+    proy = pd.DataFrame({
+        'Stock Proyectado': proy['stock_final'],
+        'Unidades a Comprar': unidades_a_comprar.where(unidades_a_comprar > 0)
+    })
+
+    hist = df_hist.groupby('sku').agg(
+        unidades_perdidas=('unidades_perdidas', 'sum'),
+        valor_perdido_euros=('valor_perdido_euros', 'sum'),
+        demanda_real=('demanda_real', 'sum'),
+        demanda_limpia=('demanda_limpia', 'sum')
+    )
+    demanda_total = hist['demanda_real'] + hist['unidades_perdidas']
+    hist = pd.DataFrame({
+        'Unidades Perdidas': hist['unidades_perdidas'],
+        'Pérdida Hist. (€)': hist['valor_perdido_euros'],
+        'Tasa de Quiebre (%)': (hist['unidades_perdidas'] / demanda_total * 100).where(demanda_total > 0, 0),
+        'Demanda Real 12M': hist['demanda_real'],
+        'Demanda Limpia 12M': hist['demanda_limpia']
+    })
+
+    politicas = pd.DataFrame.from_dict({
+        sku: {
+            "ROP": datos["politicas"].get("rop_original", 0),
+            "EOQ": datos["politicas"].get("eoq", 0),
+            "Safety Stock": datos["politicas"].get("safety_stock", 0)
+        }
+        for sku, datos in resultados.items()
+        if datos.get("politicas") is not None
+    }, orient='index', columns=["ROP", "EOQ", "Safety Stock"])
+
+    # --- Agregar Unidades en Camino por SKU ---
+    if repos is not None and not repos.empty:
+        en_camino = repos.groupby('sku')['cantidad'].sum().rename('Unidades en Camino')
+    else:
+        en_camino = pd.Series(0, index=tabla.index, name='Unidades en Camino')
+
+    tabla = tabla.join([proy, hist, politicas, en_camino], how='left').fillna(0)
+    return tabla.rename_axis('SKU').reset_index()
+
+
+def texto_contexto_negocio(df_contexto):
+    """Resumen en texto por SKU de la tabla de contexto, formateado columna a columna."""
+    enteros = lambda col: df_contexto[col].astype(int).astype(str)
+    bloques = (
+        "🔹 SKU: " + df_contexto['SKU'].astype(str) + "\n"
+        "   • Forecast mensual promedio: " + df_contexto['Forecast Promedio Mensual'].astype(str) + " unidades\n"
+        "   • Stock proyectado: " + df_contexto['Stock Proyectado'].astype(str) + " unidades\n"
+        "   • Unidades a comprar: " + df_contexto['Unidades a Comprar'].clip(lower=0).astype(int).astype(str) + "\n"
+        "   • Unidades perdidas históricas: " + enteros('Unidades Perdidas') + "\n"
+        "   • Pérdida histórica: € " + enteros('Pérdida Hist. (€)') + "\n"
+        "   • Tasa de quiebre: " + df_contexto['Tasa de Quiebre (%)'].map('{:.1f}'.format) + "%\n"
+        "   • Demanda real 12M: " + enteros('Demanda Real 12M') + "\n"
+        "   • Demanda limpia 12M: " + enteros('Demanda Limpia 12M') + "\n"
+        "   • ROP: " + enteros('ROP') + ", EOQ: " + enteros('EOQ') + ", Safety Stock: " + enteros('Safety Stock') + "\n"
+        "   • Unidades en Camino: " + enteros('Unidades en Camino') + "\n\n"
+    )
+    return "Aquí tienes un resumen del negocio por SKU:\n\n" + "".join(bloques.tolist())
+
+
 def generar_contexto_negocio(df_forecast, df_proyeccion, df_hist):
     try:
         # --- Verificación obligatoria ---
         if "resultados_inventario" not in st.session_state or not st.session_state["resultados_inventario"]:
             return "⚠️ Las políticas de inventario aún no han sido calculadas. Ve al módulo 'Gestión de Inventarios' primero."
 
-        resumen_forecast = df_forecast[df_forecast['tipo_mes'] == 'proyección'].groupby('sku')['forecast'].mean().round(1).reset_index()
-        resumen_forecast.columns = ['SKU', 'Forecast Promedio Mensual']
-
-        stock_final = df_proyeccion.sort_values('mes').groupby('sku').last().reset_index()
-        stock_final = stock_final[['sku', 'stock_final_mes']]
-        stock_final.columns = ['SKU', 'Stock Proyectado']
-
-        df_proy = df_proyeccion.groupby('sku').agg({
-            'forecast': 'sum',
-            'stock_final_mes': 'last'
-        }).reset_index()
-        df_proy['unidades_a_comprar'] = df_proy['forecast'] - df_proy['stock_final_mes']
-        df_proy['accion'] = df_proy['unidades_a_comprar'].apply(lambda x: 'Comprar' if x > 0 else 'No comprar')
-        compras = df_proy[df_proy['accion'] == 'Comprar'][['sku', 'unidades_a_comprar']].rename(columns={
-            'sku': 'SKU',
-            'unidades_a_comprar': 'Unidades a Comprar'
-        })
-
-        perdidas = df_hist.groupby('sku')[['unidades_perdidas', 'valor_perdido_euros']].sum().reset_index()
-        perdidas.columns = ['SKU', 'Unidades Perdidas', 'Pérdida Hist. (€)']
-
-        tasa_quiebre = df_hist.groupby('sku').apply(
-            lambda x: (x['unidades_perdidas'].sum() / (x['demanda_real'].sum() + x['unidades_perdidas'].sum()) * 100)
-            if (x['demanda_real'].sum() + x['unidades_perdidas'].sum()) > 0 else 0
-        ).reset_index(name='Tasa de Quiebre (%)')
-        tasa_quiebre.columns = ['SKU', 'Tasa de Quiebre (%)']
-
-        demanda_total = df_hist.groupby('sku')[['demanda_real', 'demanda_limpia']].sum().reset_index()
-        demanda_total.columns = ['SKU', 'Demanda Real 12M', 'Demanda Limpia 12M']
-
         resultados = st.session_state["resultados_inventario"]
-        politicas_df = pd.DataFrame([
-            {
-                "SKU": sku,
-                "ROP": datos["politicas"].get("rop_original", 0),
-                "EOQ": datos["politicas"].get("eoq", 0),
-                "Safety Stock": datos["politicas"].get("safety_stock", 0)
-            }
-            for sku, datos in resultados.items()
-            if datos.get("politicas") is not None
-        ])
-
-        df_contexto = resumen_forecast \
-            .merge(stock_final, on='SKU', how='left') \
-            .merge(compras, on='SKU', how='left') \
-            .merge(perdidas, on='SKU', how='left') \
-            .merge(tasa_quiebre, on='SKU', how='left') \
-            .merge(demanda_total, on='SKU', how='left') \
-            .merge(politicas_df, on='SKU', how='left')
-
-        # --- Agregar Unidades en Camino por SKU ---
         repos = st.session_state.get("reposiciones", pd.DataFrame())
-        if not repos.empty:
-            unidades_en_camino_por_sku = repos.groupby('sku')['cantidad'].sum().reset_index()
-            unidades_en_camino_por_sku.columns = ['SKU', 'Unidades en Camino']
-            df_contexto = df_contexto.merge(unidades_en_camino_por_sku, on='SKU', how='left')
-        else:
-            df_contexto['Unidades en Camino'] = 0
-
-        df_contexto = df_contexto.fillna(0)
+        df_contexto = construir_tabla_contexto(df_forecast, df_proyeccion, df_hist, resultados, repos)
         st.session_state['contexto_negocio_por_sku'] = df_contexto
+        obtener_indice_skus(df_contexto)
+        obtener_indice_busqueda(df_contexto, st.session_state.get("maestro"))
 
-        texto = "Aquí tienes un resumen del negocio por SKU:\n\n"
-        for _, row in df_contexto.iterrows():
-            texto += (
-                f"🔹 SKU: {row['SKU']}\n"
-                f"   • Forecast mensual promedio: {row['Forecast Promedio Mensual']} unidades\n"
-                f"   • Stock proyectado: {row['Stock Proyectado']} unidades\n"
-                f"   • Unidades a comprar: {int(row['Unidades a Comprar']) if row['Unidades a Comprar'] > 0 else 0}\n"
-                f"   • Unidades perdidas históricas: {int(row['Unidades Perdidas'])}\n"
-                f"   • Pérdida histórica: € {int(row['Pérdida Hist. (€)'])}\n"
-                f"   • Tasa de quiebre: {row['Tasa de Quiebre (%)']:.1f}%\n"
-                f"   • Demanda real 12M: {int(row['Demanda Real 12M'])}\n"
-                f"   • Demanda limpia 12M: {int(row['Demanda Limpia 12M'])}\n"
-                f"   • ROP: {int(row['ROP'])}, EOQ: {int(row['EOQ'])}, Safety Stock: {int(row['Safety Stock'])}\n"
-                f"   • Unidades en Camino: {int(row['Unidades en Camino'])}\n\n"
-            )
-
+        texto = texto_contexto_negocio(df_contexto)
         st.session_state["contexto_negocio"] = texto
 
         # --- Generar contexto general agregado ---
@@ -180,6 +206,10 @@ def generar_contexto_negocio(df_forecast, df_proyeccion, df_hist):
 
         st.session_state["contexto_negocio_general"] = contexto_general
 
+        # --- Material precalculado de las respuestas generales del chat ---
+        st.session_state["huella_contexto"] = calcular_huella_contexto()
+        obtener_material_respuestas()
+
         return texto
 
     except Exception as e:
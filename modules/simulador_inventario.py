@@ -0,0 +1,142 @@
+import pandas as pd
+import numpy as np
+from modules.resumen_utils import calcular_unidades_perdidas
+from modules.panel_mensual import panel_con_demanda
+
+
+def simular_politica_rop(demanda, stock_inicial, rop, eoq, lead_time):
+    """
+    Simula una política (ROP, EOQ) mensual con ventas perdidas, vectorizada sobre todas las dimensiones.
+
+    - demanda: arreglo (..., meses) con la demanda mensual a atender
+    - stock_inicial, rop, eoq: arreglos que se difunden (broadcast) contra demanda[..., 0]
+    - lead_time: meses entre el pedido (cierre de mes) y su llegada (inicio de mes)
+
+    En cada mes llegan los pedidos vencidos, se atiende la demanda con el stock disponible y, al cierre,
+    si la posición de inventario (stock + pedidos en camino) es menor o igual al ROP se pide un EOQ.
+
+    Retorna un diccionario de arreglos con forma demanda.shape[:-1]:
+    'stock_promedio', 'unidades_vendidas', 'unidades_perdidas', 'fill_rate', 'pedidos'.
+    """
+    demanda = np.asarray(demanda, dtype=float)
+    forma = np.broadcast_shapes(demanda.shape[:-1], np.shape(stock_inicial), np.shape(rop), np.shape(eoq))
+    n_meses = demanda.shape[-1]
+    lead_time = int(lead_time)
+
+    stock = np.broadcast_to(np.asarray(stock_inicial, dtype=float), forma).copy()
+    rop = np.broadcast_to(np.asarray(rop, dtype=float), forma)
+    eoq = np.broadcast_to(np.asarray(eoq, dtype=float), forma)
+
+    # Buffer circular de pedidos: el pedido del cierre del mes t llega al inicio del mes t + 1 + lead_time
+    en_camino = np.zeros(forma + (lead_time + 1,))
+    stock_acumulado = np.zeros(forma)
+    vendidas = np.zeros(forma)
+    perdidas = np.zeros(forma)
+    pedidos = np.zeros(forma)
+
+    for t in range(n_meses):
+        slot = t % (lead_time + 1)
+        stock += en_camino[..., slot]
+        en_camino[..., slot] = 0
+
+        demanda_mes = demanda[..., t]
+        venta = np.minimum(stock, demanda_mes)
+        stock -= venta
+        vendidas += venta
+        perdidas += demanda_mes - venta
+        stock_acumulado += stock
+
+        pedir = (stock + en_camino.sum(axis=-1)) <= rop
+        en_camino[..., slot] = np.where(pedir, eoq, 0)
+        pedidos += pedir & (eoq > 0)
+
+    demanda_total = vendidas + perdidas
+    return {
+        "stock_promedio": stock_acumulado / max(n_meses, 1),
+        "unidades_vendidas": vendidas,
+        "unidades_perdidas": perdidas,
+        "fill_rate": np.divide(vendidas, demanda_total, out=np.ones(forma), where=demanda_total > 0),
+        "pedidos": pedidos
+    }
+
+
+def matriz_demanda_mensual(df_demanda_limpia, columna='demanda_sin_stockout', meses=None, panel=None):
+    """
+    Pivot SKU × mes de la demanda semanal agregada a meses (opcionalmente sólo los últimos `meses`).
+    Con `panel` (panel mensual de la sesión) se toma la columna ya agregada.
+    """
+    if panel is not None:
+        df = panel_con_demanda(panel)
+    else:
+        df = df_demanda_limpia[['sku', 'fecha', columna]].copy()
+        df['mes'] = pd.to_datetime(df['fecha']).dt.to_period('M').dt.to_timestamp()
+    matriz = df.pivot_table(index='sku', columns='mes', values=columna, aggfunc='sum', fill_value=0, observed=True).sort_index(axis=1)
+    if meses is not None:
+        matriz = matriz.iloc[:, -meses:]
+    return matriz
+
+
+def stock_inicial_historico(df_stock_historico, skus, primer_mes):
+    """
+    Stock de partida por SKU para un backtest que comienza en `primer_mes`: la última foto de stock
+    anterior a ese mes o, si no existe, la primera foto disponible del SKU (0 si no hay registros).
+    """
+    if df_stock_historico is None or df_stock_historico.empty:
+        return pd.Series(0.0, index=skus)
+    df = df_stock_historico[['sku', 'fecha', 'stock']].copy()
+    df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
+    df = df.dropna(subset=['fecha']).sort_values('fecha')
+    antes = df[df['fecha'] < primer_mes].groupby('sku')['stock'].last()
+    primero = df.groupby('sku')['stock'].first()
+    return antes.combine_first(primero).reindex(skus).fillna(0).astype(float)
+
+
+def backtest_politicas(df_demanda_limpia, df_stock_historico, df_politicas, lead_time=5, meses=None, panel=None):
+    """
+    Repite la historia mensual de todos los SKUs aplicando una política (ROP, EOQ) fija.
+
+    - df_demanda_limpia: demanda semanal; se atiende la 'demanda_sin_stockout' (demanda real sin quiebres)
+    - df_stock_historico: fotos de stock para fijar el stock inicial de cada SKU
+    - df_politicas: columnas 'sku', 'rop', 'eoq' (p. ej. calcular_politicas_inventario_lote)
+    - meses: si se indica, sólo se repiten los últimos `meses` meses
+    - panel: panel mensual de la sesión (evita reagrupar la demanda semanal)
+
+    Retorna un DataFrame por SKU con fill rate, stock promedio, unidades vendidas/perdidas y pedidos
+    de la política, junto a las unidades perdidas y el fill rate que se observaron en la historia.
+    """
+    politicas = df_politicas.drop_duplicates('sku').set_index('sku')
+    sin_stockout = matriz_demanda_mensual(df_demanda_limpia, 'demanda_sin_stockout', meses, panel)
+    skus = sin_stockout.index.intersection(politicas.index)
+    sin_stockout = sin_stockout.loc[skus]
+    if sin_stockout.empty:
+        return pd.DataFrame(columns=['sku', 'fill_rate', 'stock_promedio', 'unidades_vendidas', 'unidades_perdidas',
+                                     'pedidos', 'unidades_perdidas_historicas', 'fill_rate_historico'])
+
+    df_perdidas = None if panel is not None else df_demanda_limpia[['sku', 'fecha']].assign(
+        unidades_perdidas=calcular_unidades_perdidas(df_demanda_limpia))
+    perdidas_historicas = matriz_demanda_mensual(df_perdidas, 'unidades_perdidas', meses, panel).reindex(
+        index=skus, columns=sin_stockout.columns, fill_value=0).to_numpy(dtype=float).sum(axis=1)
+    stock_inicial = stock_inicial_historico(df_stock_historico, skus, sin_stockout.columns[0])
+
+    sim = simular_politica_rop(
+        sin_stockout.to_numpy(dtype=float),
+        stock_inicial.to_numpy(),
+        politicas.loc[skus, 'rop'].to_numpy(dtype=float),
+        politicas.loc[skus, 'eoq'].to_numpy(dtype=float),
+        lead_time
+    )
+
+    demanda_total = sin_stockout.to_numpy(dtype=float).sum(axis=1)
+    fill_rate_historico = np.divide(demanda_total - perdidas_historicas, demanda_total,
+                                    out=np.ones(len(skus)), where=demanda_total > 0)
+
+    return pd.DataFrame({
+        'sku': skus,
+        'fill_rate': sim['fill_rate'].round(4),
+        'stock_promedio': sim['stock_promedio'].round(1),
+        'unidades_vendidas': sim['unidades_vendidas'].round().astype(int),
+        'unidades_perdidas': sim['unidades_perdidas'].round().astype(int),
+        'pedidos': sim['pedidos'].astype(int),
+        'unidades_perdidas_historicas': perdidas_historicas.round().astype(int),
+        'fill_rate_historico': fill_rate_historico.round(4)
+    })
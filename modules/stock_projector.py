@@ -1,6 +1,8 @@
 import pandas as pd
+import numpy as np
+from modules.reposiciones import construir_calendario_reposiciones, reposicion_mes, matriz_reposiciones
 
-def project_stock(df_forecast, df_stock, df_repos, sku, fecha_inicio, precio_venta=None):
+def project_stock(df_forecast, df_stock, df_repos, sku, fecha_inicio, precio_venta=None, calendario=None):
     """
     Proyecta el stock mensual para un SKU, considerando forecast, reposiciones y precio de venta.
 
@@ -11,6 +13,8 @@ def project_stock(df_forecast, df_stock, df_repos, sku, fecha_inicio, precio_ven
     - sku: SKU a proyectar
     - fecha_inicio: fecha (datetime) desde la cual comenzar la proyección
     - precio_venta: (opcional) precio unitario del producto
+    - calendario: (opcional) calendario de construir_calendario_reposiciones; si se entrega,
+      las reposiciones se consultan en él en lugar de filtrar df_repos
 
     Retorna:
     - DataFrame con columnas:
@@ -34,8 +38,9 @@ def project_stock(df_forecast, df_stock, df_repos, sku, fecha_inicio, precio_ven
     stock_actual = int(stock_info.iloc[0]['stock'])
 
     # Reposiciones del SKU
-    reposiciones = df_repos[df_repos['sku'] == sku].copy()
-    reposiciones['mes'] = pd.to_datetime(reposiciones['fecha'], errors='coerce').dt.to_period('M').dt.to_timestamp()
+    if calendario is None:
+        reposiciones = df_repos[df_repos['sku'] == sku].copy()
+        reposiciones['mes'] = pd.to_datetime(reposiciones['fecha'], errors='coerce').dt.to_period('M').dt.to_timestamp()
 
     # Inicializar columnas
     df_sku['repos_aplicadas'] = 0
@@ -50,7 +55,10 @@ def project_stock(df_forecast, df_stock, df_repos, sku, fecha_inicio, precio_ven
         stock_inicial = stock_actual
 
         # Reposiciones del mes
-        repos_mes = reposiciones[reposiciones['mes'] == mes]['cantidad'].sum()
+        if calendario is None:
+            repos_mes = reposiciones[reposiciones['mes'] == mes]['cantidad'].sum()
+        else:
+            repos_mes = reposicion_mes(calendario, sku, mes)
         stock_con_repos = stock_inicial + repos_mes
 
         # Calcular pérdidas
@@ -76,3 +84,133 @@ def project_stock(df_forecast, df_stock, df_repos, sku, fecha_inicio, precio_ven
 
 
 
+
+
+def simular_stock_montecarlo(df_forecast, df_stock, df_repos, df_maestro=None, n_escenarios=1000,
+                             fuente_error='forecast_up', semilla=None, skus_por_bloque=500, calendario=None):
+    """
+    Proyección estocástica del stock mensual para todos los SKUs a la vez.
+
+    Muestrea `n_escenarios` trayectorias de demanda por SKU a partir del forecast proyectado y su
+    error (normal truncada en 0), y propaga todas las trayectorias como un arreglo
+    SKUs × escenarios × meses. Los SKUs se procesan por bloques para acotar la memoria.
+
+    Parámetros:
+    - df_forecast: DataFrame de forecast_engine (usa las filas 'proyección' y, si corresponde, 'backtest')
+    - df_stock: DataFrame con columnas ['sku', 'stock', 'fecha']
+    - df_repos: DataFrame con columnas ['sku', 'fecha', 'cantidad']
+    - df_maestro: (opcional) DataFrame con ['sku', 'precio_venta'] para valorizar las pérdidas
+    - n_escenarios: número de trayectorias simuladas por SKU
+    - fuente_error: 'forecast_up' (desviación = forecast_up - forecast) o
+      'backtest' (desviación de los residuos del backtest de cada SKU)
+    - semilla: semilla del generador aleatorio, para resultados reproducibles
+    - calendario: (opcional) calendario de reposiciones ya construido
+
+    Retorna:
+    - DataFrame con columnas:
+      ['sku', 'mes', 'forecast', 'repos_aplicadas', 'prob_quiebre',
+       'stock_p10', 'stock_p50', 'stock_p90',
+       'unidades_perdidas_p10', 'unidades_perdidas_p50', 'unidades_perdidas_p90',
+       'perdida_euros_p10', 'perdida_euros_p50', 'perdida_euros_p90']
+    """
+    columnas = ['sku', 'mes', 'forecast', 'repos_aplicadas', 'prob_quiebre',
+                'stock_p10', 'stock_p50', 'stock_p90',
+                'unidades_perdidas_p10', 'unidades_perdidas_p50', 'unidades_perdidas_p90',
+                'perdida_euros_p10', 'perdida_euros_p50', 'perdida_euros_p90']
+
+    # --- Stock inicial y mes de inicio por SKU (mismo criterio que consolidar_proyeccion_futura) ---
+    stock = df_stock[['sku', 'stock', 'fecha']].copy()
+    stock['mes_inicio'] = pd.to_datetime(stock['fecha']).dt.to_period('M').dt.to_timestamp()
+    stock = stock[stock['mes_inicio'] == stock.groupby('sku')['mes_inicio'].transform('min')]
+    stock = stock.drop_duplicates('sku').set_index('sku')
+
+    # --- Forecast proyectado desde el mes de inicio ---
+    df_proy = df_forecast[df_forecast['tipo_mes'] == 'proyección'][['sku', 'mes', 'forecast', 'forecast_up']].copy()
+    df_proy['mes'] = pd.to_datetime(df_proy['mes'])
+    df_proy = df_proy.merge(stock[['mes_inicio']], left_on='sku', right_index=True, how='inner')
+    df_proy = df_proy[df_proy['mes'] >= df_proy['mes_inicio']]
+    if df_proy.empty:
+        return pd.DataFrame(columns=columnas)
+
+    forecast = df_proy.pivot_table(index='sku', columns='mes', values='forecast', aggfunc='sum', observed=True)
+    skus = forecast.index
+    meses = forecast.columns
+    mu = forecast.to_numpy(dtype=float)
+    activo = ~np.isnan(mu)
+    mu = np.nan_to_num(mu)
+
+    # --- Desviación del error del forecast ---
+    if fuente_error == 'backtest':
+        df_bt = df_forecast[df_forecast['tipo_mes'] == 'backtest']
+        residuos = (df_bt['demanda_limpia'] - df_bt['forecast']).groupby(df_bt['sku']).std()
+        sigma = np.repeat(residuos.reindex(skus).fillna(0).to_numpy(dtype=float)[:, None], len(meses), axis=1)
+    elif fuente_error == 'forecast_up':
+        forecast_up = df_proy.pivot_table(index='sku', columns='mes', values='forecast_up', aggfunc='sum', observed=True)
+        sigma = (forecast_up.reindex(index=skus, columns=meses).to_numpy(dtype=float) - mu)
+        sigma = np.nan_to_num(sigma)
+    else:
+        raise ValueError(f"fuente_error no reconocida: {fuente_error}")
+    sigma = np.clip(sigma, 0, None)
+
+    # --- Reposiciones por SKU y mes ---
+    if calendario is None:
+        calendario = construir_calendario_reposiciones(df_repos)
+    repos = np.where(activo, matriz_reposiciones(calendario, skus, meses), 0)
+
+    precio = np.zeros(len(skus))
+    if df_maestro is not None and not df_maestro.empty:
+        precio = np.nan_to_num(
+            df_maestro.drop_duplicates('sku').set_index('sku')['precio_venta']
+            .reindex(skus).to_numpy(dtype=float)
+        )
+
+    stock_inicial = stock['stock'].reindex(skus).fillna(0).to_numpy(dtype=float)
+
+    # --- Propagación por bloques de SKUs: (skus, escenarios, meses) ---
+    rng = np.random.default_rng(semilla)
+    percentiles = [0.1, 0.5, 0.9]
+    n_meses = len(meses)
+    prob_quiebre = np.empty((len(skus), n_meses))
+    q_stock = np.empty((3, len(skus), n_meses))
+    q_perdidas = np.empty((3, len(skus), n_meses))
+
+    for inicio in range(0, len(skus), skus_por_bloque):
+        b = slice(inicio, inicio + skus_por_bloque)
+        n_b = len(skus[b])
+        demanda = rng.standard_normal((n_b, n_escenarios, n_meses), dtype=np.float32)
+        demanda *= sigma[b, None, :].astype(np.float32)
+        demanda += mu[b, None, :].astype(np.float32)
+        np.clip(demanda, 0, None, out=demanda)
+        np.round(demanda, out=demanda)
+        demanda *= activo[b, None, :]
+
+        stock_final = np.empty_like(demanda)
+        perdidas = np.empty_like(demanda)
+        stock_mes = np.repeat(stock_inicial[b, None].astype(np.float32), n_escenarios, axis=1)
+        for t in range(n_meses):
+            stock_con_repos = stock_mes + repos[b, t, None].astype(np.float32)
+            perdidas[:, :, t] = np.maximum(demanda[:, :, t] - stock_con_repos, 0)
+            stock_mes = np.maximum(stock_con_repos - demanda[:, :, t], 0)
+            stock_final[:, :, t] = stock_mes
+
+        prob_quiebre[b] = (perdidas > 0).mean(axis=1)
+        q_stock[:, b] = np.quantile(stock_final, percentiles, axis=1)
+        q_perdidas[:, b] = np.quantile(perdidas, percentiles, axis=1)
+
+    # --- Resultado en formato largo (sku, mes) ---
+    fila, col = np.nonzero(activo)
+    df_resultado = pd.DataFrame({
+        'sku': skus[fila],
+        'mes': meses[col],
+        'forecast': mu[fila, col].astype(int),
+        'repos_aplicadas': repos[fila, col].astype(int),
+        'prob_quiebre': prob_quiebre[fila, col].round(4),
+    })
+    for i, p in enumerate(['p10', 'p50', 'p90']):
+        df_resultado[f'stock_{p}'] = q_stock[i][fila, col].round()
+    for i, p in enumerate(['p10', 'p50', 'p90']):
+        df_resultado[f'unidades_perdidas_{p}'] = q_perdidas[i][fila, col].round()
+    for i, p in enumerate(['p10', 'p50', 'p90']):
+        df_resultado[f'perdida_euros_{p}'] = (q_perdidas[i][fila, col] * precio[fila]).round(2)
+
+    return df_resultado[columnas]
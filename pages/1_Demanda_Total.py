@@ -5,6 +5,8 @@ import plotly.graph_objects as go
 from datetime import timedelta
 from dateutil.relativedelta import relativedelta
 from utils.render_logo_sidebar import render_logo_sidebar
+from modules.resumen_utils import calcular_unidades_perdidas
+from modules.almacen_demanda import demanda_disponible, demanda_semanal_sesion, iterar_demanda_limpia, skus_demanda
 
 # ✅ Configuración inicial
 st.set_page_config(layout="wide")
@@ -20,21 +22,18 @@ render_logo_sidebar()
 st.markdown('<h1 style="font-size: 24px; margin-bottom: 2px; font-weight: 500;">📊 DEMANDA TOTAL Y QUIEBRES</h1>', unsafe_allow_html=True)
 
 # ✅ Validación de datos
-if "demanda_limpia" not in st.session_state or st.session_state["demanda_limpia"] is None or st.session_state["demanda_limpia"].empty:
+# (con almacén particionado, df_total son los totales semanales del catálogo y no la demanda de cada SKU)
+df_total = demanda_semanal_sesion() if demanda_disponible() else None
+if df_total is None or df_total.empty:
     st.warning("⚠️ Aún no se han cargado los datos de demanda limpia. Por favor, vuelve a la página de Inicio y presiona 'Comenzar planificación'.")
     st.stop()
 
-# ✅ Cargar datos
-df = st.session_state["demanda_limpia"].copy()
-df['fecha'] = pd.to_datetime(df['fecha'])
-df['semana'] = df['fecha'].dt.to_period('W').apply(lambda r: r.start_time)
-
 # ✅ Filtros independientes por página
-skus = sorted(df["sku"].unique())
+skus = sorted(skus_demanda())
 skus.insert(0, "TODOS")
 
-fecha_min = df['fecha'].min().date()
-fecha_max = df['fecha'].max().date()
+fecha_min = pd.to_datetime(df_total['fecha']).min().date()
+fecha_max = pd.to_datetime(df_total['fecha']).max().date()
 fecha_min_defecto = max(fecha_min, fecha_max - relativedelta(months=24))
 
 # Claves únicas por página
@@ -59,6 +58,11 @@ with col2:
 with col3:
     st.session_state[fecha_fin_key] = st.date_input("📅 Fecha de fin", value=st.session_state[fecha_fin_key], min_value=fecha_min, max_value=fecha_max)
 
+# ✅ Cargar datos: todo el catálogo o sólo el SKU elegido (con almacén, leído de su partición)
+df = demanda_semanal_sesion(None if st.session_state[sku_key] == "TODOS" else st.session_state[sku_key]).copy()
+df['fecha'] = pd.to_datetime(df['fecha'])
+df['semana'] = df['fecha'].dt.to_period('W').apply(lambda r: r.start_time)
+
 # --- Aplicar filtros
 df_filtrado = df.copy()
 if st.session_state[sku_key] != "TODOS":
@@ -79,12 +83,9 @@ fecha_fin = st.session_state[fecha_fin_key]
 df_quiebre = df_filtrado.copy()
 df_quiebre['quiebre_stock'] = (df_quiebre['demanda'] == 0) & (df_quiebre['demanda_sin_outlier'] > 0)
 
-# Calcular unidades perdidas
-df_quiebre['unidades_perdidas'] = df_quiebre.apply(
-    lambda row: row['demanda_sin_stockout'] - row['demanda'] if row['demanda_sin_stockout'] > row['demanda'] else 0,
-    axis=1
-)
-df_quiebre['unidades_perdidas'] = df_quiebre['unidades_perdidas'].fillna(0).round(0).astype(int)
+# Calcular unidades perdidas (los totales semanales del almacén ya las traen sumadas por fila)
+if 'unidades_perdidas' not in df_quiebre:
+    df_quiebre['unidades_perdidas'] = calcular_unidades_perdidas(df_quiebre).round(0).astype(int)
 
 # ✅ Cálculo universal del % de quiebre (para TODOS o un SKU)
 total_unidades_perdidas = df_quiebre['unidades_perdidas'].sum()
@@ -276,7 +277,7 @@ st.plotly_chart(procesar_demanda_mensual(df_filtrado), use_container_width=True)
 
 # --- Descargable de demanda limpia mensual ---
 df_export_semanal['Mes'] = pd.to_datetime(df_export_semanal['Fecha']).dt.to_period('M').dt.to_timestamp()
-df_mensual = df_export_semanal.groupby(['SKU', 'Mes'], as_index=False)[['Demanda Real', 'Demanda sin Stockout', 'Demanda Limpia']].sum()
+df_mensual = df_export_semanal.groupby(['SKU', 'Mes'], as_index=False, observed=True)[['Demanda Real', 'Demanda sin Stockout', 'Demanda Limpia']].sum()
 csv_mensual = df_mensual.to_csv(index=False).encode('utf-8')
 
 st.download_button("📥 Descargar Resumen Mensual", data=csv_mensual, file_name="demanda_limpia_mensual.csv", mime='text/csv', key="descarga_mensual")
@@ -298,11 +299,32 @@ with col2:
 df_quiebre['porcentaje_quiebre'] = (df_quiebre['unidades_perdidas'] / (df_quiebre['demanda'] + df_quiebre['unidades_perdidas'])) * 100
 
 
+# --- Resumen por SKU para los rankings: con "TODOS" se recorre la demanda partición por partición ---
+def resumir_quiebre_por_sku(partes):
+    resumenes = []
+    for parte in partes:
+        parte = parte[(parte['fecha'] >= pd.to_datetime(fecha_inicio)) & (parte['fecha'] <= pd.to_datetime(fecha_fin))]
+        perdidas = calcular_unidades_perdidas(parte).round(0).astype(int)
+        resumenes.append(pd.DataFrame({
+            'sku': parte['sku'],
+            'unidades_perdidas': perdidas,
+            'porcentaje_quiebre': (perdidas / (parte['demanda'] + perdidas)) * 100,
+            'demanda_sin_outlier': parte['demanda_sin_outlier']
+        }).groupby('sku', observed=True).agg(
+            unidades_perdidas=('unidades_perdidas', 'sum'),
+            suma_porcentaje=('porcentaje_quiebre', 'sum'),
+            semanas_porcentaje=('porcentaje_quiebre', 'count'),
+            demanda_sin_outlier=('demanda_sin_outlier', 'sum')
+        ))
+    resumen = pd.concat(resumenes).sort_index()
+    # Promedio del % semanal de quiebre (sin las semanas sin demanda ni pérdidas)
+    resumen['porcentaje_quiebre'] = resumen['suma_porcentaje'] / resumen['semanas_porcentaje']
+    return resumen.reset_index()
+
+df_resumen_sku = resumir_quiebre_por_sku(iterar_demanda_limpia() if sku_seleccionado == "TODOS" else [df_quiebre])
+
 # --- Ranking de SKUs con más quiebre ---
-df_ranking_quiebre = df_quiebre.groupby('sku').agg({
-    'unidades_perdidas': 'sum',
-    'porcentaje_quiebre': 'mean'
-}).reset_index()
+df_ranking_quiebre = df_resumen_sku[['sku', 'unidades_perdidas', 'porcentaje_quiebre']].copy()
 
 # Redondeamos el porcentaje de quiebre a enteros
 df_ranking_quiebre['porcentaje_quiebre'] = df_ranking_quiebre['porcentaje_quiebre'].fillna(0).round(0).astype(int)
@@ -315,9 +337,7 @@ df_ranking_quiebre_reset = df_ranking_quiebre.reset_index(drop=True)  # Eliminar
 df_ranking_quiebre_reset.index = df_ranking_quiebre_reset.index + 1  # Ajustar el índice a partir de 1
 
 # --- Top 10 SKUs Más Demandados ---
-df_ranking_demandados = df_quiebre.groupby('sku').agg({
-    'demanda_sin_outlier': 'sum'
-}).reset_index()
+df_ranking_demandados = df_resumen_sku[['sku', 'demanda_sin_outlier']].copy()
 
 # Ordenamos por demanda sin outlier y seleccionamos los 10 primeros
 df_ranking_demandados = df_ranking_demandados.sort_values(by='demanda_sin_outlier', ascending=False).head(10)
@@ -381,12 +401,14 @@ st.download_button(
 # =====================================
 
 # Paso 1: filtrar últimos 12 meses
-fecha_max = df['fecha'].max()
+fecha_max = pd.to_datetime(df_total['fecha']).max()
 fecha_min = fecha_max - pd.DateOffset(months=12)
-df_12m = df[df['fecha'] >= fecha_min]
 
-# Paso 2: agrupar demanda limpia por SKU
-df_abc = df_12m.groupby('sku')['demanda_sin_outlier'].sum().reset_index()
+# Paso 2: agrupar demanda limpia por SKU (todo el catálogo, partición por partición)
+df_abc = pd.concat([
+    parte[parte['fecha'] >= fecha_min].groupby('sku', observed=True)['demanda_sin_outlier'].sum()
+    for parte in iterar_demanda_limpia()
+]).sort_index().reset_index()
 df_abc = df_abc.sort_values('demanda_sin_outlier', ascending=False)
 df_abc['participacion'] = df_abc['demanda_sin_outlier'] / df_abc['demanda_sin_outlier'].sum()
 df_abc['acumulado'] = df_abc['participacion'].cumsum()
@@ -3,6 +3,7 @@ import pandas as pd
 import plotly.graph_objects as go
 from utils.render_logo_sidebar import render_logo_sidebar
 from utils.filtros import aplicar_filtro_sku
+from modules.almacen_demanda import demanda_disponible
 
 # --- Configuración general ---
 st.set_page_config(layout="wide")
@@ -15,12 +16,11 @@ load_css()
 render_logo_sidebar()
 
 # --- Validación de datos ---
-if "demanda_limpia" not in st.session_state or "forecast" not in st.session_state:
+if not demanda_disponible() or "forecast" not in st.session_state:
     st.warning("⚠️ Aún no se han cargado los datos necesarios. Vuelve a la página de Inicio y presiona 'Comenzar planificación'.")
     st.stop()
 
 # --- Cargar datos desde session_state ---
-df_demanda = st.session_state["demanda_limpia"]
 df_forecast = st.session_state["forecast"]
 df_comparativa = st.session_state.get("forecast_comparativa")
 
@@ -2,6 +2,12 @@ import pandas as pd
 import streamlit as st
 import plotly.graph_objects as go
 from utils.render_logo_sidebar import render_logo_sidebar
+from modules.stock_projector import simular_stock_montecarlo
+from modules.escenarios import crear_escenario, aplicar_override, quitar_overrides, clave_escenario, entradas_escenario
+from utils.huella import huella_sesion
+from modules.panel_mensual import obtener_panel_mensual
+from modules.almacen_demanda import demanda_disponible
+from modules.historial_mmap import obtener_historial_panel, serie_sku
 
 # --- Cargar estilos y logo ---
 def load_css():
@@ -19,20 +25,61 @@ if "proyeccion_stock" not in st.session_state or st.session_state["proyeccion_st
     st.warning("⚠️ Aún no se ha proyectado el stock. Ve a la página de Inicio y presiona 'Comenzar planificación'.")
     st.stop()
 
-df_proyeccion = st.session_state["proyeccion_stock"].copy()
 df_maestro = st.session_state.get("maestro", pd.DataFrame())
 df_stock = st.session_state.get("stock_actual", pd.DataFrame())
 df_stock_hist = st.session_state.get("stock_historico", pd.DataFrame())
+df_repos = st.session_state.get("reposiciones", pd.DataFrame())
+panel = obtener_panel_mensual() if demanda_disponible() else None
+# Historial mensual por SKU en memoria compartida: cada SKU es un slice contiguo, sin recorrer el panel
+historial = obtener_historial_panel() if panel is not None else None
+
+# --- Escenario what-if (se recrea sólo si cambia la proyección base) ---
+huella_base = huella_sesion("proyeccion_stock")
+escenario = st.session_state.get("escenario_proyeccion")
+if escenario is None or escenario.get("huella_base") != huella_base:
+    escenario = crear_escenario(st.session_state["proyeccion_stock"])
+    escenario["huella_base"] = huella_base
+    st.session_state["escenario_proyeccion"] = escenario
 
 # --- Selección de SKU ---
-skus = df_proyeccion["sku"].unique()
+skus = list(escenario["por_sku"].keys())
 sku_sel = st.selectbox("Selecciona un SKU", sorted(skus))
 
-df_resultado = df_proyeccion[df_proyeccion["sku"] == sku_sel].copy()
+df_resultado = escenario["por_sku"].get(sku_sel, pd.DataFrame()).copy()
 if df_resultado.empty:
     st.warning("⚠️ No hay proyección disponible para este SKU.")
     st.stop()
 
+# --- Simulación what-if: sólo se recalcula el SKU modificado ---
+with st.expander("🧪 Simulación what-if", expanded=sku_sel in escenario["overrides"]):
+    colw1, colw2, colw3, colw4 = st.columns(4)
+    mes_w = colw1.selectbox("Mes", df_resultado["mes"].tolist(), format_func=lambda m: m.strftime("%b %Y"), key="whatif_mes")
+    fila_w = df_resultado[df_resultado["mes"] == mes_w].iloc[0]
+    forecast_w = colw2.number_input("Forecast del mes", min_value=0, value=int(fila_w["forecast"]), step=1,
+                                    key=f"whatif_forecast_{sku_sel}_{mes_w:%Y%m}")
+    repos_w = colw3.number_input("Reposición del mes", min_value=0, value=int(fila_w["repos_aplicadas"]), step=1,
+                                 key=f"whatif_repos_{sku_sel}_{mes_w:%Y%m}")
+    stock_w = colw4.number_input("Stock inicial", min_value=0, value=int(df_resultado["stock_inicial_mes"].iloc[0]), step=1,
+                                 key=f"whatif_stock_{sku_sel}")
+
+    colb1, colb2 = st.columns(2)
+    if colb1.button("✅ Aplicar cambios"):
+        aplicar_override(
+            escenario, sku_sel, st.session_state["forecast"], df_stock, df_repos, df_maestro,
+            forecast={mes_w: forecast_w} if forecast_w != int(fila_w["forecast"]) else None,
+            reposiciones={mes_w: repos_w} if repos_w != int(fila_w["repos_aplicadas"]) else None,
+            stock_inicial=stock_w if stock_w != int(df_resultado["stock_inicial_mes"].iloc[0]) else None
+        )
+        st.rerun()
+    if colb2.button("↩️ Restablecer SKU"):
+        quitar_overrides(escenario, sku_sel, st.session_state["forecast"], df_stock, df_repos, df_maestro)
+        for clave in [k for k in st.session_state.keys() if str(k).startswith("whatif_") and k != "whatif_mes"]:
+            del st.session_state[clave]
+        st.rerun()
+
+    if escenario["overrides"]:
+        st.info(f"🧪 Escenario activo con cambios en {len(escenario['overrides'])} SKU(s).")
+
 # --- Stock inicial (última fila disponible)
 stock_inicial = int(df_resultado["stock_inicial_mes"].iloc[0])
 unidades_perdidas = int(df_resultado["unidades_perdidas"].sum())
@@ -116,12 +163,85 @@ with colg2:
     )
     st.plotly_chart(fig_loss, use_container_width=True)
 
+# --- Simulación Monte Carlo (riesgo de quiebre) ---
+st.markdown("<div class='titulo-con-fondo'>🎲 Riesgo de Quiebre (Simulación Monte Carlo)</div>", unsafe_allow_html=True)
+colmc1, colmc2 = st.columns([1, 2])
+with colmc1:
+    mostrar_mc = st.checkbox("Simular escenarios de demanda", value=False)
+with colmc2:
+    fuente_error = st.radio(
+        "Error del forecast",
+        ["forecast_up", "backtest"],
+        format_func=lambda x: "Forecast con margen" if x == "forecast_up" else "Residuos del backtest",
+        horizontal=True
+    )
+
+if mostrar_mc:
+    # Se simula el catálogo completo una vez por estado del escenario (proyección base + overrides what-if)
+    # y fuente de error, y se reutiliza entre reruns; al cambiar el escenario se descartan las anteriores
+    clave_mc = clave_escenario(escenario)
+    simulaciones = st.session_state.get("proyeccion_montecarlo")
+    if simulaciones is None or simulaciones.get("clave") != clave_mc:
+        simulaciones = {"clave": clave_mc, "por_fuente": {}}
+        st.session_state["proyeccion_montecarlo"] = simulaciones
+    if fuente_error not in simulaciones["por_fuente"]:
+        forecast_mc, stock_mc, repos_mc = entradas_escenario(escenario, st.session_state["forecast"], df_stock, df_repos)
+        with st.spinner("Simulando 1.000 escenarios por SKU..."):
+            simulaciones["por_fuente"][fuente_error] = simular_stock_montecarlo(
+                forecast_mc, stock_mc, repos_mc,
+                df_maestro, n_escenarios=1000, fuente_error=fuente_error, semilla=42,
+                # Con overrides de reposiciones el calendario de la sesión ya no corresponde
+                calendario=None if escenario["overrides"] else st.session_state.get("calendario_reposiciones")
+            )
+    df_mc = simulaciones["por_fuente"][fuente_error]
+    df_mc = df_mc[df_mc["sku"] == sku_sel]
+
+    if df_mc.empty:
+        st.info("No hay forecast proyectado para simular este SKU.")
+    else:
+        colmc3, colmc4 = st.columns(2)
+        with colmc3:
+            fig_mc = go.Figure()
+            fig_mc.add_trace(go.Scatter(x=df_mc['mes'], y=df_mc['stock_p90'], mode='lines',
+                                        line=dict(width=0), showlegend=False))
+            fig_mc.add_trace(go.Scatter(x=df_mc['mes'], y=df_mc['stock_p10'], mode='lines', fill='tonexty',
+                                        fillcolor='rgba(65,105,225,0.2)', line=dict(width=0), name='P10 - P90'))
+            fig_mc.add_trace(go.Scatter(x=df_mc['mes'], y=df_mc['stock_p50'], mode='lines+markers',
+                                        line=dict(color='royalblue', width=3), name='Stock P50'))
+            fig_mc.update_layout(
+                xaxis_title="Mes",
+                yaxis_title="Unidades",
+                height=420,
+                margin=dict(t=50),
+                xaxis=dict(tickformat="%b %Y", dtick="M1", tickangle=-45),
+                legend=dict(orientation="h", y=1.1, x=0.5, xanchor="center")
+            )
+            st.plotly_chart(fig_mc, use_container_width=True)
+        with colmc4:
+            fig_prob = go.Figure()
+            fig_prob.add_trace(go.Bar(
+                x=df_mc['mes'],
+                y=df_mc['prob_quiebre'] * 100,
+                name="Probabilidad de quiebre (%)",
+                marker_color='crimson'
+            ))
+            fig_prob.update_layout(
+                xaxis_title="Mes",
+                yaxis_title="Probabilidad de quiebre (%)",
+                height=420,
+                margin=dict(t=50),
+                xaxis=dict(tickformat="%b %Y", dtick="M1", tickangle=-45),
+                yaxis=dict(range=[0, 100])
+            )
+            st.plotly_chart(fig_prob, use_container_width=True)
+
+        st.dataframe(df_mc.drop(columns=['sku']), use_container_width=True)
+
 # --- Gráfico de stock histórico mensual ---
-if not df_stock_hist.empty:
-    df_hist = df_stock_hist[df_stock_hist['sku'] == sku_sel].copy()
+serie_historica = serie_sku(historial, sku_sel).rename(columns={'fecha': 'mes'}) if historial is not None else None
+if serie_historica is not None and not df_stock_hist.empty:
+    df_hist = serie_historica[serie_historica['stock'].notna()][['mes', 'stock']]
     if not df_hist.empty:
-        df_hist['mes'] = pd.to_datetime(df_hist['fecha']).dt.to_period('M').dt.to_timestamp()
-        df_hist = df_hist.groupby('mes')['stock'].sum().reset_index()
 
         st.markdown("<div class='titulo-con-fondo'>📚 Evolución Histórica del Stock</div>", unsafe_allow_html=True)
         fig_hist = go.Figure()
@@ -157,13 +277,8 @@ st.download_button(
 )
 
 # --- Gráfico de Demanda Mensual Real vs Limpia ---
-if "demanda_limpia" in st.session_state:
-    df_demanda = st.session_state["demanda_limpia"].copy()
-    df_demanda['fecha'] = pd.to_datetime(df_demanda['fecha'])
-    df_demanda['mes'] = df_demanda['fecha'].dt.to_period('M').dt.to_timestamp()
-
-    df_mensual = df_demanda.groupby(['sku', 'mes'])[['demanda', 'demanda_sin_outlier']].sum().reset_index()
-    df_sku_mensual = df_mensual[df_mensual['sku'] == sku_sel]
+if serie_historica is not None:
+    df_sku_mensual = serie_historica[serie_historica['semanas'] > 0]
 
     if not df_sku_mensual.empty:
         st.markdown("<div class='titulo-con-fondo'>📈 Demanda Mensual Real vs Limpia</div>", unsafe_allow_html=True)
@@ -178,7 +293,7 @@ if "demanda_limpia" in st.session_state:
         ))
         fig_demanda.add_trace(go.Scatter(
             x=df_sku_mensual['mes'],
-            y=df_sku_mensual['demanda_sin_outlier'],
+            y=df_sku_mensual['demanda_limpia'],
             mode='lines+markers',
             name='Demanda Limpia',
             line=dict(color='orange', width=2),
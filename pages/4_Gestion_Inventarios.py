@@ -1,11 +1,20 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from utils.render_logo_sidebar import render_logo_sidebar
-from modules.inventory_managment import calcular_politicas_inventario
-from modules.evaluar_compra_sku import evaluar_compra_sku
-from dateutil.relativedelta import relativedelta
+from modules.inventory_managment import (
+    calcular_resultados_inventario,
+    calcular_politicas_inventario_lote,
+    optimizar_politicas,
+    backtest_variantes,
+    NIVELES_SERVICIO
+)
+from modules.reposiciones import construir_calendario_reposiciones
+from modules.panel_mensual import construir_panel_mensual
+from modules.presupuesto_compras import candidatos_compra, asignar_presupuesto
+from modules.almacen_demanda import demanda_disponible
+from utils.huella import huella_sesion
 import io
-from utils.filtros import aplicar_filtro_sku
 
 # --- Estilos y logo ---
 def load_css():
@@ -18,14 +27,15 @@ st.markdown("<h1 style='font-size: 26px; font-weight: 500;'>📦 GESTIÓN DE INV
 st.markdown("<p style='font-size: 16px;'>Revisa políticas de inventario por SKU y un resumen general de compras sugeridas</p>", unsafe_allow_html=True)
 
 # --- Validación de datos precargados ---
-if any(k not in st.session_state for k in ["forecast", "maestro", "demanda_limpia", "stock_actual", "reposiciones"]):
+if not demanda_disponible() or any(k not in st.session_state for k in ["forecast", "maestro", "stock_actual", "reposiciones"]):
     st.warning("⚠️ Los datos aún no se han cargado completamente. Vuelve a Inicio y presiona 'Comenzar planificación'.")
     st.stop()
 
 # --- Obtener desde session_state ---
 df_forecast = st.session_state["forecast"]
 df_maestro = st.session_state["maestro"]
-df_demanda_limpia = st.session_state["demanda_limpia"]
+# Con almacén particionado no hay demanda semanal en la sesión (None): se usa el panel mensual
+df_demanda_limpia = st.session_state.get("demanda_limpia")
 df_stock = st.session_state["stock_actual"]
 df_repos = st.session_state["reposiciones"]
 
@@ -35,57 +45,42 @@ if 'fecha' in df_repos.columns:
 df_forecast['mes'] = pd.to_datetime(df_forecast['mes'])
 
 # --- Cálculos de políticas y simulación de compras ---
+# Se recalculan sólo si cambian los datos de entrada; los widgets de la página sólo filtran el resultado
+metodos_safety_stock = {"Normal (σ mensual × Z)": "normal", "Empírico (demanda en el lead time)": "empirico"}
+metodo_ss = metodos_safety_stock[st.radio("Método de safety stock", list(metodos_safety_stock), horizontal=True)]
 fecha_actual = pd.to_datetime("today").replace(day=1)
-tabla_resumen = []
-st.session_state['resultados_inventario'] = {}
-
-for sku in df_forecast['sku'].unique():
-    stock_actual = df_stock[df_stock['sku'] == sku]['stock'].iloc[0] if sku in df_stock['sku'].values else 0
-    unidades_en_camino = df_repos[df_repos['sku'] == sku]['cantidad'].sum() if sku in df_repos['sku'].values else 0
-    costo_fab = df_maestro[df_maestro['sku'] == sku]['costo_fabricacion'].iloc[0] if sku in df_maestro['sku'].values else 0
-
-    forecast_4m = df_forecast[(df_forecast['sku'] == sku) & 
-                               (df_forecast['tipo_mes'] == 'proyección') & 
-                               (df_forecast['mes'] >= fecha_actual)
-                              ]['forecast'].head(4)
-    demanda_mensual = int(round(forecast_4m.mean(), 0)) if not forecast_4m.empty else 0
-
-    politicas = calcular_politicas_inventario(df_forecast, sku, unidades_en_camino, df_maestro, df_demanda_limpia)
-    if politicas is None:
-        continue
-
-    resultado = evaluar_compra_sku(sku, stock_actual, fecha_actual, demanda_mensual,
-                                   politicas["safety_stock"], politicas["eoq"], df_repos)
-
-    tabla_resumen.append({
-        "SKU": sku,
-        "Demanda Mensual": demanda_mensual,
-        "Stock Actual": int(stock_actual),
-        "Reposiciones": int(unidades_en_camino),
-        "Stock Proyectado (5M)": resultado["stock_final_simulado"],
-        "ROP": politicas["rop_original"],
-        "Safety Stock": politicas["safety_stock"],
-        "EOQ": politicas["eoq"],
-        "Costo Fabricación (€)": round(costo_fab, 2),
-        "Acción": resultado["accion"]
-    })
-
-    st.session_state['resultados_inventario'][sku] = {
-        "stock_actual": stock_actual,
-        "unidades_en_camino": unidades_en_camino,
-        "demanda_mensual": demanda_mensual,
-        "politicas": politicas,
-        "accion": resultado["accion"],
-        "unidades_sugeridas": politicas['eoq'] if resultado["accion"] == "Comprar" else 0,
-        "stock_final_simulado": resultado["stock_final_simulado"],
-        "costo_fabricacion": costo_fab
-    }
+# Huellas calculadas una vez por tabla en init_session; aquí sólo se comparan los valores guardados
+fuente_demanda = "demanda_limpia" if df_demanda_limpia is not None else "panel_mensual"
+huella_entrada = "|".join(huella_sesion(clave) for clave in ["forecast", "stock_actual", "reposiciones", "maestro", fuente_demanda])
+huella_entrada += fecha_actual.strftime("%Y-%m-%d")
+huella = huella_entrada + metodo_ss
+cache = st.session_state.get("inventario_cache")
+if cache is None or cache["huella"] != huella or "resultados_inventario" not in st.session_state:
+    # Calendario de reposiciones y panel mensual construidos una vez por carga (init_session) o al cambiar los datos
+    datos_cambiaron = cache is not None and cache.get("huella_entrada") != huella_entrada
+    if datos_cambiaron or "calendario_reposiciones" not in st.session_state:
+        st.session_state["calendario_reposiciones"] = construir_calendario_reposiciones(df_repos)
+    if df_demanda_limpia is not None and (datos_cambiaron or "panel_mensual" not in st.session_state):
+        st.session_state["panel_mensual"] = construir_panel_mensual(df_demanda_limpia, st.session_state.get("stock_historico"))
+    calendario = st.session_state["calendario_reposiciones"]
+
+    df_tabla, resultados = calcular_resultados_inventario(
+        df_forecast, df_stock, df_maestro, df_demanda_limpia, calendario, fecha_actual, metodo_ss,
+        panel=st.session_state["panel_mensual"]
+    )
+    cache = {"huella": huella, "huella_entrada": huella_entrada, "tabla": df_tabla, "excel": {}}
+    st.session_state["inventario_cache"] = cache
+    st.session_state["resultados_inventario"] = resultados
+    # --- Guardar en session_state para Resumen General ---
+    st.session_state["politicas_inventario"] = df_tabla
+
+df_tabla = cache["tabla"]
 
 # --- KPIs generales ---
-compras = [r for r in tabla_resumen if r["Acción"] == "Comprar"]
+compras = df_tabla[df_tabla["Acción"] == "Comprar"]
 total_skus = len(compras)
-total_unidades = sum(r["EOQ"] for r in compras)
-total_costo = sum(r["EOQ"] * r["Costo Fabricación (€)"] for r in compras)
+total_unidades = int(compras["EOQ"].sum())
+total_costo = (compras["EOQ"] * compras["Costo Fabricación (€)"]).sum()
 
 st.markdown("<div class='titulo-con-fondo'>📊 Resumen General de Compras</div>", unsafe_allow_html=True)
 
@@ -109,26 +104,25 @@ col3.markdown(tarjeta("Costo Total de Fabricación", int(total_costo), "€"), u
 # --- Filtro por acción sugerida ---
 opcion_filtro = st.radio("Filtrar por acción sugerida:", ["Todos", "Sólo los que se deben comprar", "Sólo los que no se deben comprar"], horizontal=True)
 
-df_resumen = pd.DataFrame(tabla_resumen)
+df_resumen = df_tabla
 if opcion_filtro == "Sólo los que se deben comprar":
     df_resumen = df_resumen[df_resumen["Acción"] == "Comprar"]
 elif opcion_filtro == "Sólo los que no se deben comprar":
     df_resumen = df_resumen[df_resumen["Acción"] == "No comprar"]
 
-# --- Guardar en session_state para Resumen General ---
-st.session_state["politicas_inventario"] = df_resumen
-
 # --- Tabla resumen ---
 st.markdown("<div class='titulo-con-fondo'>📋 Tabla Resumen por SKU</div>", unsafe_allow_html=True)
 st.dataframe(df_resumen, use_container_width=True)
 
 # --- Botón de descarga ---
-output = io.BytesIO()
-with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-    df_resumen.to_excel(writer, index=False, sheet_name="Resumen Inventario")
+if opcion_filtro not in cache["excel"]:
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        df_resumen.to_excel(writer, index=False, sheet_name="Resumen Inventario")
+    cache["excel"][opcion_filtro] = output.getvalue()
 st.download_button(
     label="📥 Descargar Excel",
-    data=output.getvalue(),
+    data=cache["excel"][opcion_filtro],
     file_name="resumen_inventario.xlsx",
     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
 )
@@ -150,4 +144,117 @@ col6.markdown(tarjeta("EOQ", sku_data["politicas"]["eoq"]), unsafe_allow_html=Tr
 col7, col8, col9 = st.columns(3)
 col7.markdown(tarjeta("Stock Actual", sku_data["stock_actual"]), unsafe_allow_html=True)
 col8.markdown(tarjeta("Acción", "🛒 Comprar" if sku_data["accion"] == "Comprar" else "📦 No comprar", unidad=""), unsafe_allow_html=True)
-col9.markdown(tarjeta("Unidades a Comprar", sku_data["unidades_sugeridas"]), unsafe_allow_html=True)
\ No newline at end of file
+col9.markdown(tarjeta("Unidades a Comprar", sku_data["unidades_sugeridas"]), unsafe_allow_html=True)
+# --- Optimización de nivel de servicio y tamaño de lote ---
+st.markdown("<div class='titulo-con-fondo'>🎯 Optimización de Políticas por Costo</div>", unsafe_allow_html=True)
+with st.expander("Buscar el nivel de servicio y lote de menor costo por SKU", expanded=False):
+    colo1, colo2, colo3 = st.columns(3)
+    tasa_mantencion = colo1.number_input("Costo de mantención mensual (% del costo)", min_value=0.0, max_value=20.0, value=2.0, step=0.5)
+    costo_pedido = colo2.number_input("Costo por pedido (€)", min_value=0.0, value=0.0, step=10.0)
+    lead_time_opt = colo3.number_input("Lead time (meses)", min_value=0, max_value=12, value=5, step=1)
+
+    clave_opt = (cache["huella"], tasa_mantencion, costo_pedido, lead_time_opt)
+    if st.button("🎯 Calcular políticas óptimas"):
+        with st.spinner("Evaluando niveles de servicio y tamaños de lote..."):
+            # Referencia: ROP y EOQ vigentes (desde el forecast) con el mismo lead time de la simulación
+            politicas_actuales = calcular_politicas_inventario_lote(
+                df_forecast, df_demanda_limpia, fecha_actual, lead_time_opt,
+                metodo_safety_stock=metodo_ss, panel=st.session_state["panel_mensual"]
+            )
+            st.session_state["politicas_optimas"] = {
+                "clave": clave_opt,
+                "tabla": optimizar_politicas(
+                    df_demanda_limpia, df_maestro,
+                    lead_time=lead_time_opt,
+                    tasa_mantencion_mensual=tasa_mantencion / 100,
+                    costo_pedido=costo_pedido,
+                    panel=st.session_state["panel_mensual"],
+                    politicas_actuales=politicas_actuales,
+                    df_stock_historico=st.session_state.get("stock_historico")
+                )
+            }
+
+    optimas = st.session_state.get("politicas_optimas")
+    if optimas is not None and optimas["clave"] == clave_opt:
+        df_opt = optimas["tabla"]
+        col_o1, col_o2 = st.columns(2)
+        col_o1.markdown(tarjeta("Costo Política Actual", int(df_opt["costo_politica_actual"].sum()), "€"), unsafe_allow_html=True)
+        col_o2.markdown(tarjeta("Costo Política Óptima", int(df_opt["costo_total"].sum()), "€"), unsafe_allow_html=True)
+        st.caption("Evaluación sobre la misma historia con que se eligen las políticas (in-sample): "
+                   "el ahorro frente a la política actual (ROP y EOQ vigentes) es una estimación optimista.")
+        n_sin_costos = int(df_opt["sin_costos"].sum())
+        if n_sin_costos:
+            st.warning(f"⚠️ {n_sin_costos} SKU(s) sin costo o precio en el maestro: no tienen política óptima ni ahorro calculados.")
+        st.dataframe(df_opt.rename(columns={
+            'sku': 'SKU', 'nivel_servicio': 'Nivel de Servicio', 'multiplicador_eoq': 'Lote (meses de demanda)',
+            'safety_stock': 'Safety Stock', 'rop': 'ROP', 'eoq': 'EOQ', 'fill_rate': 'Fill Rate',
+            'costo_mantencion': 'Costo Mantención (€)', 'costo_perdidas': 'Costo Pérdidas (€)',
+            'costo_total': 'Costo Total (€)', 'rop_actual': 'ROP Actual', 'eoq_actual': 'EOQ Actual',
+            'costo_politica_actual': 'Costo Política Actual (€)', 'ahorro': 'Ahorro (€)',
+            'sin_costos': 'Sin Costos en Maestro'
+        }), use_container_width=True)
+        st.download_button(
+            "📥 Descargar políticas óptimas",
+            df_opt.to_csv(index=False).encode("utf-8"),
+            "politicas_optimas.csv",
+            "text/csv"
+        )
+
+# --- Plan de compras con presupuesto ---
+st.markdown("<div class='titulo-con-fondo'>💶 Plan de Compras con Presupuesto</div>", unsafe_allow_html=True)
+with st.expander("Priorizar las compras sugeridas según un presupuesto disponible", expanded=False):
+    df_proyeccion = st.session_state.get("proyeccion_stock")
+    if df_proyeccion is None or df_proyeccion.empty or total_skus == 0:
+        st.info("ℹ️ No hay compras sugeridas o la proyección de stock aún no está disponible.")
+    else:
+        df_candidatos = candidatos_compra(df_tabla, df_proyeccion, df_maestro)
+        tope = max(int(np.ceil(total_costo)), 1)
+        presupuesto = st.slider("Presupuesto disponible (€)", min_value=0, max_value=tope, value=tope,
+                                step=max(tope // 200, 1))
+
+        df_plan, resumen = asignar_presupuesto(df_candidatos, presupuesto)
+        col_p1, col_p2, col_p3 = st.columns(3)
+        col_p1.markdown(tarjeta("SKUs en el Plan", resumen["skus_seleccionados"]), unsafe_allow_html=True)
+        col_p2.markdown(tarjeta("Costo del Plan", int(resumen["costo_total"]), "€"), unsafe_allow_html=True)
+        col_p3.markdown(tarjeta("Venta Perdida Evitada", int(resumen["venta_recuperada_euros"]), "€"), unsafe_allow_html=True)
+        st.caption(f"Margen recuperado: {resumen['beneficio_total']:,.0f} € · Método: {resumen['metodo']}")
+
+        df_plan = df_plan.sort_values(['seleccionado', 'beneficio'], ascending=False)
+        st.dataframe(df_plan[['sku', 'seleccionado', 'eoq', 'costo_compra', 'unidades_perdidas',
+                              'venta_recuperada_euros', 'beneficio']].rename(columns={
+            'sku': 'SKU', 'seleccionado': 'En el Plan', 'eoq': 'EOQ', 'costo_compra': 'Costo Compra (€)',
+            'unidades_perdidas': 'Unidades Perdidas Proyectadas', 'venta_recuperada_euros': 'Venta Evitada (€)',
+            'beneficio': 'Margen Recuperado (€)'
+        }), use_container_width=True)
+
+# --- Backtest histórico de políticas ---
+st.markdown("<div class='titulo-con-fondo'>🔁 Backtest Histórico de Políticas</div>", unsafe_allow_html=True)
+with st.expander("Repetir la historia con las políticas de ROP y EOQ", expanded=False):
+    colb1, colb2 = st.columns(2)
+    niveles_bt = colb1.multiselect("Niveles de servicio a comparar", NIVELES_SERVICIO,
+                                   default=[0.90, 0.99], format_func=lambda n: f"{n:.1%}")
+    lead_time_bt = colb2.number_input("Lead time (meses)", min_value=0, max_value=12, value=5, step=1, key="lead_time_backtest")
+
+    df_stock_historico = st.session_state.get("stock_historico")
+    clave_bt = (cache["huella"], tuple(niveles_bt), lead_time_bt)
+    if st.button("🔁 Ejecutar backtest"):
+        with st.spinner("Repitiendo la historia para todos los SKUs..."):
+            resumen_bt, detalle_bt = backtest_variantes(
+                df_forecast, df_demanda_limpia, df_stock_historico, niveles_bt, lead_time_bt, fecha_actual, metodo_ss,
+                panel=st.session_state["panel_mensual"]
+            )
+            st.session_state["backtest_politicas"] = {"clave": clave_bt, "resumen": resumen_bt, "detalle": detalle_bt}
+
+    backtest = st.session_state.get("backtest_politicas")
+    if backtest is not None and backtest["clave"] == clave_bt:
+        st.dataframe(backtest["resumen"].rename(columns={
+            'variante': 'Variante', 'fill_rate': 'Fill Rate', 'stock_promedio': 'Stock Promedio',
+            'unidades_perdidas': 'Unidades Perdidas', 'unidades_perdidas_historicas': 'Unidades Perdidas (Real)',
+            'pedidos': 'Pedidos'
+        }), use_container_width=True)
+        variante_sel = st.selectbox("Detalle por SKU de la variante", list(backtest["detalle"]))
+        st.dataframe(backtest["detalle"][variante_sel].rename(columns={
+            'sku': 'SKU', 'fill_rate': 'Fill Rate', 'stock_promedio': 'Stock Promedio',
+            'unidades_vendidas': 'Unidades Vendidas', 'unidades_perdidas': 'Unidades Perdidas', 'pedidos': 'Pedidos',
+            'unidades_perdidas_historicas': 'Unidades Perdidas (Real)', 'fill_rate_historico': 'Fill Rate (Real)'
+        }), use_container_width=True)
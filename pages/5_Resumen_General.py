@@ -4,6 +4,11 @@ import plotly.graph_objects as go
 import plotly.express as px
 from utils.render_logo_sidebar import render_logo_sidebar
 from modules.resumen_utils import consolidar_historico_stock, consolidar_proyeccion_futura
+from modules.escenarios import proyeccion_escenario, entradas_escenario
+from modules.panel_mensual import obtener_panel_mensual
+from modules.almacen_demanda import demanda_disponible, skus_demanda
+from utils.huella import huella_sesion
+from modules.cubo_kpis import construir_cubo_kpis, ventana_historica, calcular_rankings, TODOS
 
 # --- Configuración de página ---
 st.set_page_config(page_title="Resumen General", layout="wide")
@@ -16,88 +21,100 @@ load_css()
 render_logo_sidebar()
 
 # --- Validación de datos requeridos ---
-requeridos = ['forecast', 'demanda_limpia', 'stock_historico', 'stock_actual']
+requeridos = ['forecast', 'stock_historico', 'stock_actual']
 faltantes = [r for r in requeridos if r not in st.session_state or st.session_state[r] is None]
+if not demanda_disponible():
+    faltantes.insert(1, 'demanda_limpia')
 if faltantes:
     st.warning(f"⚠️ Faltan datos requeridos: {', '.join(faltantes)}")
     st.stop()
 
 # --- Carga desde session_state ---
-df_demand = st.session_state['demanda_limpia'].copy()
+df_demand = st.session_state.get('demanda_limpia')
 df_forecast = st.session_state['forecast'].copy()
-df_stock_hist = st.session_state['stock_historico'].copy()
 df_stock_actual = st.session_state['stock_actual'].copy()
 df_repos = st.session_state.get('reposiciones', pd.DataFrame(columns=['sku', 'fecha', 'cantidad']))
 df_maestro = st.session_state.get('maestro', pd.DataFrame())
 
-# --- Selector de SKU ---
-sku_options = sorted(set(df_demand['sku'].unique()) | set(df_forecast['sku'].unique()))
+# --- Selector de SKU (SKUs con demanda según el panel mensual, más los del forecast) ---
+sku_options = sorted(set(skus_demanda()) | set(df_forecast['sku'].unique()))
 sku_select = st.selectbox("🔍 Filtrar por SKU", options=['Todos'] + sku_options)
 
-# --- Consolidar datos históricos y futuros ---
+# --- Cubo de KPIs (SKU o ALL × mes), construido una vez por carga de datos ---
 @st.cache_data
-def calcular_resumen(df_demand, df_forecast, df_stock_actual, df_repos, df_maestro):
-    df_hist = consolidar_historico_stock(df_demand, df_maestro)
-    df_futuro = consolidar_proyeccion_futura(df_forecast, df_stock_actual, df_repos, df_maestro)
-    return df_hist, df_futuro
-
-df_hist, df_futuro = calcular_resumen(df_demand, df_forecast, df_stock_actual, df_repos, df_maestro)
-st.session_state['resumen_historico'] = df_hist
-st.session_state['proyeccion_stock'] = df_futuro
-
+def calcular_resumen(df_forecast, df_stock_actual, df_repos, df_maestro):
+    return consolidar_proyeccion_futura(df_forecast, df_stock_actual, df_repos, df_maestro)
+
+panel = obtener_panel_mensual()
+if "proyeccion_stock" not in st.session_state:
+    st.session_state['proyeccion_stock'] = calcular_resumen(df_forecast, df_stock_actual, df_repos, df_maestro)
+if "resumen_historico" not in st.session_state:
+    consolidar_historico_stock(df_demand, df_maestro, panel)
+df_futuro = st.session_state['proyeccion_stock']
+df_hist = st.session_state['resumen_historico']
+
+# Origen del cubo: huellas de contenido de las tablas de la sesión (calculadas una vez por objeto)
+origen_cubo = tuple(huella_sesion(clave) for clave in ('panel_mensual', 'forecast', 'proyeccion_stock', 'maestro'))
+cubo = st.session_state.get("cubo_kpis")
+if cubo is None or cubo["origen"] != origen_cubo:
+    cubo = construir_cubo_kpis(panel, st.session_state['forecast'], df_futuro, df_maestro)
+    cubo["origen"] = origen_cubo
+    st.session_state["cubo_kpis"] = cubo
+
+# --- Escenario what-if activo (Proyección de Stock): totales actualizados por diferencia ---
+escenario = st.session_state.get("escenario_proyeccion")
+usar_escenario = escenario is not None and bool(escenario["overrides"])
+if usar_escenario:
+    # Stock actual y reposiciones con los overrides (stock inicial, reposiciones) para los KPIs marcados con 🧪
+    _, df_stock_actual, df_repos = entradas_escenario(escenario, df_forecast, df_stock_actual, df_repos)
+    st.info(
+        f"🧪 La proyección incluye el escenario what-if con cambios en {len(escenario['overrides'])} SKU(s). "
+        "Los KPIs y gráficos marcados con 🧪 usan el escenario; los históricos (12M, 3M) y las compras "
+        "(Gestión Inventarios) no cambian."
+    )
+marca_escenario = " 🧪" if usar_escenario else ""
 
 # --- Aplicar filtro por SKU ---
+clave = TODOS if sku_select == 'Todos' else sku_select
 if sku_select != 'Todos':
     df_hist = df_hist[df_hist['sku'] == sku_select]
-    df_futuro = df_futuro[df_futuro['sku'] == sku_select]
-    df_demand = df_demand[df_demand['sku'] == sku_select]
-    df_stock_hist = df_stock_hist[df_stock_hist['sku'] == sku_select]
-    df_forecast = df_forecast[df_forecast['sku'] == sku_select]
+    if usar_escenario:
+        df_futuro = escenario["por_sku"].get(sku_select, df_futuro.iloc[0:0])
+    else:
+        df_futuro = df_futuro[df_futuro['sku'] == sku_select]
     df_stock_actual = df_stock_actual[df_stock_actual['sku'] == sku_select]
     df_repos = df_repos[df_repos['sku'] == sku_select]
 
-# --- Detectar último mes completo ---
-df_demand['fecha'] = pd.to_datetime(df_demand['fecha'])
-df_demand['mes'] = df_demand['fecha'].dt.to_period('M').dt.to_timestamp()
-df_demand['semana'] = df_demand['fecha'].dt.isocalendar().week
-
-conteo_semanas = df_demand.groupby('mes')['semana'].nunique().reset_index(name='num_semanas')
-meses_completos = conteo_semanas[conteo_semanas['num_semanas'] >= 4]['mes']
-if meses_completos.empty:
+# --- Último mes completo (precalculado en el cubo) ---
+if clave not in cubo["ultimo_mes_completo"]:
     st.warning("⚠️ No se encontraron meses completos con al menos 4 semanas.")
     st.stop()
-ultimo_mes_completo = meses_completos.max()
+ultimo_mes_completo = cubo["ultimo_mes_completo"][clave]
 mes_siguiente = ultimo_mes_completo + pd.DateOffset(months=1)
+datos_clave = cubo["datos"].loc[clave]
 
 # --- Filtros de fechas ---
 fecha_max_hist = ultimo_mes_completo
 fecha_min_hist = fecha_max_hist - pd.DateOffset(months=12)
 
-df_hist['mes'] = pd.to_datetime(df_hist['mes'])
 df_hist = df_hist[(df_hist['mes'] >= fecha_min_hist) & (df_hist['mes'] <= fecha_max_hist)]
-df_demand = df_demand[(df_demand['mes'] >= fecha_min_hist) & (df_demand['mes'] <= fecha_max_hist)]
-
-df_stock_hist['fecha'] = pd.to_datetime(df_stock_hist['fecha'])
-df_stock_hist['mes'] = df_stock_hist['fecha'].dt.to_period('M').dt.to_timestamp()
-df_stock_hist = df_stock_hist[(df_stock_hist['mes'] >= fecha_min_hist) & (df_stock_hist['mes'] <= fecha_max_hist)]
+df_ventana = ventana_historica(cubo, clave)
+df_stock_mes = datos_clave[(datos_clave.index >= fecha_min_hist) & (datos_clave.index <= fecha_max_hist)
+                           & datos_clave['stock'].notna()]
 
 # --- KPIs base ---
 total_stock = int(df_stock_actual['stock'].sum())
-unidades_vendidas_12m = int(df_demand['demanda'].sum())
+unidades_vendidas_12m = int(df_ventana['demanda'].sum())
 unidades_en_camino = int(df_repos['cantidad'].sum())
+facturacion_12m = int(df_ventana['ventas_euros'].sum())
 
-df_demand_ventas = df_demand.merge(df_maestro[['sku', 'precio_venta']], on='sku', how='left')
-df_demand_ventas['venta_real_euros'] = df_demand_ventas['demanda'] * df_demand_ventas['precio_venta']
-facturacion_12m = int(df_demand_ventas['venta_real_euros'].sum())
-
-unidades_perdidas_hist = int(df_hist['unidades_perdidas'].sum())
-perdidas_hist_euros = int(df_hist['valor_perdido_euros'].sum())
+unidades_perdidas_hist = int(df_ventana['unidades_perdidas'].sum())
+perdidas_hist_euros = int(df_ventana['perdida_euros'].sum())
 
 tasa_quiebre = (unidades_perdidas_hist / (unidades_perdidas_hist + unidades_vendidas_12m)) * 100 if (unidades_perdidas_hist + unidades_vendidas_12m) > 0 else 0
 
-meses_validos = meses_completos.sort_values().iloc[-3:]
-df_demand_3m = df_demand[df_demand['mes'].isin(meses_validos)]
-demanda_promedio_mensual = int(df_demand_3m.groupby('mes')['demanda'].sum().mean())
+meses_validos = datos_clave[datos_clave['semanas'] >= 4].index[-3:]
+demanda_promedio_mensual = int(datos_clave.loc[meses_validos, 'demanda'].mean())
 
 # ✅ KPIs de compras desde session_state['politicas_inventario'] (Gestión Inventarios)
 politicas_df = st.session_state.get("politicas_inventario", pd.DataFrame())
@@ -137,10 +154,10 @@ kpi_style = """
 """
 
 col1, col2, col3, col4, col9 = st.columns(5)
-col1.markdown(kpi_style.format(label="Stock Actual", value=f"{total_stock:,}"), unsafe_allow_html=True)
+col1.markdown(kpi_style.format(label=f"Stock Actual{marca_escenario}", value=f"{total_stock:,}"), unsafe_allow_html=True)
 col2.markdown(kpi_style.format(label="Unid. Vendidas (12M)", value=f"{unidades_vendidas_12m:,}"), unsafe_allow_html=True)
 col3.markdown(kpi_style.format(label="Facturación (12M)", value=f"€ {facturacion_12m:,}"), unsafe_allow_html=True)
-col4.markdown(kpi_style.format(label="Unid. en Camino", value=f"{unidades_en_camino:,}"), unsafe_allow_html=True)
+col4.markdown(kpi_style.format(label=f"Unid. en Camino{marca_escenario}", value=f"{unidades_en_camino:,}"), unsafe_allow_html=True)
 col9.markdown(kpi_style.format(label="SKUs a Comprar", value=f"{total_skus_comprar:,}"), unsafe_allow_html=True)
 
 st.markdown("<div style='margin-top: 12px;'></div>", unsafe_allow_html=True)
@@ -158,10 +175,7 @@ st.markdown("<div style='margin-top: 30px;'></div>", unsafe_allow_html=True)
 
 
 # --- Gráfico 1: Demanda real vs limpia ---
-df_mensual = df_demand.groupby('mes').agg(
-    demanda=('demanda', 'sum'),
-    demanda_limpia=('demanda_sin_outlier', 'sum')
-).reset_index()
+df_mensual = df_ventana[['demanda', 'demanda_limpia']].rename_axis('mes').reset_index()
 
 fig_demand = go.Figure()
 fig_demand.add_trace(go.Scatter(x=df_mensual['mes'], y=df_mensual['demanda'], name="Demanda Real", mode="lines+markers"))
@@ -178,8 +192,7 @@ fig_demand.update_layout(
 
 # --- Gráfico 2: Demanda histórica vs forecast ---
 df_demanda_hist = df_mensual[df_mensual['mes'] <= ultimo_mes_completo][['mes', 'demanda_limpia']]
-df_forecast['mes'] = pd.to_datetime(df_forecast['mes'])
-df_forecast_mes = df_forecast[df_forecast['mes'] >= mes_siguiente].groupby('mes').agg(forecast=('forecast', 'sum')).reset_index()
+df_forecast_mes = datos_clave.loc[(datos_clave.index >= mes_siguiente) & datos_clave['forecast'].notna(), ['forecast']].rename_axis('mes').reset_index()
 
 df_mix = pd.concat([
     df_demanda_hist.rename(columns={'demanda_limpia': 'valor'}).assign(tipo='Demanda'),
@@ -196,8 +209,7 @@ fig_mix.update_layout(
 )
 
 # --- Gráfico 3: Stock histórico mensual ---
-df_stock_mes = df_stock_hist.groupby('mes')['stock'].sum().reset_index()
-fig_stock = px.line(df_stock_mes, x='mes', y='stock', markers=True)
+fig_stock = px.line(df_stock_mes['stock'].rename_axis('mes').reset_index(), x='mes', y='stock', markers=True)
 fig_stock.update_layout(
     height=420,
     xaxis_title="Mes",
@@ -208,10 +220,22 @@ fig_stock.update_layout(
 )
 
 # --- Gráfico 4: Stock Proyectado vs Pérdida Estimada (€) ---
-df_stock_plot = df_futuro.groupby('mes').agg(
-    stock_final=('stock_final_mes', 'sum'),
-    perdida_euros=('perdida_proyectada_euros', 'sum')
-).reset_index()
+if usar_escenario and sku_select == 'Todos':
+    df_stock_plot = escenario["totales"].reset_index().rename(columns={
+        'stock_final_mes': 'stock_final',
+        'perdida_proyectada_euros': 'perdida_euros'
+    })[['mes', 'stock_final', 'perdida_euros']]
+elif usar_escenario:
+    df_stock_plot = df_futuro.groupby('mes').agg(
+        stock_final=('stock_final_mes', 'sum'),
+        perdida_euros=('perdida_proyectada_euros', 'sum')
+    ).reset_index()
+else:
+    df_stock_plot = datos_clave.loc[datos_clave['stock_proyectado'].notna(), ['stock_proyectado', 'perdida_proyectada_euros']]
+    df_stock_plot = df_stock_plot.rename(columns={
+        'stock_proyectado': 'stock_final',
+        'perdida_proyectada_euros': 'perdida_euros'
+    }).rename_axis('mes').reset_index()
 
 fig_stock_loss = go.Figure()
 fig_stock_loss.add_trace(go.Bar(
@@ -241,7 +265,7 @@ fig_stock_loss.update_layout(
 )
 
 # --- Gráfico 5: Pérdidas Históricas Mensuales (€) ---
-df_perdidas_hist = df_hist.groupby('mes')['valor_perdido_euros'].sum().reset_index()
+df_perdidas_hist = df_ventana['perdida_euros'].rename('valor_perdido_euros').rename_axis('mes').reset_index()
 fig_perdidas_hist = px.bar(df_perdidas_hist, x='mes', y='valor_perdido_euros', labels={'mes': 'Mes', 'valor_perdido_euros': '€ Pérdidos'})
 fig_perdidas_hist.update_layout(
     height=420,
@@ -284,9 +308,9 @@ with colg3:
 
 with colg4:
     with st.container():
-        st.markdown("""
+        st.markdown(f"""
             <div class="titulo-con-fondo">
-                📦 Stock Proyectado vs Pérdida Estimada (€)
+                📦 Stock Proyectado vs Pérdida Estimada (€){marca_escenario}
             </div>
         """, unsafe_allow_html=True)
         st.plotly_chart(fig_stock_loss, use_container_width=True)
@@ -300,32 +324,10 @@ with st.container():
     st.plotly_chart(fig_perdidas_hist, use_container_width=True)
 
 
-# --- Rankings corregidos --- 
-df_demand_ventas['mes'] = pd.to_datetime(df_demand_ventas['fecha']).dt.to_period('M').dt.to_timestamp()
-df_demand_ventas_mensual = df_demand_ventas.groupby(['sku', 'mes']).agg(
-    demanda=('demanda', 'sum'),
-    pxq=('venta_real_euros', 'sum')
-).reset_index()
-
-# Agrupación para rankings
-df_top = df_demand_ventas_mensual.groupby('sku').agg(
-    demanda_mensual=('demanda', 'mean'),
-    pxq=('pxq', 'sum')
-).reset_index()
-
-# Pérdidas por SKU
-perdidas_por_sku = df_hist.groupby('sku').agg(
-    unidades_perdidas=('unidades_perdidas', 'sum'),
-    perdida_euros=('valor_perdido_euros', 'sum')
-).reset_index()
-
-# Rankings finales
-df_rank_loss = perdidas_por_sku.merge(df_top[['sku', 'demanda_mensual']], on='sku', how='left')
-df_rank_loss = df_rank_loss.sort_values(by='perdida_euros', ascending=False).head(10).reset_index(drop=True)
-df_rank_loss.insert(0, 'Ranking', range(1, len(df_rank_loss) + 1))
-
-df_rank_sales = df_top.sort_values(by='pxq', ascending=False).head(10).reset_index(drop=True)
-df_rank_sales.insert(0, 'Ranking', range(1, len(df_rank_sales) + 1))
+# --- Rankings (precalculados en el cubo para 'Todos') ---
+rankings = cubo["rankings"] if clave == TODOS else calcular_rankings(cubo, clave)
+df_rank_loss = rankings["perdidas"]
+df_rank_sales = rankings["ventas"]
 
 # --- Mostrar tablas con estilo limpio y títulos corregidos ---
 colA, colB = st.columns(2)
@@ -378,8 +380,8 @@ with col_btn1:
 
 with col_btn2:
     st.download_button(
-        label="📄 Descargar Proyección Futura",
-        data=df_futuro.to_csv(index=False).encode('utf-8'),
+        label=f"📄 Descargar Proyección Futura{marca_escenario}",
+        data=(proyeccion_escenario(escenario) if usar_escenario and sku_select == 'Todos' else df_futuro).to_csv(index=False).encode('utf-8'),
         file_name="proyeccion_futura.csv",
         mime="text/csv",
         key="btn_descarga_fut"
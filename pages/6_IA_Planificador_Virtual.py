@@ -2,9 +2,11 @@ import streamlit as st
 import pandas as pd
 import os
 from utils.render_logo_sidebar import render_logo_sidebar
-from openai import OpenAI
 from modules.resumen_utils import generar_contexto_negocio
 from modules.ia_utils import responder_general
+from modules.contexto_llm import construir_contexto_pregunta, detectar_skus, obtener_indice_skus, mensajes_llm
+from modules.busqueda_skus import obtener_indice_busqueda
+from modules.cliente_llm import crear_cliente_llm, clave_cache, transmitir_respuesta
 
 # --- Configuración general ---
 st.set_page_config(page_title="Planificador Virtual", layout="wide")
@@ -17,8 +19,20 @@ def load_css():
 load_css()
 
 # --- Cliente OpenAI actualizado ---
-client = OpenAI(api_key=st.secrets["openai"]["api_key"])
 MODELO_OPENAI = "gpt-3.5-turbo"  # Cambiar a "gpt-4" si lo necesitas
+PRESUPUESTO_TOKENS_CONTEXTO = 1500  # Tokens máximos del contexto enviado en cada pregunta
+
+def api_key_openai():
+    try:
+        return st.secrets["openai"]["api_key"]
+    except (KeyError, FileNotFoundError, st.errors.StreamlitSecretNotFoundError):
+        return None
+
+def obtener_cliente():
+    # Un cliente ya presente en la sesión (p. ej. un stub local de chat completions) reemplaza al del entorno
+    if "cliente_llm" not in st.session_state:
+        st.session_state["cliente_llm"] = crear_cliente_llm(api_key_openai())
+    return st.session_state["cliente_llm"]
 
 # --- Cargar desde disco si no está en session_state ---
 def cargar_si_existe(clave, ruta, tipo='csv'):
@@ -66,11 +80,15 @@ except Exception as e:
 
 # --- Mostrar contexto ---
 with st.expander("📄 Ver resumen del contexto cargado", expanded=False):
-    st.code(st.session_state["contexto_negocio"], language="markdown")
+    st.dataframe(df_context, use_container_width=True)
+    if st.session_state.get("contexto_ultima_pregunta"):
+        st.markdown("**Contexto enviado en la última pregunta:**")
+        st.code(st.session_state["contexto_ultima_pregunta"], language="markdown")
 
 # --- Inicializar historial de chat ---
+# El mensaje de sistema se arma en cada pregunta sólo con las filas relevantes del contexto
 if "chat_history" not in st.session_state:
-    st.session_state.chat_history = [{"role": "system", "content": st.session_state["contexto_negocio"]}]
+    st.session_state.chat_history = [{"role": "system", "content": ""}]
 
 for msg in st.session_state.chat_history[1:]:
     if msg["role"] == "user":
@@ -140,16 +158,10 @@ if user_input:
     st.session_state.chat_history.append({"role": "user", "content": user_input})
     st.chat_message("user").write(user_input)
 
-    sku_detectado = None
-    posibles_skus = df_context["SKU"].astype(str).str.upper().tolist()
-    mensaje = user_input.upper().replace("-", "").replace(",", "").replace(":", "")
-    for sku in posibles_skus:
-        if sku.replace("-", "") in mensaje:
-            sku_detectado = sku
-            break
-
-    st.session_state.chat_history[0] = {"role": "system", "content": st.session_state["contexto_negocio"]}
+    skus_detectados = detectar_skus(user_input, obtener_indice_skus(df_context))
+    sku_detectado = skus_detectados[0] if skus_detectados else None
 
+    respuesta_mostrada = False
     if sku_detectado:
         respuesta = responder_con_sku(sku_detectado, user_input)
     else:
@@ -166,20 +178,33 @@ if user_input:
                     elif entrada in cierre_basico:
                         respuesta = "✨ Con gusto! 😊"
                     else:
-                        response = client.chat.completions.create(
-                            model=MODELO_OPENAI,
-                            messages=st.session_state.chat_history[-20:]
+                        contexto, _ = construir_contexto_pregunta(
+                            user_input, df_context, contexto_general,
+                            df_maestro=st.session_state.get("maestro"),
+                            presupuesto_tokens=PRESUPUESTO_TOKENS_CONTEXTO,
+                            skus_detectados=skus_detectados,
+                            indice_busqueda=obtener_indice_busqueda(df_context, st.session_state.get("maestro"))
                         )
-                        respuesta = response.choices[0].message.content
+                        st.session_state["contexto_ultima_pregunta"] = contexto
+                        st.session_state.chat_history[0] = {"role": "system", "content": contexto}
+                        historial = st.session_state.chat_history
+                        # La respuesta se muestra a medida que llega; las preguntas repetidas salen del caché en disco
+                        respuesta = st.chat_message("assistant").write_stream(transmitir_respuesta(
+                            obtener_cliente(), MODELO_OPENAI, mensajes_llm(contexto, historial),
+                            clave=clave_cache(MODELO_OPENAI, contexto, historial)
+                        ))
+                        respuesta_mostrada = True
                 except Exception as e:
                     respuesta = f"❌ Error inesperado: {str(e)}"
 
     st.session_state.chat_history.append({"role": "assistant", "content": respuesta})
-    st.chat_message("assistant").write(respuesta)
+    if not respuesta_mostrada:
+        st.chat_message("assistant").write(respuesta)
 
 # --- Reiniciar conversación ---
 st.markdown("<hr style='margin-top: 30px;'>", unsafe_allow_html=True)
 if st.button("🔄 Reiniciar conversación"):
     st.session_state.pop("chat_history", None)
     st.session_state.pop("ultimo_sku_utilizado", None)
+    st.session_state.pop("contexto_ultima_pregunta", None)
     st.rerun()
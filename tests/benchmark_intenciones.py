@@ -0,0 +1,43 @@
+"""
+Benchmark del enrutamiento de intenciones del chat (no es un test: pytest no lo recolecta).
+
+Compara detectar_intenciones (un autómata de Aho-Corasick con todas las palabras de INTENCIONES)
+con la evaluación directa de cada lista de palabras sobre el texto, con las mismas preguntas.
+
+    python tests/benchmark_intenciones.py [n_preguntas]
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules.ia_utils import INTENCIONES, detectar_intenciones  # noqa: E402
+from test_intenciones import detectar_referencia  # noqa: E402
+
+RELLENO = ["me puedes decir", "por favor", "del último mes", "para el sku AC-BRY-2", "hola", "gracias",
+           "en la tienda", "de este año", "comparado con el anterior", "rápido"]
+
+
+def generar_preguntas(n, semilla=0):
+    azar = random.Random(semilla)
+    palabras = [p for _, requeridas, excluyentes in INTENCIONES for lista in requeridas + [excluyentes] for p in lista]
+    preguntas = []
+    for _ in range(n):
+        partes = azar.sample(RELLENO, 3) + azar.sample(palabras, azar.randint(0, 3))
+        azar.shuffle(partes)
+        preguntas.append("¿" + " ".join(partes).capitalize() + "?")
+    return preguntas
+
+
+def main(n=20_000):
+    preguntas = generar_preguntas(n)
+    distintas = sum(detectar_intenciones(p) != detectar_referencia(p) for p in preguntas)
+    print(f"{n} preguntas, resultados distintos: {distintas}")
+    for nombre, funcion in [("automata", detectar_intenciones), ("directa", detectar_referencia)]:
+        mejor = min(timeit.repeat(lambda: [funcion(p) for p in preguntas], number=1, repeat=5))
+        print(f"{nombre:>9}: {mejor / n * 1e6:6.1f} us/pregunta")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Los tests importan los paquetes de la app (modules/, utils/) y leen tablas/ desde la raíz del repo
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
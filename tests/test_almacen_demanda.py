@@ -0,0 +1,105 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import modules.almacen_demanda as almacen_demanda
+from modules.esquemas import leer_csv
+from modules.demand_cleaner import clean_demand
+from modules.panel_mensual import construir_panel_mensual
+from modules.forecast_engine import forecast_engine, generar_comparativa_forecasts
+from modules.resumen_utils import consolidar_historico_stock
+from utils.init_session import procesar_demanda_particionada
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEMANDA = os.path.join(RAIZ, "tablas", "demanda_filtrada_final.csv")
+STOCK = os.path.join(RAIZ, "tablas", "stock_historico_formateado.csv")
+MAESTRO = os.path.join(RAIZ, "tablas", "maestro_formateado_final_corregido.csv")
+
+
+@pytest.fixture
+def csv_demanda(tmp_path):
+    """Recorte de la demanda de muestra (6 SKUs) para que el forecast corra en pocos segundos."""
+    df = pd.read_csv(DEMANDA)
+    df = df[df["sku"].isin(df["sku"].drop_duplicates().head(6))]
+    ruta = tmp_path / "demanda.csv"
+    df.to_csv(ruta, index=False)
+    return str(ruta)
+
+
+def test_duplicados_entre_bloques_conserva_la_ultima_fila(tmp_path):
+    ruta = tmp_path / "dup.csv"
+    ruta.write_text("sku,fecha,demanda\nA,2024-01-01,1\nB,2024-01-01,2\nA,2024-01-08,3\nA,2024-01-01,9\n")
+    indice = almacen_demanda.ingerir_demanda(str(ruta), str(tmp_path / "alm"), tamano_bloque=2, n_particiones=3)
+    assert indice["filas_leidas"] == 4 and indice["filas"] == 3
+    df = almacen_demanda.leer_sku(str(tmp_path / "alm"), "A")
+    assert df["demanda"].tolist() == [9, 3]
+
+
+def test_publicacion_cambia_el_puntero_y_borra_la_version_anterior(tmp_path, csv_demanda):
+    carpeta = str(tmp_path / "alm")
+    almacen_demanda.ingerir_demanda(csv_demanda, carpeta, n_particiones=4)
+    anterior = almacen_demanda._version_actual(carpeta)
+    almacen_demanda.ingerir_demanda(csv_demanda, carpeta, n_particiones=4)
+    actual = almacen_demanda._version_actual(carpeta)
+    assert actual != anterior and not os.path.exists(anterior)
+    with open(os.path.join(carpeta, almacen_demanda.ARCHIVO_ACTUAL)) as f:
+        assert os.path.join(carpeta, json.load(f)["version"]) == actual
+
+
+def test_ingesta_fallida_deja_la_version_vigente(tmp_path, csv_demanda):
+    carpeta = str(tmp_path / "alm")
+    almacen_demanda.ingerir_demanda(csv_demanda, carpeta, n_particiones=4)
+    vigente = almacen_demanda._version_actual(carpeta)
+    malo = tmp_path / "malo.csv"
+    malo.write_text("sku,demanda\nA,1\n")
+    with pytest.raises(ValueError):
+        almacen_demanda.ingerir_demanda(str(malo), carpeta, n_particiones=4)
+    assert almacen_demanda._version_actual(carpeta) == vigente
+    assert [n for n in os.listdir(carpeta) if n.startswith("v_")] == [os.path.basename(vigente)]
+    assert almacen_demanda.almacen_vigente(carpeta, csv_demanda)
+
+
+def test_pipeline_por_particion_igual_al_de_memoria(tmp_path, csv_demanda):
+    stock = leer_csv(STOCK, "stock_historico")
+    limpia = clean_demand(leer_csv(csv_demanda, "demanda_cruda"))
+    panel = construir_panel_mensual(limpia, stock)
+
+    carpeta = str(tmp_path / "alm")
+    almacen_demanda.ingerir_demanda(csv_demanda, carpeta, tamano_bloque=500, n_particiones=4)
+    resultado = procesar_demanda_particionada(carpeta, stock)
+
+    # El panel del almacén siempre trae el SKU categórico; en memoria depende de los tipos de entrada
+    pd.testing.assert_frame_equal(resultado["panel_mensual"].astype({"sku": str}), panel.astype({"sku": str}))
+    pd.testing.assert_frame_equal(resultado["forecast"], forecast_engine(limpia, panel=panel))
+    pd.testing.assert_frame_equal(resultado["forecast_comparativa"],
+                                  generar_comparativa_forecasts(limpia, horizonte_meses=6, panel=panel))
+    totales = resultado["demanda_semanal_total"]
+    assert totales["demanda"].sum() == limpia["demanda"].sum()
+    assert len(totales) == limpia["fecha"].nunique()
+
+    # Segunda pasada: reutiliza el almacén limpio ya publicado y da lo mismo
+    otra = procesar_demanda_particionada(carpeta, stock)
+    assert otra["almacen_demanda_limpia"] == resultado["almacen_demanda_limpia"]
+    pd.testing.assert_frame_equal(otra["forecast"], resultado["forecast"])
+
+
+def test_carga_particionada_llega_al_resumen_historico(tmp_path, csv_demanda):
+    # El panel del almacén trae el SKU categórico: el resumen histórico debe valorizar igual que en memoria
+    limpia = clean_demand(leer_csv(csv_demanda, "demanda_cruda"))
+    # Todos los SKUs del panel en el maestro y con precios distintos: así el map de precios
+    # sobre el SKU categórico devuelve otra categoría
+    stock = leer_csv(STOCK, "stock_historico")
+    stock = stock[stock["sku"].isin(limpia["sku"])]
+    maestro = leer_csv(MAESTRO, "maestro")
+    maestro["precio_venta"] += np.arange(len(maestro)) / 100
+
+    carpeta = str(tmp_path / "alm")
+    almacen_demanda.ingerir_demanda(csv_demanda, carpeta, tamano_bloque=500, n_particiones=4)
+    panel = procesar_demanda_particionada(carpeta, stock)["panel_mensual"]
+    assert isinstance(panel["sku"].dtype, pd.CategoricalDtype)
+
+    resumen = consolidar_historico_stock(None, maestro, panel)
+    esperado = consolidar_historico_stock(limpia, maestro, construir_panel_mensual(limpia, stock))
+    assert resumen["valor_perdido_euros"].notna().all() and resumen["valor_perdido_euros"].sum() > 0
+    pd.testing.assert_frame_equal(resumen.astype({"sku": str}), esperado.astype({"sku": str}))
@@ -0,0 +1,91 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+import pytest
+import streamlit as st
+import modules.busqueda_skus as busqueda_skus
+from modules.busqueda_skus import buscar_skus, construir_indice_busqueda
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAESTRO = os.path.join(RAIZ, "tablas", "maestro_formateado_final_corregido.csv")
+N_SKUS = 10_000
+
+
+@pytest.fixture(scope="module")
+def catalogo():
+    """Catálogo de 10k SKUs: el maestro de muestra repetido con sufijos, y una fila de contexto por SKU."""
+    base = pd.read_csv(MAESTRO).drop_duplicates("sku")
+    copias = -(-N_SKUS // len(base))
+    maestro = pd.concat([base.assign(sku=base["sku"] + (f"-{i}" if i else "")) for i in range(copias)])
+    maestro = maestro.head(N_SKUS).reset_index(drop=True)
+    azar = np.random.default_rng(0)
+    contexto = pd.DataFrame({
+        "SKU": maestro["sku"],
+        "Unidades a Comprar": azar.choice([0, 0, 0, 50], N_SKUS),
+        "Unidades Perdidas": azar.choice([0, 0, 10], N_SKUS),
+        "Unidades en Camino": 0,
+        "Stock Proyectado": azar.integers(1, 100, N_SKUS),
+    })
+    return contexto, maestro
+
+
+@pytest.fixture(scope="module")
+def indice(catalogo):
+    return construir_indice_busqueda(*catalogo)
+
+
+def _filas(catalogo, resultados):
+    contexto, maestro = catalogo
+    skus = [sku for sku, _ in resultados]
+    return maestro.set_index("sku").loc[skus], contexto.set_index("SKU").loc[skus]
+
+
+def test_busqueda_por_descripcion(catalogo, indice):
+    resultados = buscar_skus(indice, "arneses trail smiley", top_k=10)
+    maestro, _ = _filas(catalogo, resultados)
+    assert len(resultados) == 10
+    assert maestro["descripcion"].str.upper().str.contains("TRAIL SMILEY").all()
+
+
+def test_busqueda_por_codigo_sin_guiones(catalogo, indice):
+    sku, _ = buscar_skus(indice, "atsml3", top_k=1)[0]
+    assert sku == "AT-SML-3"
+
+
+def test_busqueda_por_estado_del_contexto(catalogo, indice):
+    resultados = buscar_skus(indice, "correas purple que hay que comprar", top_k=5)
+    maestro, contexto = _filas(catalogo, resultados)
+    assert (maestro["categoria"] == "CORREA").all()
+    assert maestro["descripcion"].str.upper().str.contains("PURPLE").all()
+    assert (contexto["Unidades a Comprar"] > 0).all()
+
+
+def test_latencia_con_10k_skus(catalogo):
+    # Cotas holgadas sobre lo medido (~0,5 s de construcción y 0,1-0,2 ms por consulta) para máquinas lentas
+    inicio = time.perf_counter()
+    indice = construir_indice_busqueda(*catalogo)
+    assert time.perf_counter() - inicio < 5
+    consultas = ["arnes trail smiley", "correa purple", "sin stock", "arnés clásico gummy m", "reponer pvc blue"]
+    tiempos = []
+    for _ in range(20):
+        for consulta in consultas:
+            inicio = time.perf_counter()
+            buscar_skus(indice, consulta)
+            tiempos.append(time.perf_counter() - inicio)
+    assert np.median(tiempos) < 0.002
+
+
+def test_indice_de_sesion_se_reconstruye_con_otra_tabla(monkeypatch):
+    st.session_state.clear()
+    construcciones = []
+    construir = busqueda_skus.construir_indice_busqueda
+    monkeypatch.setattr(busqueda_skus, "construir_indice_busqueda", lambda *a: construcciones.append(1) or construir(*a))
+    contexto = pd.DataFrame({"SKU": ["AT-SML-3"]})
+    busqueda_skus.obtener_indice_busqueda(contexto)
+    busqueda_skus.obtener_indice_busqueda(contexto)
+    assert len(construcciones) == 1
+    indice = busqueda_skus.obtener_indice_busqueda(pd.DataFrame({"SKU": ["CR-PRP-4"]}))
+    assert [sku for sku, _ in buscar_skus(indice, "CR-PRP-4")] == ["CR-PRP-4"]
+    assert len(construcciones) == 2
+    st.session_state.clear()
@@ -0,0 +1,48 @@
+import io
+import os
+import pytest
+import streamlit as st
+import utils.cache_entradas as cache_entradas
+
+CSV_DEMANDA = b"sku,fecha,demanda\nA1,2024-01-01,3\nA2,2024-02-01,5\n"
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_entradas, "CARPETA_CACHE", str(tmp_path))
+    monkeypatch.setattr(cache_entradas, "RUTA_MANIFIESTO", str(tmp_path / "manifiesto.json"))
+    st.session_state.clear()
+    yield tmp_path
+    st.session_state.clear()
+
+
+def test_subida_repetida_no_se_vuelve_a_parsear(cache, monkeypatch):
+    lecturas = []
+    leer_csv = cache_entradas.leer_csv
+    monkeypatch.setattr(cache_entradas, "leer_csv", lambda *a: lecturas.append(a) or leer_csv(*a))
+    archivo = io.BytesIO(CSV_DEMANDA)
+    assert cache_entradas.cargar_entrada("demanda_cruda", archivo) == "subido"
+    assert cache_entradas.cargar_entrada("demanda_cruda", archivo) == "subido"
+    assert len(lecturas) == 1
+    assert len(st.session_state["demanda_cruda"]) == 2
+
+
+def test_sesion_nueva_lee_desde_el_cache(cache):
+    cache_entradas.cargar_entrada("demanda_cruda", io.BytesIO(CSV_DEMANDA))
+    st.session_state.clear()
+    assert cache_entradas.cargar_entrada("demanda_cruda") == "cache"
+    assert st.session_state["demanda_cruda"]["demanda"].tolist() == [3, 5]
+
+
+def test_archivo_de_cache_borrado_se_reconstruye_desde_la_subida(cache):
+    archivo = io.BytesIO(CSV_DEMANDA)
+    cache_entradas.cargar_entrada("demanda_cruda", archivo)
+    os.remove(cache_entradas.leer_manifiesto()["demanda_cruda"]["archivo"])
+    st.session_state.clear()
+    assert cache_entradas.cargar_entrada("demanda_cruda", archivo) == "subido"
+    assert os.path.exists(cache_entradas.leer_manifiesto()["demanda_cruda"]["archivo"])
+    assert len(st.session_state["demanda_cruda"]) == 2
+
+
+def test_sin_datos_retorna_none(cache):
+    assert cache_entradas.cargar_entrada("maestro") is None
@@ -0,0 +1,54 @@
+import pytest
+from modules.cliente_llm import ClienteLLMFalso, clave_cache, crear_cliente_llm, transmitir_respuesta
+from modules.contexto_llm import mensajes_llm
+
+MODELO = "modelo-prueba"
+
+
+@pytest.fixture(autouse=True)
+def cache_temporal(tmp_path, monkeypatch):
+    monkeypatch.setenv("PLANITY_LLM_CACHE_DIR", str(tmp_path))
+
+
+def historial(pregunta):
+    return [{"role": "system", "content": "anterior"}, {"role": "user", "content": pregunta}]
+
+
+def test_backend_falso_por_entorno(monkeypatch):
+    monkeypatch.setenv("PLANITY_LLM_BACKEND", "falso")
+    assert isinstance(crear_cliente_llm(), ClienteLLMFalso)
+
+
+def test_transmite_la_respuesta_por_trozos_con_el_contexto_como_sistema():
+    cliente = ClienteLLMFalso()
+    mensajes = mensajes_llm("línea 1\nlínea 2", historial("¿Stock de AC-BRY-2?"))
+    trozos = list(transmitir_respuesta(cliente, MODELO, mensajes))
+
+    assert len(trozos) > 1
+    assert "".join(trozos) == (f"🤖 Respuesta local ({MODELO}) a: «¿Stock de AC-BRY-2?». "
+                               "Contexto recibido: 2 líneas.")
+    # El mensaje de sistema del historial se reemplaza por el contexto seleccionado
+    enviados = cliente.llamadas[0]["messages"]
+    assert [m["role"] for m in enviados] == ["system", "user"]
+    assert enviados[0]["content"] == "línea 1\nlínea 2"
+    assert cliente.llamadas[0]["stream"] is True
+
+
+def test_pregunta_repetida_sale_del_cache_sin_llamar_al_modelo():
+    cliente = ClienteLLMFalso()
+    contexto = "contexto"
+    clave = clave_cache(MODELO, contexto, historial("¿Qué SKUs reponer?"))
+    primera = "".join(transmitir_respuesta(cliente, MODELO, mensajes_llm(contexto, historial("¿Qué SKUs reponer?")), clave))
+
+    # Misma pregunta con otros espacios y mayúsculas: misma clave
+    otra_clave = clave_cache(MODELO, contexto, historial("  ¿qué SKUs   reponer? "))
+    assert otra_clave == clave
+    segunda = list(transmitir_respuesta(cliente, MODELO, mensajes_llm(contexto, historial("¿qué SKUs reponer?")), otra_clave))
+    assert segunda == [primera]
+    assert len(cliente.llamadas) == 1
+
+    # Otro contexto: otra clave y nueva llamada
+    clave_nueva = clave_cache(MODELO, "otro contexto", historial("¿Qué SKUs reponer?"))
+    assert clave_nueva != clave
+    list(transmitir_respuesta(cliente, MODELO, mensajes_llm("otro contexto", historial("¿Qué SKUs reponer?")), clave_nueva))
+    assert len(cliente.llamadas) == 2
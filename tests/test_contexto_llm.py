@@ -0,0 +1,93 @@
+import pandas as pd
+import pytest
+import streamlit as st
+import modules.contexto_llm as contexto_llm
+
+
+@pytest.fixture
+def sesion():
+    st.session_state.clear()
+    yield st.session_state
+    st.session_state.clear()
+
+
+def tabla_contexto(skus):
+    return pd.DataFrame({"SKU": skus})
+
+
+def test_indice_de_skus_se_reutiliza_con_la_misma_tabla(sesion, monkeypatch):
+    construcciones = []
+    construir = contexto_llm.construir_indice_skus
+    monkeypatch.setattr(contexto_llm, "construir_indice_skus", lambda skus: construcciones.append(1) or construir(skus))
+    df = tabla_contexto(["AC-BRY-2"])
+    assert contexto_llm.obtener_indice_skus(df) is contexto_llm.obtener_indice_skus(df)
+    assert len(construcciones) == 1
+
+
+def test_indice_de_skus_se_reconstruye_con_otra_tabla(sesion):
+    contexto_llm.obtener_indice_skus(tabla_contexto(["AC-BRY-2"]))
+    # La tabla anterior ya no existe: aunque la nueva reutilice su id(), el índice se reconstruye
+    indice = contexto_llm.obtener_indice_skus(tabla_contexto(["RC-UNC-3"]))
+    assert contexto_llm.detectar_skus("stock de RC-UNC-3", indice) == ["RC-UNC-3"]
+    assert contexto_llm.detectar_skus("stock de AC-BRY-2", indice) == []
+
+
+# --- construir_contexto_pregunta: presupuesto, prioridad y duplicados ---
+def contexto_completo(n=30):
+    skus = [f"SKU-{i:03d}" for i in range(n)]
+    df = pd.DataFrame({columna: [float(i) for i in range(n)] for columna in contexto_llm.COLUMNAS_CONTEXTO[1:]})
+    df.insert(0, "SKU", skus)
+    # Pérdida creciente con el número de SKU: el ranking por pérdida empieza por el último
+    maestro = pd.DataFrame({"sku": skus, "categoria": ["Camisas" if i < 5 else "Pantalones" for i in range(n)]})
+    return df, maestro
+
+
+GENERAL = {"Unidades en stock": 1200, "Detalle": [1, 2]}
+
+
+def test_contexto_respeta_el_presupuesto_de_tokens():
+    df, maestro = contexto_completo()
+    for presupuesto in [80, 200, 400, 1500]:
+        texto, incluidos = contexto_llm.construir_contexto_pregunta(
+            "¿qué debo comprar?", df, GENERAL, maestro, presupuesto_tokens=presupuesto)
+        assert contexto_llm.estimar_tokens(texto) <= presupuesto
+        assert texto.startswith("Eres un asistente") and "Unidades en stock: 1,200" in texto
+        assert "Detalle" not in texto
+        assert all(sku in texto for sku in incluidos)
+    pequeno = contexto_llm.construir_contexto_pregunta("¿qué debo comprar?", df, GENERAL, maestro, presupuesto_tokens=200)[1]
+    grande = contexto_llm.construir_contexto_pregunta("¿qué debo comprar?", df, GENERAL, maestro, presupuesto_tokens=1500)[1]
+    # Un presupuesto mayor agrega SKUs al final sin cambiar el orden de los primeros
+    assert len(pequeno) < len(grande) and grande[:len(pequeno)] == pequeno
+
+
+def test_presupuesto_minimo_deja_solo_el_resumen_general():
+    df, maestro = contexto_completo()
+    texto, incluidos = contexto_llm.construir_contexto_pregunta("SKU-003", df, GENERAL, maestro, presupuesto_tokens=1)
+    assert incluidos == [] and "Resumen general del negocio" in texto
+
+
+def test_contexto_prioriza_mencionados_categoria_y_ranking():
+    df, maestro = contexto_completo()
+    texto, incluidos = contexto_llm.construir_contexto_pregunta(
+        "compara SKU-020 con las camisas", df, GENERAL, maestro, top_k=3, skus_detectados=["SKU-020"])
+    # Mencionado, luego la categoría por pérdida descendente, luego los rankings por defecto (pérdida y compras)
+    assert incluidos == ["SKU-020", "SKU-004", "SKU-003", "SKU-002", "SKU-001", "SKU-000", "SKU-029", "SKU-028", "SKU-027"]
+    assert texto.index("SKUs mencionados") < texto.index("SKUs de Camisas") < texto.index("Top 3")
+    # El ranking de compras repite los SKUs del de pérdida: sin SKUs nuevos no se agrega su título
+    assert "Top 3 SKUs con mayor pérdida histórica" in texto
+    assert "Top 3 SKUs con más unidades a comprar" not in texto
+
+
+def test_contexto_incluye_cada_sku_una_sola_vez():
+    df, maestro = contexto_completo()
+    df = pd.concat([df, df.tail(2)], ignore_index=True)
+    texto, incluidos = contexto_llm.construir_contexto_pregunta(
+        "pérdida de SKU-029 y SKU-029", df, GENERAL, maestro, top_k=5, skus_detectados=["SKU-029", "SKU-029"])
+    assert incluidos == ["SKU-029", "SKU-028", "SKU-027", "SKU-026", "SKU-025"]
+    assert texto.count("SKU-029 |") == 1
+
+
+def test_contexto_detecta_los_skus_si_no_se_entregan():
+    df, maestro = contexto_completo()
+    _, incluidos = contexto_llm.construir_contexto_pregunta("stock de sku007", df, GENERAL, maestro, top_k=1)
+    assert incluidos[0] == "SKU-007"
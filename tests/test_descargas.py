@@ -0,0 +1,63 @@
+import http.server
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from utils.descargas import descargar_archivo
+
+
+class _Servidor(http.server.BaseHTTPRequestHandler):
+    """Servidor de un solo archivo, sin ETag (como algunas respuestas de Drive)."""
+    contenido = b""
+    pedidos = []
+
+    def _responder(self, cuerpo):
+        type(self).pedidos.append(self.command)
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(type(self).contenido)))
+        self.end_headers()
+        if cuerpo:
+            self.wfile.write(type(self).contenido)
+
+    def do_GET(self):
+        self._responder(True)
+
+    def do_HEAD(self):
+        self._responder(False)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def servidor():
+    _Servidor.contenido = b"sku,fecha,demanda\nA1,2024-01-01,3\n"
+    _Servidor.pedidos = []
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Servidor)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/demanda.csv"
+    httpd.shutdown()
+
+
+def test_copia_sin_etag_se_valida_con_el_servidor(servidor, tmp_path):
+    ruta = str(tmp_path / "demanda.csv")
+    descargar_archivo(servidor, ruta)
+    descargar_archivo(servidor, ruta)
+    assert _Servidor.pedidos == ["GET", "HEAD"]
+
+    # Datos actualizados en el servidor: la copia local se reemplaza
+    _Servidor.contenido += b"A2,2024-01-01,7\n"
+    descargar_archivo(servidor, ruta)
+    assert _Servidor.pedidos[-2:] == ["HEAD", "GET"]
+    with open(ruta, "rb") as f:
+        assert f.read() == _Servidor.contenido
+
+
+def test_descargas_concurrentes_del_mismo_archivo(servidor, tmp_path):
+    _Servidor.contenido = b"x" * 3_000_000
+    ruta = str(tmp_path / "grande.csv")
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        list(pool.map(lambda _: descargar_archivo(servidor, ruta), range(6)))
+    assert os.path.getsize(ruta) == len(_Servidor.contenido)
+    assert _Servidor.pedidos.count("GET") == 1
+    assert not os.path.exists(ruta + ".part")
@@ -0,0 +1,76 @@
+import pandas as pd
+from modules.escenarios import (
+    aplicar_override,
+    clave_escenario,
+    crear_escenario,
+    entradas_escenario,
+    quitar_overrides
+)
+from modules.resumen_utils import consolidar_proyeccion_futura
+from modules.stock_projector import simular_stock_montecarlo
+
+MESES = pd.date_range("2025-01-01", periods=4, freq="MS")
+
+
+def datos():
+    forecast = pd.DataFrame({
+        "sku": ["A"] * 4 + ["B"] * 4,
+        "mes": list(MESES) * 2,
+        "forecast": [10, 12, 8, 9, 5, 5, 5, 5],
+        "tipo_mes": "proyección",
+    })
+    # Sin margen de error: la simulación Monte Carlo coincide con la proyección determinista
+    forecast["forecast_up"] = forecast["forecast"]
+    stock = pd.DataFrame({"sku": ["A", "B"], "stock": [15, 7], "fecha": [MESES[0], MESES[0]]})
+    repos = pd.DataFrame({"sku": ["A", "B"], "fecha": [MESES[1], MESES[2]], "cantidad": [20, 4]})
+    maestro = pd.DataFrame({"sku": ["A", "B"], "precio_venta": [2.0, 3.0], "categoria": ["X", "Y"]})
+    return forecast, stock, repos, maestro
+
+
+def test_sin_overrides_las_entradas_son_las_de_la_sesion():
+    forecast, stock, repos, maestro = datos()
+    escenario = crear_escenario(consolidar_proyeccion_futura(forecast, stock, repos, maestro))
+    entradas = entradas_escenario(escenario, forecast, stock, repos)
+    assert all(a is b for a, b in zip(entradas, (forecast, stock, repos)))
+
+
+def test_montecarlo_con_las_entradas_del_escenario_sigue_los_overrides():
+    forecast, stock, repos, maestro = datos()
+    escenario = crear_escenario(consolidar_proyeccion_futura(forecast, stock, repos, maestro))
+    aplicar_override(escenario, "A", forecast, stock, repos, maestro,
+                     forecast={MESES[2]: 30}, reposiciones={MESES[1]: 0}, stock_inicial=40)
+
+    df_mc = simular_stock_montecarlo(*entradas_escenario(escenario, forecast, stock, repos), maestro,
+                                     n_escenarios=20, semilla=1)
+    for sku in ["A", "B"]:
+        esperado = escenario["por_sku"][sku]
+        obtenido = df_mc[df_mc["sku"] == sku]
+        assert obtenido["forecast"].tolist() == esperado["forecast"].tolist()
+        assert obtenido["repos_aplicadas"].tolist() == esperado["repos_aplicadas"].tolist()
+        assert obtenido["stock_p50"].tolist() == esperado["stock_final_mes"].tolist()
+    assert df_mc.loc[df_mc["sku"] == "A", "forecast"].tolist() == [10, 12, 30, 9]
+
+
+def test_override_de_forecast_conserva_el_margen_de_error():
+    forecast, stock, repos, maestro = datos()
+    forecast["forecast_up"] = forecast["forecast"] + 3
+    escenario = crear_escenario(consolidar_proyeccion_futura(forecast, stock, repos, maestro))
+    aplicar_override(escenario, "A", forecast, stock, repos, maestro, forecast={MESES[0]: 50})
+    forecast_esc, _, _ = entradas_escenario(escenario, forecast, stock, repos)
+    fila = forecast_esc[(forecast_esc["sku"] == "A") & (forecast_esc["mes"] == MESES[0])].iloc[0]
+    assert (fila["forecast"], fila["forecast_up"]) == (50, 53)
+
+
+def test_clave_del_escenario_cambia_con_los_overrides():
+    forecast, stock, repos, maestro = datos()
+    escenario = crear_escenario(consolidar_proyeccion_futura(forecast, stock, repos, maestro))
+    escenario["huella_base"] = "base"
+    base = clave_escenario(escenario)
+    aplicar_override(escenario, "A", forecast, stock, repos, maestro, stock_inicial=40)
+    con_stock = clave_escenario(escenario)
+    aplicar_override(escenario, "A", forecast, stock, repos, maestro, forecast={MESES[0]: 1})
+    assert len({base, con_stock, clave_escenario(escenario)}) == 3
+    quitar_overrides(escenario, "A", forecast, stock, repos, maestro)
+    assert clave_escenario(escenario) == base
+    escenario["huella_base"] = "otra"
+    assert clave_escenario(escenario) != base
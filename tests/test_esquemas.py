@@ -0,0 +1,69 @@
+import os
+import pandas as pd
+import pytest
+from modules.esquemas import ESQUEMAS, leer_csv
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# --- Archivos de ejemplo del repo (ambas carpetas) y su esquema ---
+MUESTRAS = {
+    "tablas/demanda_filtrada_final.csv": "demanda_cruda",
+    "tablas/stock_historico_formateado.csv": "stock_historico",
+    "tablas/stock_actualizado_formato.csv": "stock_actual",
+    "tablas/reposiciones_despivotadas.csv": "reposiciones",
+    "tablas/maestro_formateado_final_corregido.csv": "maestro",
+    "tablas/06may/Demanda_Dukier_desde_2022.csv": "demanda_cruda",
+    "tablas/06may/Demanda_Dukier_desde_2022 (light).csv": "demanda_cruda",
+    "tablas/06may/Stock historico.csv": "stock_historico",
+    "tablas/06may/stock_actual.csv": "stock_actual",
+    "tablas/06may/reposiciones_despivotadas 06may.csv": "reposiciones",
+}
+
+
+@pytest.mark.parametrize("archivo, clave", MUESTRAS.items())
+def test_lee_muestras_con_su_esquema(archivo, clave):
+    df = leer_csv(os.path.join(RAIZ, archivo), clave)
+    esquema = ESQUEMAS[clave]
+
+    assert not df.empty
+    assert set(esquema["obligatorias"]) <= set(df.columns)
+    assert isinstance(df["sku"].dtype, pd.CategoricalDtype)
+    for col in esquema["fechas"]:
+        assert pd.api.types.is_datetime64_any_dtype(df[col])
+    for col in esquema["enteras"]:
+        assert df[col].dtype == "int64"
+    for col in esquema["decimales"]:
+        if col in df.columns:
+            assert df[col].dtype == "float64"
+
+
+@pytest.mark.parametrize("archivo, clave", [
+    ("tablas/maestro_formateado_final_corregido.csv", "maestro"),
+    ("tablas/06may/reposiciones_despivotadas 06may.csv", "reposiciones"),
+])
+def test_vacios_numericos_se_coercionan(archivo, clave):
+    # Columnas numéricas con celdas vacías: decimales quedan NaN, enteras quedan en 0
+    ruta = os.path.join(RAIZ, archivo)
+    crudo = pd.read_csv(ruta)
+    df = leer_csv(ruta, clave)
+    esquema = ESQUEMAS[clave]
+    for col in esquema["decimales"]:
+        if col in crudo.columns:
+            assert df[col].isna().sum() == crudo[col].isna().sum()
+    for col in esquema["enteras"]:
+        assert df[col].isna().sum() == 0
+    assert len(df) == crudo["sku"].notna().sum()
+
+
+def test_archivo_subido_se_lee_igual_que_la_ruta():
+    ruta = os.path.join(RAIZ, "tablas/maestro_formateado_final_corregido.csv")
+    with open(ruta, "rb") as f:
+        subido = leer_csv(f, "maestro")
+    pd.testing.assert_frame_equal(subido, leer_csv(ruta, "maestro"))
+
+
+def test_columnas_faltantes_lanzan_value_error(tmp_path):
+    ruta = tmp_path / "demanda.csv"
+    ruta.write_text("sku,demanda\nA,1\n")
+    with pytest.raises(ValueError, match="fecha"):
+        leer_csv(str(ruta), "demanda_cruda")
@@ -0,0 +1,31 @@
+import pandas as pd
+import pytest
+import streamlit as st
+import utils.huella as huella
+
+
+@pytest.fixture
+def sesion():
+    st.session_state.clear()
+    yield st.session_state
+    st.session_state.clear()
+
+
+def test_huella_de_sesion_se_calcula_una_vez_por_objeto(sesion, monkeypatch):
+    calculos = []
+    original = huella.huella_dataframe
+    monkeypatch.setattr(huella, "huella_dataframe", lambda df: calculos.append(1) or original(df))
+    sesion["panel_mensual"] = pd.DataFrame({"sku": ["A"], "demanda": [1]})
+    primera = huella.huella_sesion("panel_mensual")
+    assert huella.huella_sesion("panel_mensual") == primera
+    assert len(calculos) == 1
+
+
+def test_huella_de_sesion_cambia_al_reemplazar_el_objeto(sesion):
+    sesion["panel_mensual"] = pd.DataFrame({"sku": ["A"], "demanda": [1]})
+    primera = huella.huella_sesion("panel_mensual")
+    # Mismo contenido en otro objeto: se recalcula y da la misma huella
+    sesion["panel_mensual"] = pd.DataFrame({"sku": ["A"], "demanda": [1]})
+    assert huella.huella_sesion("panel_mensual") == primera
+    sesion["panel_mensual"] = pd.DataFrame({"sku": ["A"], "demanda": [2]})
+    assert huella.huella_sesion("panel_mensual") != primera
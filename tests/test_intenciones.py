@@ -0,0 +1,80 @@
+import itertools
+import pytest
+import unidecode
+from modules.ia_utils import INTENCIONES, detectar_intenciones
+
+
+def detectar_referencia(pregunta):
+    """Evaluación directa de INTENCIONES (una búsqueda de subcadena por palabra), sin autómata."""
+    texto = unidecode.unidecode(pregunta.lower())
+    return [
+        intencion for intencion, requeridas, excluyentes in INTENCIONES
+        if all(any(p in texto for p in lista) for lista in requeridas) and not any(p in texto for p in excluyentes)
+    ]
+
+
+# Pregunta -> intención que responde (la primera en orden de prioridad)
+CASOS = [
+    ("¿Cuál es el top pérdidas del mes?", "ranking_perdidas"),
+    ("Muéstrame los productos más vendidos", "ranking_ventas"),
+    ("Quiero descargar el excel de compras", "descarga_compras"),
+    ("Descargar archivo con la demanda histórica", "descarga_demanda"),
+    ("Pásame el detalle de la política de ROP", "descarga_politicas"),
+    ("descargar el pronóstico en excel", "descarga_forecast"),
+    ("¿Qué reposiciones vienen en camino?", "en_camino"),
+    ("¿Cuánto stock tenemos?", "stock_total"),
+    ("¿Cuál es el EOQ?", "politicas"),
+    ("¿Cuántas unidades debería comprar?", "compra_sugerida"),
+    ("¿Cuál es el costo de fabricación total?", "costo_total"),
+    ("¿Cuántas unidades vendidas tenemos registradas?", "stock_total"),  # "tenemos" activa stock_total, de más prioridad
+    ("Ventas totales del año", "ventas_totales"),
+    ("¿Cuántos productos perdidos hubo?", "compra_sugerida"),  # "cuanto" (en "cuantos") va antes que las pérdidas
+    ("Unidades que faltaron el último trimestre", "perdidas_totales"),
+    ("¿Cuál es el valor perdido?", "perdidas_euros"),
+    ("¿Cuál es la tasa de quiebre?", "tasa_quiebre"),
+]
+
+
+@pytest.mark.parametrize("pregunta, esperada", CASOS)
+def test_intencion_principal(pregunta, esperada):
+    assert detectar_intenciones(pregunta)[0] == esperada
+
+
+@pytest.mark.parametrize("pregunta, intenciones", [
+    # Prioridad: el ranking gana a la descarga y la descarga de compras a la de políticas
+    ("Descargar en excel el top pérdidas", ["ranking_perdidas", "perdidas_totales"]),
+    ("Descargar archivo de compras con su política", ["descarga_compras", "descarga_politicas", "politicas"]),
+    ("Excel del forecast y la demanda histórica", ["descarga_demanda", "descarga_forecast", "ventas_totales"]),
+])
+def test_orden_de_prioridad(pregunta, intenciones):
+    assert detectar_intenciones(pregunta) == intenciones
+
+
+@pytest.mark.parametrize("pregunta", [
+    "¿Cuánto stock debería comprar?",
+    "¿Cuántas unidades vienen en camino?",
+    "¿Cuánto inventario necesito?",
+    "¿Cuál es la política para reponer?",
+])
+def test_excluyentes_anulan_compra_sugerida(pregunta):
+    assert "compra_sugerida" not in detectar_intenciones(pregunta)
+
+
+def test_compra_sugerida_sin_excluyentes():
+    assert detectar_intenciones("¿Cuánto necesito reponer?") == ["compra_sugerida"]
+
+
+def test_mayusculas_y_tildes_no_cambian_el_resultado():
+    assert detectar_intenciones("¿CUÁL ES LA TASA DE QUIEBRE?") == detectar_intenciones("cual es la tasa de quiebre?")
+
+
+def test_sin_intencion():
+    assert detectar_intenciones("Hola, ¿cómo estás?") == []
+
+
+def test_igual_a_la_evaluacion_directa():
+    # Combinaciones de dos palabras clave de intenciones distintas, con y sin texto alrededor
+    palabras = sorted({p for _, requeridas, excluyentes in INTENCIONES for lista in requeridas + [excluyentes] for p in lista})
+    for a, b in itertools.combinations(palabras, 2):
+        for pregunta in (f"{a} {b}", f"¿me das {a} y {b}?", f"{a}{b}"):
+            assert detectar_intenciones(pregunta) == detectar_referencia(pregunta), pregunta
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+from modules.inventory_managment import optimizar_politicas
+
+MESES = pd.date_range("2023-01-01", periods=24, freq="MS")
+SKUS = ["A", "B", "C", "D"]
+
+
+def demanda_mensual(semilla=0):
+    rng = np.random.default_rng(semilla)
+    return pd.DataFrame([(sku, mes, int(rng.poisson(20))) for sku in SKUS for mes in MESES],
+                        columns=["sku", "fecha", "demanda_sin_stockout"])
+
+
+def test_skus_sin_costos_en_el_maestro_no_tienen_politica_optima():
+    # C no está en el maestro; D tiene costo y precio en 0 (toda la grilla costaría 0)
+    maestro = pd.DataFrame({"sku": ["A", "B", "D"], "costo_fabricacion": [5.0, 6.0, 0.0], "precio_venta": [10.0, 12.0, 0.0]})
+    resultado = optimizar_politicas(demanda_mensual(), maestro).set_index("sku")
+
+    assert resultado["sin_costos"].tolist() == [False, False, True, True]
+    sin_costos = resultado.loc[["C", "D"]]
+    assert sin_costos[["nivel_servicio", "rop", "eoq", "costo_total", "ahorro"]].isna().all().all()
+    # La política actual de referencia sigue informada
+    assert (sin_costos["rop_actual"] > 0).all()
+    assert resultado.loc[["A", "B"], ["nivel_servicio", "rop", "costo_total", "ahorro"]].notna().all().all()
+
+
+def test_con_costo_por_pedido_un_sku_sin_margen_si_tiene_costos():
+    maestro = pd.DataFrame({"sku": SKUS, "costo_fabricacion": 0.0, "precio_venta": 0.0})
+    resultado = optimizar_politicas(demanda_mensual(), maestro, costo_pedido=50.0)
+    assert not resultado["sin_costos"].any()
+
+
+def test_stock_de_partida_desde_el_stock_historico():
+    maestro = pd.DataFrame({"sku": SKUS, "costo_fabricacion": 5.0, "precio_venta": 10.0})
+    demanda = demanda_mensual()
+    base = optimizar_politicas(demanda, maestro)
+    # Sin stock al inicio todas las políticas parten vacías: más pérdidas que partiendo con stock = ROP
+    stock = pd.DataFrame({"sku": SKUS, "fecha": pd.Timestamp("2022-12-20"), "stock": 0})
+    vacio = optimizar_politicas(demanda, maestro, df_stock_historico=stock)
+    assert (vacio["costo_politica_actual"] > base["costo_politica_actual"]).all()
+    # Con stock = ROP actual en la foto se reproduce la referencia sin fotos
+    stock["stock"] = base["rop_actual"].to_numpy()
+    igual = optimizar_politicas(demanda, maestro, df_stock_historico=stock)
+    pd.testing.assert_series_equal(igual["costo_politica_actual"], base["costo_politica_actual"])
@@ -0,0 +1,82 @@
+import itertools
+import numpy as np
+import pandas as pd
+import pytest
+from modules.presupuesto_compras import _greedy, _programacion_dinamica, asignar_presupuesto
+
+
+def optimo_fuerza_bruta(costos, beneficios, presupuesto):
+    mejor = 0.0
+    for seleccion in itertools.product([False, True], repeat=len(costos)):
+        seleccion = np.array(seleccion)
+        if costos[seleccion].sum() <= presupuesto:
+            mejor = max(mejor, beneficios[seleccion].sum())
+    return mejor
+
+
+def candidatos(costos, beneficios):
+    return pd.DataFrame({"sku": [f"S{i}" for i in range(len(costos))], "costo_compra": costos,
+                         "beneficio": beneficios, "venta_recuperada_euros": np.asarray(beneficios) * 2})
+
+
+@pytest.mark.parametrize("semilla", range(20))
+def test_programacion_dinamica_igual_a_fuerza_bruta(semilla):
+    rng = np.random.default_rng(semilla)
+    n = int(rng.integers(1, 10))
+    costos = rng.integers(0, 50, n).astype(float)
+    beneficios = rng.integers(0, 40, n).astype(float)
+    presupuesto = float(rng.integers(0, 120))
+
+    seleccion = _programacion_dinamica(costos, beneficios, presupuesto, max_celdas=20_000_000)
+    assert costos[seleccion].sum() <= presupuesto
+    assert beneficios[seleccion].sum() == optimo_fuerza_bruta(costos, beneficios, presupuesto)
+
+    df, resumen = asignar_presupuesto(candidatos(costos, beneficios), presupuesto)
+    assert resumen["beneficio_total"] == optimo_fuerza_bruta(costos, beneficios, presupuesto)
+    assert resumen["costo_total"] <= presupuesto
+
+
+def test_costos_no_enteros_nunca_superan_el_presupuesto():
+    rng = np.random.default_rng(7)
+    costos = rng.uniform(1, 300, 8).round(2)
+    beneficios = rng.uniform(0, 100, 8).round(2)
+    for presupuesto in [0.5, 99.99, 250.0, 1000.0]:
+        _, resumen = asignar_presupuesto(candidatos(costos, beneficios), presupuesto)
+        assert resumen["costo_total"] <= presupuesto
+        # La discretización redondea los costos hacia arriba: a lo más se pierde algo frente al óptimo
+        assert resumen["beneficio_total"] <= optimo_fuerza_bruta(costos, beneficios, presupuesto) + 1e-9
+
+
+def test_greedy_se_queda_con_el_mejor_item_individual():
+    # Por ratio se toma el ítem 0 (2 €/€) y el 1 ya no cabe; el ítem 1 solo vale más
+    costos = np.array([1.0, 10.0])
+    beneficios = np.array([2.0, 10.0])
+    assert _greedy(costos, beneficios, 10.0).tolist() == [False, True]
+    assert _greedy(costos, beneficios, 11.0).tolist() == [True, True]
+
+
+def test_presupuesto_cero_o_minimo():
+    costos = np.array([0.0, 5.0, 3.0])
+    beneficios = np.array([4.0, 10.0, 6.0])
+    for presupuesto in [0.0, 0.01]:
+        df, resumen = asignar_presupuesto(candidatos(costos, beneficios), presupuesto)
+        # Sólo el ítem sin costo cabe
+        assert df["seleccionado"].tolist() == [True, False, False]
+        assert resumen == {"skus_seleccionados": 1, "costo_total": 0.0, "beneficio_total": 4.0,
+                           "venta_recuperada_euros": 8.0, "metodo": "greedy"}
+
+
+def test_items_sin_costo_o_sin_beneficio():
+    costos = np.array([0.0, 0.0, 4.0, 4.0])
+    beneficios = np.array([3.0, 0.0, 5.0, 0.0])
+    seleccion = _programacion_dinamica(costos, beneficios, 4.0, max_celdas=20_000_000)
+    assert beneficios[seleccion].sum() == 8.0
+    df, resumen = asignar_presupuesto(candidatos(costos, beneficios), 4.0)
+    # Los ítems sin beneficio no se compran aunque no cuesten
+    assert df["seleccionado"].tolist() == [True, False, True, False]
+    assert resumen["beneficio_total"] == 8.0
+
+
+def test_sin_candidatos():
+    df, resumen = asignar_presupuesto(candidatos([], []), 100.0)
+    assert df.empty and resumen["skus_seleccionados"] == 0 and resumen["costo_total"] == 0.0
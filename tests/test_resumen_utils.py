@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+from modules.resumen_utils import resumir_perdidas_mensuales
+
+MAESTRO = pd.DataFrame({"sku": ["A", "B", "C"], "precio_venta": [2.0, 3.0, 5.0]})
+
+
+def panel(sku):
+    return pd.DataFrame({
+        "sku": sku,
+        "mes": pd.to_datetime(["2024-01-01", "2024-01-01", "2024-02-01"]),
+        "semanas": [4, 4, 0],
+        "demanda": [5, 6, 0],
+        "demanda_limpia": [6, 6, 0],
+        "unidades_perdidas": [1, 2, 0],
+    })
+
+
+def semanal(sku):
+    return pd.DataFrame({
+        "sku": sku,
+        "fecha": pd.to_datetime(["2024-01-01", "2024-01-08", "2024-01-01"]),
+        "demanda": [2, 3, 6],
+        "demanda_sin_outlier": [2, 4, 6],
+        "demanda_sin_stockout": [2, 4, 8],
+    })
+
+
+@pytest.mark.parametrize("tipo", [str, "category"])
+def test_perdidas_desde_el_panel_con_sku_categorico(tipo):
+    resumen = resumir_perdidas_mensuales(None, MAESTRO, panel(pd.Series(["A", "B", "C"]).astype(tipo)))
+    assert resumen["sku"].astype(str).tolist() == ["A", "B"]
+    assert resumen["precio_venta"].tolist() == [2.0, 3.0]
+    assert resumen["valor_perdido_euros"].tolist() == [2.0, 6.0]
+
+
+@pytest.mark.parametrize("tipo", [str, "category"])
+def test_perdidas_desde_la_demanda_semanal_con_sku_categorico(tipo):
+    resumen = resumir_perdidas_mensuales(semanal(pd.Series(["A", "A", "B"]).astype(tipo)), MAESTRO)
+    assert resumen["sku"].astype(str).tolist() == ["A", "B"]
+    assert resumen["unidades_perdidas"].tolist() == [1, 2]
+    assert resumen["valor_perdido_euros"].tolist() == [2.0, 6.0]
+
+
+def test_sku_sin_precio_en_el_maestro_queda_sin_valor():
+    resumen = resumir_perdidas_mensuales(None, MAESTRO.iloc[:1], panel(pd.Categorical(["A", "B", "C"])))
+    assert resumen["valor_perdido_euros"].iloc[0] == 2.0
+    assert pd.isna(resumen["valor_perdido_euros"].iloc[1])
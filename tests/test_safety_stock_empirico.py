@@ -0,0 +1,105 @@
+import time
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+import pytest
+from modules.inventory_managment import calcular_politicas_inventario_lote, cuantil_por_fila, safety_stock_empirico
+
+FECHAS = pd.date_range("2023-01-02", periods=60, freq="W-MON")
+
+
+def referencia(df, skus, lead_time, nivel_servicio, fechas):
+    """Mismo cálculo con np.nanquantile y una ventana móvil por SKU."""
+    semanas = max(int(round(lead_time * 52 / 12)), 1)
+    pivot = df.groupby(["sku", "fecha"])["demanda_sin_outlier"].sum().unstack("fecha").reindex(index=skus, columns=fechas)
+    # Una ventana con alguna semana fuera de la historia del SKU no cuenta
+    ventanas = pivot.T.rolling(semanas, min_periods=semanas).sum().T.iloc[:, semanas - 1:].to_numpy(dtype=float)
+    resultado = []
+    for fila in ventanas:
+        if np.isnan(fila).all():
+            resultado.append(np.nan)
+        else:
+            resultado.append(max(np.nanquantile(fila, nivel_servicio) - np.nanmean(fila), 0))
+    return pd.Series(resultado, index=skus)
+
+
+def demanda_con_huecos(n_skus=6, semilla=0):
+    rng = np.random.default_rng(semilla)
+    filas = []
+    for i in range(n_skus):
+        for j, fecha in enumerate(FECHAS):
+            filas.append((f"S{i}", fecha, int(rng.poisson(10 + 5 * i))))
+    df = pd.DataFrame(filas, columns=["sku", "fecha", "demanda_sin_outlier"])
+    # S1: una semana sin registro a mitad de la historia; S2: historia más corta que una ventana;
+    # S3: empieza tarde (sólo las últimas 30 semanas)
+    df = df[~((df["sku"] == "S1") & (df["fecha"] == FECHAS[25]))]
+    df = df[~((df["sku"] == "S2") & (df["fecha"] < FECHAS[-10]))]
+    df = df[~((df["sku"] == "S3") & (df["fecha"] < FECHAS[-30]))]
+    return df
+
+
+@pytest.mark.parametrize("nivel_servicio", [0.5, 0.8, 0.95, 0.99, 1.0])
+@pytest.mark.parametrize("lead_time", [1, 3, 5])
+def test_igual_a_nanquantile_sobre_las_ventanas(nivel_servicio, lead_time):
+    df = demanda_con_huecos()
+    skus = pd.Index(["S0", "S1", "S2", "S3", "S4", "S5", "SIN_DEMANDA"])
+    obtenido = safety_stock_empirico(df, skus, lead_time, nivel_servicio)
+    esperado = referencia(df, skus, lead_time, nivel_servicio, FECHAS)
+    pd.testing.assert_series_equal(obtenido, esperado, check_names=False, rtol=1e-9)
+    # Sin una ventana completa (S2 tiene 10 semanas): NaN
+    sin_ventana = ["S2", "SIN_DEMANDA"] if lead_time >= 3 else ["SIN_DEMANDA"]
+    assert obtenido[sin_ventana].isna().all()
+    assert obtenido[["S0", "S1", "S3", "S4", "S5"]].notna().all()
+
+
+def test_historia_total_mas_corta_que_el_lead_time():
+    df = demanda_con_huecos()
+    df = df[df["fecha"] >= FECHAS[-4]]
+    assert safety_stock_empirico(df, pd.Index(["S0", "S1"]), 5, 0.95).isna().all()
+
+
+def test_skus_sin_ventana_usan_el_metodo_normal():
+    df = demanda_con_huecos().assign(demanda=1)
+    meses = pd.date_range(FECHAS[-1] + pd.offsets.MonthBegin(1), periods=6, freq="MS")
+    skus = ["S0", "S2", "S3"]
+    forecast = pd.DataFrame([(sku, mes, 40, "proyección") for sku in skus for mes in meses],
+                            columns=["sku", "mes", "forecast", "tipo_mes"])
+    args = (forecast, df, meses[0], 5)
+    normal = calcular_politicas_inventario_lote(*args, metodo_safety_stock="normal").set_index("sku")
+    empirico = calcular_politicas_inventario_lote(*args, metodo_safety_stock="empirico").set_index("sku")
+    esperado = safety_stock_empirico(df, pd.Index(skus), 5, NormalDist().cdf(1.65)).round()
+    # S2 (10 semanas) no completa una ventana de 5 meses: conserva el safety stock normal
+    assert empirico.loc["S2", "safety_stock"] == normal.loc["S2", "safety_stock"]
+    assert empirico.loc[["S0", "S3"], "safety_stock"].tolist() == esperado[["S0", "S3"]].astype(int).tolist()
+
+
+@pytest.mark.parametrize("q", [0.0, 0.37, 0.95, 1.0])
+def test_cuantil_por_fila_igual_a_nanquantile(q):
+    rng = np.random.default_rng(3)
+    valores = rng.normal(50, 10, (200, 30))
+    valores[rng.random(valores.shape) < 0.4] = np.nan
+    valores[:5] = np.nan           # filas sin valores
+    valores[5:10, 1:] = np.nan     # filas con un solo valor
+    with np.errstate(all="ignore"), pytest.warns(RuntimeWarning):
+        esperado = np.nanquantile(valores, q, axis=1)
+    np.testing.assert_allclose(cuantil_por_fila(valores, q), esperado, rtol=1e-12, equal_nan=True)
+
+
+def test_cuantil_por_fila_no_es_mas_lento_que_nanquantile():
+    rng = np.random.default_rng(1)
+    # Ventanas de un catálogo de 3.000 SKUs × 3 años de semanas, con huecos
+    ventanas = rng.poisson(90, (3000, 135)).astype(float)
+    ventanas[rng.random(ventanas.shape) < 0.2] = np.nan
+
+    def cronometrar(funcion):
+        tiempos = []
+        for _ in range(3):
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append(time.perf_counter() - inicio)
+        return min(tiempos)
+
+    propio = cronometrar(lambda: cuantil_por_fila(ventanas, 0.95))
+    numpy = cronometrar(lambda: np.nanquantile(ventanas, 0.95, axis=1))
+    print(f"cuantil_por_fila: {propio * 1000:.1f} ms; np.nanquantile: {numpy * 1000:.1f} ms")
+    assert propio <= numpy
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+from modules.simulador_inventario import backtest_politicas, simular_politica_rop
+
+# Escenario calculado a mano: stock inicial 10, ROP 6, EOQ 10, lead time 1 (el pedido del cierre del
+# mes t llega al inicio del mes t + 2)
+#
+# mes  llega  demanda  venta  perdida  stock  posición  pide
+#  0     0       4       4       0        6       6       sí  (llega en el mes 2)
+#  1     0       4       4       0        2      12       no
+#  2    10       4       4       0        8       8       no
+#  3     0       4       4       0        4       4       sí  (llega en el mes 5)
+#  4     0       6       4       2        0      10       no
+#  5    10       4       4       0        6       6       sí
+DEMANDA = [4, 4, 4, 4, 6, 4]
+STOCK_FINAL = [6, 2, 8, 4, 0, 6]
+
+
+def test_escenario_calculado_a_mano():
+    sim = simular_politica_rop(np.array(DEMANDA, dtype=float), 10, 6, 10, 1)
+    assert sim["stock_promedio"] == pytest.approx(sum(STOCK_FINAL) / 6)
+    assert sim["unidades_vendidas"] == 24
+    assert sim["unidades_perdidas"] == 2
+    assert sim["fill_rate"] == pytest.approx(24 / 26)
+    assert sim["pedidos"] == 3
+
+
+def test_lead_time_cero_llega_al_mes_siguiente():
+    # Stock 5, ROP 0, EOQ 8: mes 0 vende 5 y pide; mes 1 llegan 8, vende 5 (quedan 3); mes 2 vende 3, pierde 2 y pide
+    sim = simular_politica_rop(np.array([5.0, 5.0, 5.0]), 5, 0, 8, 0)
+    assert sim["stock_promedio"] == pytest.approx(1.0)
+    assert (sim["unidades_vendidas"], sim["unidades_perdidas"], sim["pedidos"]) == (13, 2, 2)
+
+
+def test_politicas_en_paralelo_igual_que_por_separado():
+    demanda = np.array([DEMANDA, [1, 1, 1, 1, 1, 1]], dtype=float)
+    rop = np.array([[6.0, 2.0, 0.0]])
+    sim = simular_politica_rop(demanda[:, None, :], 10, rop, 10, 1)
+    assert sim["pedidos"].shape == (2, 3)
+    for i in range(2):
+        for j in range(3):
+            sola = simular_politica_rop(demanda[i], 10, rop[0, j], 10, 1)
+            for clave in sola:
+                assert sim[clave][i, j] == pytest.approx(sola[clave])
+
+
+def test_eoq_cero_no_cuenta_pedidos():
+    sim = simular_politica_rop(np.array([3.0, 3.0]), 0, 5, 0, 1)
+    assert (sim["unidades_perdidas"], sim["pedidos"]) == (6, 0)
+
+
+def test_backtest_sobre_la_historia_mensual():
+    meses = pd.date_range("2024-01-01", periods=6, freq="MS")
+    demanda = pd.DataFrame({
+        "sku": ["A"] * 6 + ["B"] * 6,
+        "fecha": list(meses) * 2,
+        "demanda_sin_stockout": DEMANDA + [1] * 6,
+        # En la historia A vendió 3 de 6 en el mes 4 (3 unidades perdidas)
+        "demanda": [4, 4, 4, 4, 3, 4] + [1] * 6,
+    })
+    stock_historico = pd.DataFrame({
+        "sku": ["A", "A", "B"],
+        "fecha": pd.to_datetime(["2023-12-31", "2024-02-15", "2024-03-10"]),
+        "stock": [10, 99, 7],
+    })
+    politicas = pd.DataFrame({"sku": ["A", "B", "C"], "rop": [6, 0, 1], "eoq": [10, 5, 1]})
+
+    df = backtest_politicas(demanda, stock_historico, politicas, lead_time=1).set_index("sku")
+
+    # A parte con la última foto anterior al primer mes (10); B, sin foto anterior, con su primera foto (7).
+    # C no tiene demanda y no aparece
+    assert df.index.tolist() == ["A", "B"]
+    assert df.loc["A"].to_dict() == {
+        "fill_rate": round(24 / 26, 4), "stock_promedio": round(26 / 6, 1), "unidades_vendidas": 24,
+        "unidades_perdidas": 2, "pedidos": 3, "unidades_perdidas_historicas": 3, "fill_rate_historico": round(23 / 26, 4),
+    }
+    # B: 7 unidades y 1 por mes, nunca baja del ROP 0 hasta el final
+    assert df.loc["B", ["stock_promedio", "unidades_perdidas", "pedidos"]].tolist() == [3.5, 0, 0]
@@ -0,0 +1,96 @@
+import hashlib
+import importlib.util
+import json
+import os
+import pandas as pd
+import streamlit as st
+from modules.esquemas import leer_csv
+
+# --- Caché en disco de los archivos cargados manualmente ---
+# Cada entrada se guarda tipada (Feather/Arrow con pyarrow, que conserva categorías y unidades de fecha;
+# pickle de pandas si pyarrow no está instalado)
+# y el manifiesto registra la huella (sha256) del archivo original de cada una.
+CARPETA_CACHE = "tmp"
+RUTA_MANIFIESTO = os.path.join(CARPETA_CACHE, "manifiesto.json")
+FORMATO = "feather" if importlib.util.find_spec("pyarrow") is not None else "pickle"
+
+
+def leer_manifiesto():
+    try:
+        with open(RUTA_MANIFIESTO, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _guardar_manifiesto(manifiesto):
+    temporal = RUTA_MANIFIESTO + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, indent=2)
+    os.replace(temporal, RUTA_MANIFIESTO)
+
+
+def _ruta_tabla(clave):
+    return os.path.join(CARPETA_CACHE, f"{clave}.{'feather' if FORMATO == 'feather' else 'pkl'}")
+
+
+def _guardar_tabla(clave, df, huella):
+    os.makedirs(CARPETA_CACHE, exist_ok=True)
+    ruta = _ruta_tabla(clave)
+    if FORMATO == "feather":
+        df.to_feather(ruta)
+    else:
+        df.to_pickle(ruta)
+    manifiesto = leer_manifiesto()
+    manifiesto[clave] = {"huella": huella, "archivo": ruta, "formato": FORMATO, "filas": len(df)}
+    _guardar_manifiesto(manifiesto)
+
+
+def _leer_tabla(entrada):
+    if entrada["formato"] == "feather":
+        return pd.read_feather(entrada["archivo"])
+    return pd.read_pickle(entrada["archivo"])
+
+
+def cargar_entrada(clave, archivo=None):
+    """
+    Deja en st.session_state[clave] el DataFrame de una entrada manual y retorna su origen
+    ("subido", "cache" o None si no hay datos).
+
+    - Archivo subido con una huella nueva: se lee con su esquema y se guarda en el caché
+    - Sin archivo: se usa la entrada del manifiesto (o se migra el tmp/{clave}.csv de versiones anteriores)
+    - Si la sesión ya tiene la versión que indica el manifiesto, no se lee nada del disco
+    """
+    manifiesto = leer_manifiesto()
+    huellas_sesion = st.session_state.setdefault("huellas_entradas", {})
+
+    if archivo is not None:
+        huella = hashlib.sha256(archivo.getvalue()).hexdigest()
+        origen = "subido"
+        entrada = manifiesto.get(clave, {})
+        # Se vuelve a parsear si la huella es nueva o si el archivo del caché ya no está en disco
+        if entrada.get("huella") != huella or not os.path.exists(entrada.get("archivo", "")):
+            df = leer_csv(archivo, clave)
+            _guardar_tabla(clave, df, huella)
+            st.session_state[clave] = df
+            huellas_sesion[clave] = huella
+            return origen
+    elif clave in manifiesto and os.path.exists(manifiesto[clave]["archivo"]):
+        huella = manifiesto[clave]["huella"]
+        origen = "cache"
+    else:
+        ruta_csv = os.path.join(CARPETA_CACHE, f"{clave}.csv")
+        if not os.path.exists(ruta_csv):
+            return None
+        with open(ruta_csv, "rb") as f:
+            huella = hashlib.sha256(f.read()).hexdigest()
+        df = leer_csv(ruta_csv, clave)
+        _guardar_tabla(clave, df, huella)
+        st.session_state[clave] = df
+        huellas_sesion[clave] = huella
+        return "cache"
+
+    if huellas_sesion.get(clave) != huella or st.session_state.get(clave) is None:
+        st.session_state[clave] = _leer_tabla(leer_manifiesto()[clave])
+        huellas_sesion[clave] = huella
+    return origen
@@ -0,0 +1,194 @@
+import contextlib
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import fcntl
+except ImportError:  # Windows: sólo el lock entre hilos
+    fcntl = None
+from modules.almacen_demanda import almacen_vigente, ingerir_demanda
+from modules.esquemas import leer_csv
+
+# --- Fuentes del modo "Desde Base de Datos": clave de sesión -> (id de Google Drive, nombre de archivo) ---
+FUENTES_DRIVE = {
+    "demanda_cruda": ("1OXm_cHTP9Si4CtBInQZqQro0QR-pCWaQ", "demanda.csv"),
+    "stock_historico": ("1GgjD8bL4QwHQo76pRv2bW2RGE71d4s9r", "stock_hist.csv"),
+    "maestro": ("1ueW0mjB9aVUcDh4e8ywEIikJAvm-530h", "maestro.csv"),
+    "stock_actual": ("1q5LfbrjT5dxlfMZQ-WvWqdKWz4fg7JBh", "stock_actual.csv"),
+    "reposiciones": ("1v1tSpWkmR6Y4h39nD3uDG99JOx_qgLIk", "repos.csv"),
+}
+
+# PLANITY_DATOS_BASE_URL reemplaza a Drive por un directorio HTTP con los mismos nombres de archivo
+# (p. ej. "python -m http.server" sobre una carpeta local en pruebas)
+URL_DRIVE = "https://drive.usercontent.google.com/download?id={file_id}&export=download&confirm=t"
+TAMANO_BLOQUE = 1 << 20
+TIMEOUT = 60
+EDAD_MAXIMA_SIN_VALIDAR = 3600  # Segundos que se reutiliza una copia sin ETag si el servidor no informa su tamaño
+
+# Demanda más grande que este umbral (PLANITY_UMBRAL_PARTICIONADO_MB, en MB) no se lee entera:
+# se ingiere por bloques al almacén particionado por SKU y la sesión recibe "almacen_demanda"
+UMBRAL_PARTICIONADO_MB = 200
+
+
+def url_fuente(file_id, nombre_archivo):
+    base = os.environ.get("PLANITY_DATOS_BASE_URL")
+    if base:
+        return f"{base.rstrip('/')}/{nombre_archivo}"
+    return URL_DRIVE.format(file_id=file_id)
+
+
+def carpeta_descargas():
+    carpeta = os.environ.get("PLANITY_DATOS_DIR") or os.path.join(tempfile.gettempdir(), "planity_datos")
+    os.makedirs(carpeta, exist_ok=True)
+    return carpeta
+
+
+def _leer_meta(ruta_meta):
+    try:
+        with open(ruta_meta, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+_BLOQUEOS = {}
+_BLOQUEOS_GUARDA = threading.Lock()
+
+
+@contextlib.contextmanager
+def _bloqueo_archivo(ruta_local):
+    """
+    Exclusión mutua por archivo descargado: un lock de hilo (sesiones del mismo proceso) y,
+    donde existe fcntl, un flock sobre `<archivo>.lock` (varios procesos sobre la misma carpeta).
+    """
+    with _BLOQUEOS_GUARDA:
+        bloqueo = _BLOQUEOS.setdefault(os.path.abspath(ruta_local), threading.Lock())
+    with bloqueo, open(ruta_local + ".lock", "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _copia_sin_etag_vigente(url, meta):
+    """
+    Valida contra el servidor una copia descargada sin ETag: HEAD y comparación de Content-Length
+    (y Last-Modified si el servidor lo envía). Si el servidor no informa el tamaño, la copia sólo
+    se reutiliza mientras sea más nueva que EDAD_MAXIMA_SIN_VALIDAR.
+    """
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, method="HEAD"), timeout=TIMEOUT) as respuesta:
+            largo = respuesta.headers.get("Content-Length")
+            modificado = respuesta.headers.get("Last-Modified")
+    except (urllib.error.URLError, OSError):
+        largo = modificado = None
+    if largo and largo.isdigit():
+        return int(largo) == meta.get("tamano") and modificado == meta.get("modificado")
+    return time.time() - meta.get("descargado", 0) < EDAD_MAXIMA_SIN_VALIDAR
+
+
+def descargar_archivo(url, ruta_local):
+    """
+    Descarga `url` en `ruta_local` reutilizando la copia en disco y retomando descargas parciales.
+
+    - Copia completa con ETag guardado: se valida con If-None-Match (304 = se reutiliza sin bajar nada)
+    - Copia completa sin ETag: se valida con un HEAD (Content-Length / Last-Modified del servidor)
+    - Descarga parcial (.part): se pide el resto con Range/If-Range; si el servidor responde 200 se reinicia
+
+    Las descargas del mismo archivo se serializan (sesiones concurrentes no escriben el mismo .part).
+    """
+    with _bloqueo_archivo(ruta_local):
+        return _descargar_archivo(url, ruta_local)
+
+
+def _descargar_archivo(url, ruta_local):
+    ruta_meta = ruta_local + ".meta.json"
+    ruta_parcial = ruta_local + ".part"
+    meta = _leer_meta(ruta_meta)
+    completa = os.path.exists(ruta_local) and meta.get("url") == url and meta.get("tamano") == os.path.getsize(ruta_local)
+
+    encabezados = {}
+    if completa:
+        if not meta.get("etag"):
+            if _copia_sin_etag_vigente(url, meta):
+                return ruta_local
+        else:
+            encabezados["If-None-Match"] = meta["etag"]
+    elif os.path.exists(ruta_parcial) and meta.get("url") == url and meta.get("etag"):
+        encabezados["Range"] = f"bytes={os.path.getsize(ruta_parcial)}-"
+        encabezados["If-Range"] = meta["etag"]
+
+    try:
+        respuesta = urllib.request.urlopen(urllib.request.Request(url, headers=encabezados), timeout=TIMEOUT)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return ruta_local
+        if e.code == 416 and "Range" in encabezados:
+            # El parcial ya estaba completo (o es inválido): se descarta y se baja de nuevo
+            os.remove(ruta_parcial)
+            return _descargar_archivo(url, ruta_local)
+        raise
+
+    with respuesta:
+        etag = respuesta.headers.get("ETag")
+        modificado = respuesta.headers.get("Last-Modified")
+        retoma = respuesta.status == 206
+        # Se registra el ETag antes de bajar el cuerpo para poder retomar si la descarga se corta
+        with open(ruta_meta, "w", encoding="utf-8") as f:
+            json.dump({"url": url, "etag": etag}, f)
+        with open(ruta_parcial, "ab" if retoma else "wb") as f:
+            while True:
+                bloque = respuesta.read(TAMANO_BLOQUE)
+                if not bloque:
+                    break
+                f.write(bloque)
+        # Tamaño esperado: Content-Length en una descarga completa, el total de Content-Range al retomar
+        esperado = respuesta.headers.get("Content-Range", "").rpartition("/")[2] if retoma else respuesta.headers.get("Content-Length")
+
+    tamano = os.path.getsize(ruta_parcial)
+    if esperado and esperado.isdigit() and tamano != int(esperado):
+        raise IOError(f"Descarga incompleta de {url}: {tamano} de {esperado} bytes")
+    os.replace(ruta_parcial, ruta_local)
+    with open(ruta_meta, "w", encoding="utf-8") as f:
+        json.dump({"url": url, "etag": etag, "tamano": tamano, "modificado": modificado, "descargado": time.time()}, f)
+    return ruta_local
+
+
+def umbral_particionado():
+    return float(os.environ.get("PLANITY_UMBRAL_PARTICIONADO_MB", UMBRAL_PARTICIONADO_MB)) * (1 << 20)
+
+
+def _descargar_y_leer(clave, file_id, nombre_archivo):
+    """Retorna (clave de sesión, valor): el DataFrame tipado, o la carpeta del almacén si la demanda es grande."""
+    ruta = descargar_archivo(url_fuente(file_id, nombre_archivo), os.path.join(carpeta_descargas(), nombre_archivo))
+    if clave == "demanda_cruda" and os.path.getsize(ruta) > umbral_particionado():
+        carpeta = ruta + ".almacen"
+        # Una sola ingestión por versión del CSV aunque varias sesiones lo pidan a la vez
+        with _bloqueo_archivo(carpeta):
+            if not almacen_vigente(carpeta, ruta):
+                ingerir_demanda(ruta, carpeta)
+        return "almacen_demanda", carpeta
+    return clave, leer_csv(ruta, clave)
+
+
+def descargar_fuentes(claves, fuentes=None, max_hilos=None):
+    """
+    Descarga y lee en paralelo (un hilo por archivo) las fuentes indicadas, tipadas según su esquema.
+    El tiempo total queda acotado por el archivo más lento y no por la suma de todos.
+    Retorna {clave: DataFrame}; una demanda sobre el umbral llega como {"almacen_demanda": carpeta}.
+    """
+    fuentes = fuentes or FUENTES_DRIVE
+    claves = list(claves)
+    if not claves:
+        return {}
+    with ThreadPoolExecutor(max_workers=max_hilos or len(claves)) as pool:
+        futuros = {clave: pool.submit(_descargar_y_leer, clave, *fuentes[clave]) for clave in claves}
+        return dict(futuro.result() for futuro in futuros.values())
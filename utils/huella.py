@@ -0,0 +1,35 @@
+import hashlib
+import pandas as pd
+import streamlit as st
+
+
+def huella_dataframe(df):
+    """Huella (hash) del contenido de un DataFrame, para detectar si los datos cambiaron."""
+    if df is None:
+        return "none"
+    if not isinstance(df, pd.DataFrame):
+        return hashlib.sha1(repr(df).encode("utf-8")).hexdigest()
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    h = hashlib.sha1(hashes.tobytes())
+    h.update(",".join(map(str, df.columns)).encode("utf-8"))
+    return h.hexdigest()
+
+
+def huella_datos(*dfs):
+    """Huella combinada de varios DataFrames."""
+    return hashlib.sha1("|".join(huella_dataframe(df) for df in dfs).encode("utf-8")).hexdigest()
+
+
+def huella_sesion(clave):
+    """
+    Huella de st.session_state[clave], calculada una vez por objeto.
+    Se guarda junto a una referencia al objeto: si la clave pasa a apuntar a otro DataFrame
+    (comparación con `is`, no por id()), la huella se recalcula.
+    """
+    registro = st.session_state.setdefault("huellas_sesion", {})
+    objeto = st.session_state.get(clave)
+    guardado = registro.get(clave)
+    if guardado is None or guardado["objeto"] is not objeto:
+        guardado = {"objeto": objeto, "huella": huella_dataframe(objeto)}
+        registro[clave] = guardado
+    return guardado["huella"]
@@ -1,23 +1,107 @@
 import os
-import tempfile
 import pandas as pd
 import streamlit as st
-import gdown
 from modules.demand_cleaner import clean_demand
 from modules.forecast_engine import forecast_engine, generar_comparativa_forecasts
 from modules.stock_projector import project_stock
+from modules.reposiciones import construir_calendario_reposiciones
+from modules.panel_mensual import construir_panel_mensual
+from modules.almacen_demanda import (
+    COLUMNAS_SEMANALES,
+    escribir_almacen,
+    iterar_particiones,
+    leer_indice,
+    nombre_particion,
+    particion_de
+)
+from utils.huella import huella_dataframe, huella_sesion
+from utils.descargas import FUENTES_DRIVE, descargar_fuentes
 from modules.resumen_utils import (
+    calcular_unidades_perdidas,
     consolidar_historico_stock,
     consolidar_proyeccion_futura,
     generar_contexto_negocio
 )
 
 @st.cache_data(ttl=3600)
-def descargar_csv_drive(file_id, nombre_archivo):
-    url = f"https://drive.google.com/uc?id={file_id}"
-    ruta_local = os.path.join(tempfile.gettempdir(), nombre_archivo)
-    gdown.download(url, ruta_local, quiet=True)
-    return pd.read_csv(ruta_local)
+def descargar_csv_drive(claves, base_url=None):
+    # base_url (PLANITY_DATOS_BASE_URL) sólo forma parte de la clave del caché
+    return descargar_fuentes(claves)
+
+def procesar_demanda_particionada(carpeta, df_stock_historico):
+    """
+    Limpieza, panel mensual y forecast del almacén de demanda, una partición por vez.
+
+    Cada partición limpia se escribe en su propio almacén ("almacen_demanda_limpia") y de ella sólo
+    quedan en memoria los agregados: su parte del panel mensual, del forecast y de los totales semanales.
+    Todas las particiones usan el último mes del archivo completo como base del horizonte de forecast.
+    """
+    indice = leer_indice(carpeta)
+    n_particiones = indice["n_particiones"]
+    ultimo_mes = pd.Timestamp(indice["fechas"][-1]).to_period('M').to_timestamp()
+
+    # Stock histórico repartido con el mismo hash de SKU que la demanda
+    stock = df_stock_historico if isinstance(df_stock_historico, pd.DataFrame) else pd.DataFrame()
+    stock_por_particion = {}
+    if not stock.empty:
+        stock_por_particion = {
+            nombre_particion(numero): parte
+            for numero, parte in stock.groupby(particion_de(stock['sku'], n_particiones), sort=False)
+        }
+
+    # El almacén limpio depende de la versión de la demanda y del stock histórico usado en la limpieza
+    origen = {"demanda": indice["origen"], "stock": huella_dataframe(stock)}
+    carpeta_limpia = f"{carpeta}.limpia_{origen['stock'][:12]}"
+    indice_limpio = leer_indice(carpeta_limpia)
+    reutilizar = indice_limpio is not None and indice_limpio.get("origen") == origen
+
+    paneles, forecasts, comparativas, semanales = [], [], [], []
+
+    def agregar(nombre, limpia):
+        panel = construir_panel_mensual(limpia, stock_por_particion.pop(nombre, stock.iloc[0:0]))
+        paneles.append(panel)
+        forecasts.append(forecast_engine(None, panel=panel, ultimo_mes=ultimo_mes))
+        comparativas.append(generar_comparativa_forecasts(None, horizonte_meses=6, panel=panel, ultimo_mes=ultimo_mes))
+        semana = limpia[['fecha', 'demanda', 'demanda_sin_stockout', 'demanda_sin_outlier']].assign(
+            unidades_perdidas=calcular_unidades_perdidas(limpia))
+        semanales.append(semana.groupby('fecha')[COLUMNAS_SEMANALES].sum())
+
+    def limpiar():
+        for nombre, df in iterar_particiones(carpeta):
+            limpia = clean_demand(df)
+            agregar(nombre, limpia)
+            yield nombre, limpia
+
+    if reutilizar:
+        for nombre, limpia in iterar_particiones(carpeta_limpia):
+            agregar(nombre, limpia)
+    else:
+        escribir_almacen(carpeta_limpia, limpiar(),
+                         {"origen": origen, "n_particiones": n_particiones, "fechas": indice["fechas"]})
+
+    # SKUs con stock histórico pero sin demanda en ninguna partición
+    for parte in stock_por_particion.values():
+        paneles.append(construir_panel_mensual(_demanda_limpia_vacia(), parte))
+
+    panel = pd.concat(paneles, ignore_index=True)
+    panel['sku'] = panel['sku'].astype(str).astype('category')
+    semanal = pd.concat(semanales).groupby(level=0).sum().reset_index().assign(sku="TODOS")
+    return {
+        "almacen_demanda_limpia": carpeta_limpia,
+        "demanda_semanal_total": semanal[['sku', 'fecha'] + COLUMNAS_SEMANALES],
+        "panel_mensual": panel.sort_values(['sku', 'mes'], kind='stable').reset_index(drop=True),
+        # Orden estable por SKU: dentro de cada SKU se respeta el orden que entrega el forecast
+        "forecast": pd.concat(forecasts, ignore_index=True).sort_values('sku', kind='stable').reset_index(drop=True),
+        "forecast_comparativa": pd.concat(comparativas, ignore_index=True).sort_values('sku', kind='stable').reset_index(drop=True),
+    }
+
+def _demanda_limpia_vacia():
+    return pd.DataFrame({'sku': pd.Series(dtype=str), 'fecha': pd.Series(dtype='datetime64[s]'),
+                         'demanda': pd.Series(dtype=int), 'demanda_sin_outlier': pd.Series(dtype=int),
+                         'demanda_sin_stockout': pd.Series(dtype=int)})
+
+def _fuente_cargada(clave):
+    return clave in st.session_state or (clave == "demanda_cruda" and "almacen_demanda" in st.session_state)
 
 def init_session(pasos=None, progress=None):
     def marcar_paso(i, texto):
@@ -48,31 +132,40 @@ def init_session(pasos=None, progress=None):
 
     else:
         marcar_paso(0, "📁 1) Descargando archivos desde Google Drive...")
-        if "demanda_cruda" not in st.session_state:
-            st.session_state["demanda_cruda"] = descargar_csv_drive("1OXm_cHTP9Si4CtBInQZqQro0QR-pCWaQ", "demanda.csv")
-        if "stock_historico" not in st.session_state:
-            st.session_state["stock_historico"] = descargar_csv_drive("1GgjD8bL4QwHQo76pRv2bW2RGE71d4s9r", "stock_hist.csv")
-        if "maestro" not in st.session_state:
-            st.session_state["maestro"] = descargar_csv_drive("1ueW0mjB9aVUcDh4e8ywEIikJAvm-530h", "maestro.csv")
-        if "stock_actual" not in st.session_state:
-            st.session_state["stock_actual"] = descargar_csv_drive("1q5LfbrjT5dxlfMZQ-WvWqdKWz4fg7JBh", "stock_actual.csv")
-        if "reposiciones" not in st.session_state:
-            st.session_state["reposiciones"] = descargar_csv_drive("1v1tSpWkmR6Y4h39nD3uDG99JOx_qgLIk", "repos.csv")
+        faltantes = tuple(clave for clave in FUENTES_DRIVE if not _fuente_cargada(clave))
+        if faltantes:
+            st.session_state.update(descargar_csv_drive(faltantes, os.environ.get("PLANITY_DATOS_BASE_URL")))
         marcar_paso(0, "✅ 1) Archivos descargados correctamente")
 
+    # Calendario de reposiciones indexado una sola vez por carga
+    if "calendario_reposiciones" not in st.session_state:
+        st.session_state["calendario_reposiciones"] = construir_calendario_reposiciones(st.session_state["reposiciones"])
+
     # Paso 2: Limpieza de demanda
     marcar_paso(1, "🧹 2) Limpiando demanda histórica...")
-    if "demanda_limpia" not in st.session_state:
+    # Con almacén particionado (demanda grande) la demanda semanal nunca se carga entera en la sesión:
+    # limpieza, panel y forecast se hacen por partición y sólo quedan los agregados
+    almacen = st.session_state.get("almacen_demanda") if modo != "manual" else None
+    if almacen and "almacen_demanda_limpia" not in st.session_state:
+        st.session_state.update(procesar_demanda_particionada(almacen, st.session_state["stock_historico"]))
+    if not almacen and "demanda_limpia" not in st.session_state:
         st.session_state["demanda_limpia"] = clean_demand(st.session_state["demanda_cruda"])
+    # Panel mensual SKU × mes compartido por forecast, políticas, pérdidas y páginas
+    if "panel_mensual" not in st.session_state:
+        st.session_state["panel_mensual"] = construir_panel_mensual(
+            st.session_state["demanda_limpia"], st.session_state["stock_historico"]
+        )
     marcar_paso(1, "✅ 2) Demanda limpia generada")
 
     # Paso 3: Forecast
     marcar_paso(2, "📊 3) Generando forecast por SKU...")
     if "forecast" not in st.session_state:
-        st.session_state["forecast"] = forecast_engine(st.session_state["demanda_limpia"])
+        st.session_state["forecast"] = forecast_engine(
+            st.session_state["demanda_limpia"], panel=st.session_state["panel_mensual"]
+        )
     if "forecast_comparativa" not in st.session_state:
         st.session_state["forecast_comparativa"] = generar_comparativa_forecasts(
-            st.session_state["demanda_limpia"], horizonte_meses=6
+            st.session_state["demanda_limpia"], horizonte_meses=6, panel=st.session_state["panel_mensual"]
         )
     marcar_paso(2, "✅ 3) Forecast por SKU generado")
 
@@ -83,7 +176,8 @@ def init_session(pasos=None, progress=None):
             st.session_state["forecast"],
             st.session_state["stock_actual"],
             st.session_state["reposiciones"],
-            st.session_state["maestro"]
+            st.session_state["maestro"],
+            calendario=st.session_state["calendario_reposiciones"]
         )
     marcar_paso(3, "✅ 4) Stock proyectado")
 
@@ -91,8 +185,9 @@ def init_session(pasos=None, progress=None):
     marcar_paso(4, "📦 5) Calculando pérdidas y resumen histórico...")
     if "resumen_historico" not in st.session_state:
         st.session_state["resumen_historico"] = consolidar_historico_stock(
-            st.session_state["demanda_limpia"],
-            st.session_state["maestro"]
+            st.session_state.get("demanda_limpia"),
+            st.session_state["maestro"],
+            panel=st.session_state["panel_mensual"]
         )
     marcar_paso(4, "✅ 5) Resumen histórico generado")
 
@@ -106,8 +201,13 @@ def init_session(pasos=None, progress=None):
             st.session_state["resumen_historico"]
         )
         st.session_state["contexto_negocio"] = contexto
-        st.session_state["contexto_negocio_general"] = contexto
     marcar_paso(5, "✅ 6) Contexto de negocio listo")
 
+    # Huellas de las tablas que las páginas usan para invalidar sus cálculos: se calculan una vez por carga
+    # y en cada rerun sólo se compara el valor guardado (huella_sesion)
+    for clave in ["forecast", "stock_actual", "reposiciones", "maestro", "demanda_limpia", "panel_mensual", "proyeccion_stock"]:
+        if clave in st.session_state:
+            huella_sesion(clave)
+
     st.session_state["datos_cargados"] = True
 